@@ -0,0 +1,189 @@
+# analytics_counters.py
+# Coalesced ProductAnalytics counter updates
+#
+# Product events no longer read-modify-write their ProductAnalytics row. They
+# add to in-memory per-product deltas, and a background flusher writes them
+# every ANALYTICS_FLUSH_INTERVAL seconds as one INSERT ... ON CONFLICT DO UPDATE
+# executemany with SET count = count + delta. Increments are atomic in the
+# database, so concurrent processes can't lose each other's updates.
+# wishlist_to_canvas_rate is recomputed in the same statement from the new
+# totals.
+#
+# Deltas not yet flushed are lost if the process dies (at most one interval of
+# counts). Readers that need up-to-the-second numbers merge pending_deltas() or
+# use with_pending_deltas().
+
+from typing import List, Dict, Optional
+import atexit
+import threading
+import time
+
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+
+from database import upsert_insert
+from interaction_models import ProductAnalytics
+
+
+ANALYTICS_FLUSH_INTERVAL = 5  # seconds
+
+ACTION_COUNTERS = {
+    'view_product': 'view_count',
+    'favorite_product': 'favorite_count',
+    'favorite_from_creator': 'favorite_count',
+    'canvas_add': 'canvas_add_count',
+    'click_to_retailer': 'click_through_count',
+}
+COUNTERS = ('view_count', 'favorite_count', 'canvas_add_count', 'click_through_count')
+
+
+class AnalyticsDeltas:
+    """Per-product counter deltas waiting to be flushed."""
+
+    def __init__(self):
+        self._deltas: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # One flush at a time
+
+    def __len__(self) -> int:
+        return len(self._deltas)
+
+    def record(self, product_id: str, action_type: str, count: int = 1):
+        counter = ACTION_COUNTERS.get(action_type)
+        if counter is None or not product_id:
+            return
+        with self._lock:
+            delta = self._deltas.setdefault(product_id, dict.fromkeys(COUNTERS, 0))
+            delta[counter] += count
+
+    def pending(self, product_ids: List[str]) -> Dict[str, Dict[str, int]]:
+        """Copies of the unflushed deltas for these products (only those that have any)."""
+        with self._lock:
+            return {p: dict(self._deltas[p]) for p in product_ids if p in self._deltas}
+
+    def flush(self, db: Session) -> int:
+        """Apply every pending delta atomically and commit; returns products written."""
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._deltas = self._deltas, {}
+            if not deltas:
+                return 0
+            try:
+                _apply_deltas(db, deltas)
+                db.commit()
+            except Exception:
+                db.rollback()
+                self._merge_back(deltas)
+                raise
+            return len(deltas)
+
+    def _merge_back(self, deltas: Dict[str, Dict[str, int]]):
+        with self._lock:
+            for product_id, delta in deltas.items():
+                current = self._deltas.setdefault(product_id, dict.fromkeys(COUNTERS, 0))
+                for counter, count in delta.items():
+                    current[counter] += count
+
+
+def _rate(canvas_adds: int, favorites: int, current: float = 0.0) -> float:
+    return canvas_adds / favorites if favorites > 0 else current
+
+
+def _apply_deltas(db: Session, deltas: Dict[str, Dict[str, int]]):
+    """One executemany: new products are inserted with their deltas, existing ones incremented."""
+    insert = upsert_insert(db)
+    table = ProductAnalytics.__table__
+    stmt = insert(table)
+    update = {c: func.coalesce(table.c[c], 0) + stmt.excluded[c] for c in COUNTERS}
+
+    # SET expressions see the pre-update row, so rebuild the new totals here
+    favorites = func.coalesce(table.c.favorite_count, 0) + stmt.excluded.favorite_count
+    canvas_adds = func.coalesce(table.c.canvas_add_count, 0) + stmt.excluded.canvas_add_count
+    update['wishlist_to_canvas_rate'] = case(
+        (favorites > 0, canvas_adds * 1.0 / favorites),
+        else_=func.coalesce(table.c.wishlist_to_canvas_rate, 0.0)
+    )
+    update['updated_at'] = func.now()  # ORM onupdate doesn't fire for ON CONFLICT
+
+    db.execute(stmt.on_conflict_do_update(index_elements=['product_id'], set_=update), [
+        {
+            'product_id': product_id,
+            **delta,
+            'wishlist_to_canvas_rate': _rate(delta['canvas_add_count'], delta['favorite_count']),
+        }
+        for product_id, delta in deltas.items()
+    ])
+
+
+_deltas = AnalyticsDeltas()
+
+
+def record_product_event(product_id: str, action_type: str):
+    """Count a product event; it reaches product_analytics on the next flush."""
+    _deltas.record(product_id, action_type)
+
+
+def pending_deltas(product_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    return _deltas.pending(product_ids)
+
+
+def with_pending_deltas(analytics: Optional[ProductAnalytics], product_id: str) -> Optional[ProductAnalytics]:
+    """
+    A detached ProductAnalytics with unflushed deltas folded in (None if the
+    product has neither a row nor pending deltas). Never added to a session.
+    """
+    delta = _deltas.pending([product_id]).get(product_id)
+    if delta is None:
+        return analytics
+    merged = ProductAnalytics(product_id=product_id)
+    for column in ('current_price', 'interested_demographics', 'price_history', 'created_at', 'updated_at'):
+        setattr(merged, column, getattr(analytics, column, None))
+    for counter in COUNTERS:
+        setattr(merged, counter, (getattr(analytics, counter, 0) or 0) + delta[counter])
+    merged.wishlist_to_canvas_rate = _rate(
+        merged.canvas_add_count, merged.favorite_count, getattr(analytics, 'wishlist_to_canvas_rate', 0.0) or 0.0
+    )
+    return merged
+
+
+def flush_product_analytics(session_factory=None) -> int:
+    if session_factory is None:
+        from database import SessionLocal as session_factory
+    db = session_factory()
+    try:
+        return _deltas.flush(db)
+    finally:
+        db.close()
+
+
+_flusher_started = False
+_flusher_lock = threading.Lock()
+
+
+def _flusher_loop(session_factory, interval: int):
+    while True:
+        time.sleep(interval)
+        try:
+            flush_product_analytics(session_factory)
+        except Exception as e:
+            print(f"Product analytics flush failed ({len(_deltas)} products pending): {e}")
+
+
+def _flush_at_exit(session_factory):
+    try:
+        flush_product_analytics(session_factory)
+    except Exception as e:
+        print(f"Final product analytics flush failed: {e}")
+
+
+def start_analytics_flusher(session_factory=None, interval: int = ANALYTICS_FLUSH_INTERVAL):
+    """Start the background delta flusher once per process."""
+    global _flusher_started
+    with _flusher_lock:
+        if _flusher_started:
+            return
+        if session_factory is None:
+            from database import SessionLocal as session_factory
+        threading.Thread(target=_flusher_loop, args=(session_factory, interval), daemon=True).start()
+        atexit.register(_flush_at_exit, session_factory)
+        _flusher_started = True
@@ -20,11 +20,15 @@ from conversational_search import get_conversational_service
 from fastapi import Depends, HTTPException, Header
 from fastapi.security import HTTPBearer
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 import json
 
 from database import init_db, get_db, User, WardrobeItem, Favorite, Outfit
-from auth_service import signup, login, create_access_token, get_current_user
+from auth_service import signup, login, create_access_token, revoke_tokens, get_authenticated_user, AuthenticatedUser
+from async_database import get_async_db
+from pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from json_responses import ORJSONResponse, raw_json
 from vision_service import get_vision_service
 from stock_checker import get_stock_checker
 
@@ -33,7 +37,7 @@ import shutil
 import uuid
 from pathlib import Path
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
 def prepare_canvas_image(favorite_id: int):
     """Background job to remove background when item is added to canvas"""
@@ -134,7 +138,7 @@ def prepare_canvas_image(favorite_id: int):
     finally:
         db.close()
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 from fastapi.staticfiles import StaticFiles
 
 # Serve uploaded files
@@ -401,7 +405,7 @@ def auth_signup(req: SignupRequest, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=400, detail="Email already exists")
     
-    token = create_access_token(user.id, user.email)
+    token = create_access_token(user.id, user.email, user.token_version)
     return {"token": token, "user": {"id": user.id, "email": user.email}}
 
 @app.post("/auth/login")
@@ -410,9 +414,18 @@ def auth_login(req: LoginRequest, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    token = create_access_token(user.id, user.email)
+    token = create_access_token(user.id, user.email, user.token_version)
     return {"token": token, "user": {"id": user.id, "email": user.email}}
 
+@app.post("/auth/logout-all")
+def auth_logout_all(
+    user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: Session = Depends(get_db)
+):
+    """Revoke every token issued to the current user (this one included)"""
+    revoke_tokens(db, user.id)
+    return {"message": "All sessions signed out"}
+
 # ============= WARDROBE ENDPOINTS =============
 
 class WardrobeUploadRequest(BaseModel):
@@ -421,17 +434,9 @@ class WardrobeUploadRequest(BaseModel):
 @app.post("/wardrobe/upload")
 def upload_wardrobe_item(
     req: WardrobeUploadRequest,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     # AI analyze the image
     vision = get_vision_service()
     tags = vision.analyze_clothing(req.image_url)
@@ -460,17 +465,9 @@ def upload_wardrobe_item(
 @app.post("/wardrobe/upload-file")
 async def upload_wardrobe_file(
     file: UploadFile = File(...),
-    authorization: str = Header(None),
-    db: Session = Depends(get_db)
+    user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     # Validate file type
     if not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
@@ -577,8 +574,8 @@ async def upload_wardrobe_file(
         user_edited=False
     )
     db.add(item)
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     
     return {
         "id": item.id,
@@ -601,18 +598,10 @@ def update_wardrobe_item(
     date_purchased: str = None,  # ISO format string
     season: str = None,
     state: str = None,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """Update wardrobe item details after review"""
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     # Get item and verify ownership
     item = db.query(WardrobeItem).filter(
         WardrobeItem.id == item_id,
@@ -674,20 +663,20 @@ def update_wardrobe_item(
 
 @app.get("/wardrobe/items")
 def get_wardrobe_items(
-    authorization: str = Header(None),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    items = db.query(WardrobeItem).filter(WardrobeItem.user_id == user.id).all()
+    items, next_cursor = paginate(
+        db.query(
+            WardrobeItem.id, WardrobeItem.image_url, WardrobeItem.category, WardrobeItem.color,
+            WardrobeItem.fabric, WardrobeItem.pattern, WardrobeItem.style_tags, WardrobeItem.created_at
+        ).filter(WardrobeItem.user_id == user.id),
+        WardrobeItem, cursor=cursor, limit=limit
+    )
     
-    return {
+    return ORJSONResponse({
         "items": [
             {
                 "id": item.id,
@@ -696,12 +685,13 @@ def get_wardrobe_items(
                 "color": item.color,
                 "fabric": item.fabric,
                 "pattern": item.pattern,
-                "style_tags": json.loads(item.style_tags) if item.style_tags else [],
-                "created_at": item.created_at.isoformat()
+                "style_tags": raw_json(item.style_tags, []),
+                "created_at": item.created_at
             }
             for item in items
-        ]
-    }
+        ],
+        "next_cursor": next_cursor
+    })
 
 # ============= FAVORITES ENDPOINTS =============
 
@@ -719,17 +709,9 @@ class AddFavoriteRequest(BaseModel):
 @app.post("/favorites")
 def add_favorite(
     req: AddFavoriteRequest,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     # Save with original image - NO background removal
     favorite = Favorite(
         user_id=user.id,
@@ -763,20 +745,21 @@ def add_favorite(
 
 @app.get("/favorites")
 def get_favorites(
-    authorization: str = Header(None),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    favs = db.query(Favorite).filter(Favorite.user_id == user.id).all()
+    favs, next_cursor = paginate(
+        db.query(
+            Favorite.id, Favorite.product_id, Favorite.title, Favorite.image_url,
+            Favorite.canvas_image_url, Favorite.canvas_processing_status, Favorite.brand,
+            Favorite.retailer, Favorite.price, Favorite.product_url, Favorite.created_at
+        ).filter(Favorite.user_id == user.id),
+        Favorite, cursor=cursor, limit=limit
+    )
     
-    return {
+    return ORJSONResponse({
         "favorites": [
             {
                 "id": fav.id,
@@ -789,26 +772,19 @@ def get_favorites(
                 "retailer": fav.retailer,
                 "price": fav.price,
                 "product_url": fav.product_url,
-                "created_at": fav.created_at.isoformat()
+                "created_at": fav.created_at
             }
             for fav in favs
-        ]
-    }
+        ],
+        "next_cursor": next_cursor
+    })
 
 @app.delete("/favorites/{fav_id}")
 def delete_favorite(
     fav_id: int,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     fav = db.query(Favorite).filter(
         Favorite.id == fav_id,
         Favorite.user_id == user.id
@@ -825,18 +801,10 @@ def delete_favorite(
 @app.post("/favorites/{favorite_id}/prepare-canvas")
 def prepare_favorite_for_canvas(
     favorite_id: int,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """Prepare a favorited item for canvas by removing background"""
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     # Get favorite and verify ownership
     favorite = db.query(Favorite).filter(
         Favorite.id == favorite_id,
@@ -893,17 +861,9 @@ class UpdateOutfitRequest(BaseModel):
 @app.post("/outfits")
 def create_outfit(
     req: CreateOutfitRequest,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     outfit = Outfit(
         user_id=user.id,
         name=req.name,
@@ -923,47 +883,39 @@ def create_outfit(
 
 @app.get("/outfits")
 def get_outfits(
-    authorization: str = Header(None),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    outfits = db.query(Outfit).filter(Outfit.user_id == user.id).all()
+    outfits, next_cursor = paginate(
+        db.query(
+            Outfit.id, Outfit.name, Outfit.outfit_data, Outfit.thumbnail_url, Outfit.created_at
+        ).filter(Outfit.user_id == user.id),
+        Outfit, cursor=cursor, limit=limit
+    )
     
-    return {
+    return ORJSONResponse({
         "outfits": [
             {
                 "id": outfit.id,
                 "name": outfit.name,
-                "outfit_data": json.loads(outfit.outfit_data),
+                "outfit_data": raw_json(outfit.outfit_data),
                 "thumbnail_url": outfit.thumbnail_url,
-                "created_at": outfit.created_at.isoformat()
+                "created_at": outfit.created_at
             }
             for outfit in outfits
-        ]
-    }
+        ],
+        "next_cursor": next_cursor
+    })
 
 @app.put("/outfits/{outfit_id}")
 def update_outfit(
     outfit_id: int,
     req: UpdateOutfitRequest,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     outfit = db.query(Outfit).filter(
         Outfit.id == outfit_id,
         Outfit.user_id == user.id
@@ -987,17 +939,9 @@ def update_outfit(
 @app.delete("/outfits/{outfit_id}")
 def delete_outfit(
     outfit_id: int,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     outfit = db.query(Outfit).filter(
         Outfit.id == outfit_id,
         Outfit.user_id == user.id
@@ -1016,17 +960,13 @@ def delete_outfit(
 @app.get("/favorites/{fav_id}/price-history")
 def get_price_history(
     fav_id: int,
-    authorization: str = Header(None),
+    points: int = Query(200, ge=3, le=2000),
+    days: Optional[int] = Query(None, ge=1),
+    method: str = Query("lttb", pattern="^(lttb|minmax)$"),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
+    """Price history of a favorited product, downsampled to at most `points` points"""
     fav = db.query(Favorite).filter(
         Favorite.id == fav_id,
         Favorite.user_id == user.id
@@ -1035,7 +975,9 @@ def get_price_history(
     if not fav:
         raise HTTPException(status_code=404, detail="Favorite not found")
     
-    price_history = json.loads(fav.price_history) if fav.price_history else []
+    from price_history import price_series
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    series = price_series(db, fav.product_id, points=points, since=since, method=method)
     
     return {
         "product_id": fav.product_id,
@@ -1043,7 +985,9 @@ def get_price_history(
         "current_price": fav.price,
         "original_price": fav.original_price,
         "price_change": fav.price - fav.original_price if fav.original_price else 0,
-        "price_history": price_history
+        "price_history": series["points"],
+        "total_points": series["total_points"],
+        "downsampled_with": series["method"]
     }
 
 class SetPriceAlertRequest(BaseModel):
@@ -1053,17 +997,9 @@ class SetPriceAlertRequest(BaseModel):
 def set_price_alert(
     fav_id: int,
     req: SetPriceAlertRequest,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     fav = db.query(Favorite).filter(
         Favorite.id == fav_id,
         Favorite.user_id == user.id
@@ -1083,43 +1019,47 @@ def check_all_prices(db: Session = Depends(get_db)):
     Background job endpoint to check prices for all favorited items
     Should be called by a cron job daily
     """
+    from price_history import record_price_point
+    
     favorites = db.query(Favorite).all()
     updated_count = 0
     alerts = []
     
+    # One price per product, shared by everyone who favorited it
+    by_product = {}
     for fav in favorites:
+        by_product.setdefault(fav.product_id, []).append(fav)
+    
+    for product_id, product_favorites in by_product.items():
         # TODO: Call retailer API to get current price
         # For now, this is a placeholder
         # In production, you'd call ASOS/Vinted/etc API here
         
         # Placeholder: Randomly simulate price changes for testing
         import random
-        if random.random() < 0.3:  # 30% chance of price change
-            old_price = fav.price
+        old_price = product_favorites[0].price
+        if old_price is not None and random.random() < 0.3:  # 30% chance of price change
             new_price = round(old_price * random.uniform(0.8, 1.2), 2)
+            checked_at = datetime.utcnow()
             
-            # Update price
-            fav.price = new_price
-            fav.last_price_check = datetime.utcnow()
-            
-            # Add to price history
-            history = json.loads(fav.price_history) if fav.price_history else []
-            history.append({
-                "date": datetime.utcnow().isoformat(),
-                "price": new_price
-            })
-            fav.price_history = json.dumps(history)
+            # Append to the product's price series
+            record_price_point(db, product_id, new_price, checked_at)
             
-            updated_count += 1
-            
-            # Check if alert threshold met
-            if fav.price_alert_threshold and new_price < fav.price_alert_threshold:
-                alerts.append({
-                    "user_id": fav.user_id,
-                    "product": fav.title,
-                    "new_price": new_price,
-                    "threshold": fav.price_alert_threshold
-                })
+            for fav in product_favorites:
+                # Update price
+                fav.price = new_price
+                fav.last_price_check = checked_at
+                
+                updated_count += 1
+                
+                # Check if alert threshold met
+                if fav.price_alert_threshold and new_price < fav.price_alert_threshold:
+                    alerts.append({
+                        "user_id": fav.user_id,
+                        "product": fav.title,
+                        "new_price": new_price,
+                        "threshold": fav.price_alert_threshold
+                    })
     
     db.commit()
     
@@ -1142,17 +1082,9 @@ class SizePreferenceRequest(BaseModel):
 @app.post("/size-preferences")
 def set_size_preferences(
     req: SizePreferenceRequest,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     # Check if preferences already exist
     from database import SizePreference
     pref = db.query(SizePreference).filter(SizePreference.user_id == user.id).first()
@@ -1196,17 +1128,9 @@ def set_size_preferences(
 
 @app.get("/size-preferences")
 def get_size_preferences(
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     from database import SizePreference
     pref = db.query(SizePreference).filter(SizePreference.user_id == user.id).first()
     
@@ -1231,17 +1155,9 @@ def get_size_preferences(
 
 @app.post("/size-preferences/toggle")
 def toggle_size_filter(
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     from database import SizePreference
     pref = db.query(SizePreference).filter(SizePreference.user_id == user.id).first()
     
@@ -1327,18 +1243,10 @@ def check_all_stock(db: Session = Depends(get_db)):
 @app.get("/favorites/{fav_id}/stock")
 def get_stock_status(
     fav_id: int,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """Get current stock status for a favorited item"""
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     from database import Favorite
     fav = db.query(Favorite).filter(
         Favorite.id == fav_id,
@@ -1359,18 +1267,10 @@ def get_stock_status(
 @app.post("/favorites/{fav_id}/check-stock-now")
 def check_stock_now(
     fav_id: int,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """Manually trigger stock check for a specific item"""
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     from database import Favorite
     fav = db.query(Favorite).filter(
         Favorite.id == fav_id,
@@ -1405,10 +1305,38 @@ def check_stock_now(
 from tracking_endpoints import router as tracking_router
 app.include_router(tracking_router)
 
+# Write-behind buffer for /ai/track-interactions/batch (replays its spool, if any)
+from interaction_ingest import get_ingest_buffer
+get_ingest_buffer()
+
+# Coalesced product_analytics counter deltas, flushed every few seconds
+from analytics_counters import start_analytics_flusher
+start_analytics_flusher()
+
 # Recommendation System
 from recommendation_endpoints import router as recommendation_router
 app.include_router(recommendation_router)
 
+# Hourly/daily interaction rollups behind /recommendations/trending
+from interaction_rollups import start_rollup_worker
+start_rollup_worker()
+
+# 90-day hot user_interactions; older activity moves to monthly archive files
+from interaction_archive import start_archiver
+start_archiver()
+
+# Day-partitioned Parquet export behind the offline analytics endpoints
+from interaction_export import start_exporter
+start_exporter()
+
+# Time decay for incrementally maintained style profiles
+from profile_builder import start_profile_compactor
+start_profile_compactor()
+
+# Columnar product catalog cache, refreshed incrementally on read
+from product_catalog import warm_product_catalog
+warm_product_catalog()
+
 # Creator System
 from creator_endpoints import router as creator_router
 from canvas_endpoints import router as canvas_router
@@ -1446,21 +1374,12 @@ from sam3_service import get_sam3_service
 @app.post("/wardrobe/upload-smart")
 async def upload_wardrobe_smart(
     file: UploadFile = File(...),
-    authorization: str = Header(None),
-    db: Session = Depends(get_db)
+    user: AuthenticatedUser = Depends(get_authenticated_user)
 ):
     """
     Smart upload - handles both single items and full outfits
     Returns first item + queue info if outfit detected
     """
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     if not file.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
     
@@ -1587,18 +1506,10 @@ async def save_and_next_item(
     color: str,
     image_url: str,
     brand: str = None,
-    authorization: str = Header(None),
-    db: Session = Depends(get_db)
+    user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Save current item to wardrobe and get next item from queue"""
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     # Save item to database
     item = WardrobeItem(
         user_id=user.id,
@@ -1612,8 +1523,8 @@ async def save_and_next_item(
         user_edited=True
     )
     db.add(item)
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     
     # Get queue and advance
     queue = get_queue(queue_id, user.id)
@@ -1663,18 +1574,9 @@ async def save_and_next_item(
 @app.post("/wardrobe/skip-item")
 async def skip_item(
     queue_id: str,
-    authorization: str = Header(None),
-    db: Session = Depends(get_db)
+    user: AuthenticatedUser = Depends(get_authenticated_user)
 ):
     """Skip current item without saving and get next item"""
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     queue = get_queue(queue_id, user.id)
     
     if not queue:
@@ -1814,18 +1716,9 @@ async def extract_mask_from_result(original_bytes: bytes, sam_result: dict, cate
 @app.post("/wardrobe/prettify")
 async def prettify_item(
     image_url: str,
-    authorization: str = Header(None)
+    user: AuthenticatedUser = Depends(get_authenticated_user)
 ):
     """Prettify a segmented garment image using Gemini"""
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    db = next(get_db())
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     from gemini_prettify import GeminiPrettify
     import httpx
     
@@ -1876,18 +1769,9 @@ async def prettify_item_v2(
     image_url: str,
     description: str = "garment",
     category: str = "clothing",
-    authorization: str = Header(None)
+    user: AuthenticatedUser = Depends(get_authenticated_user)
 ):
     """Prettify a segmented garment image using Gemini with description context"""
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    db = next(get_db())
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     from gemini_prettify import GeminiPrettify
     import httpx
     
@@ -1947,21 +1831,12 @@ async def prettify_item_v2(
 
 @app.post("/vto/overlay-accessories")
 async def overlay_accessories(
-    authorization: str = Header(None)
+    user: AuthenticatedUser = Depends(get_authenticated_user)
 ):
     """
     Add accessories to existing VTO image
     Uses the proven 2+1+1 pattern for up to 4 accessories
     """
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    db = next(get_db())
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     import base64
     from io import BytesIO
     
@@ -0,0 +1,76 @@
+# async_database.py
+# Async engine and sessions for async def handlers
+#
+# Usage:
+#   from async_database import get_async_db
+#
+#   @router.get("/things")
+#   async def list_things(db: AsyncSession = Depends(get_async_db)):
+#       result = await db.execute(select(Thing).limit(20))
+#       return result.scalars().all()
+#
+# A sync Session inside an async def handler blocks the event loop for every
+# query. This engine points at the same DATABASE_URL through an async driver
+# (sqlite+aiosqlite, postgresql+asyncpg) with the same tuning as
+# database.make_engine, so handlers can await their queries.
+#
+# Sessions don't expire on commit (an expired attribute would need a lazy load,
+# which AsyncSession can't do implicitly). Sync helpers that take a Session run
+# through `await db.run_sync(fn, *args)`.
+
+from typing import AsyncIterator
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from database import (
+    DATABASE_URL, SQLITE_BUSY_TIMEOUT_MS,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    _sqlite_pragmas,
+)
+
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def async_url(url: str) -> str:
+    """The async-driver form of a database URL (URLs already naming a driver pass through)."""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def make_async_engine(url: str = None, **overrides):
+    """Async counterpart of database.make_engine (same pragmas / pool settings)."""
+    url = async_url(url or DATABASE_URL)
+
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+        options.update(overrides)
+        async_engine = create_async_engine(url, **options)
+        event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+        return async_engine
+
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    options.update(overrides)
+    return create_async_engine(url, **options)
+
+
+async_engine = make_async_engine(DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency: one AsyncSession per request, closed afterwards."""
+    async with AsyncSessionLocal() as db:
+        yield db
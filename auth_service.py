@@ -1,14 +1,27 @@
 import jwt
 import bcrypt
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, NamedTuple
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import User
+from async_database import get_async_db
 
 SECRET_KEY = "your-secret-key-change-this-in-production"  # TODO: Move to environment variable
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# Verified tokens are cached for AUTH_CACHE_TTL seconds, so a revocation
+# (revoke_tokens) reaches other processes within that window
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
     salt = bcrypt.gensalt()
@@ -19,12 +32,13 @@ def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), 
 hashed.encode('utf-8'))
 
-def create_access_token(user_id: int, email: str) -> str:
-    """Create a JWT access token"""
+def create_access_token(user_id: int, email: str, token_version: int = 0) -> str:
+    """Create a JWT access token (valid until expiry or until the user's token_version moves on)"""
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     payload = {
         "user_id": user_id,
         "email": email,
+        "ver": token_version,
         "exp": expire
     }
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
@@ -66,12 +80,139 @@ def login(db: Session, email: str, password: str) -> Optional[User]:
     return user
 
 def get_current_user(db: Session, token: str) -> Optional[User]:
-    """Get user from JWT token"""
-    print(f"DEBUG auth: decoding token...")
+    """Get user from JWT token (rejects revoked tokens)"""
     payload = decode_token(token)
-    print(f"DEBUG auth: payload = {payload}")
     if not payload:
         return None
     
     user = db.query(User).filter(User.id == payload['user_id']).first()
+    if not user or (user.token_version or 0) != payload.get('ver', 0):
+        return None
+    return user
+
+
+# ============= AUTHENTICATED-USER CACHE =============
+
+class AuthenticatedUser(NamedTuple):
+    """Who a verified token belongs to (what route handlers need, without a User row)"""
+    id: int
+    email: str
+    token_version: int
+
+
+class AuthCache:
+    """Token -> AuthenticatedUser, least recently used evicted past max_size, entries expire after ttl."""
+    
+    def __init__(self, ttl: int = AUTH_CACHE_TTL, max_size: int = AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0  # Bumped by every eviction
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, token: str) -> Optional[AuthenticatedUser]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+    
+    def put(
+        self,
+        token: str,
+        user: AuthenticatedUser,
+        token_expiry: Optional[float] = None,
+        generation: Optional[int] = None
+    ):
+        """Cache a verification; dropped if an eviction happened since `generation` was read."""
+        expires_at = time.time() + self.ttl
+        if token_expiry is not None:
+            expires_at = min(expires_at, token_expiry)  # Never outlive the token itself
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[token] = (expires_at, user)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def evict_user(self, user_id: int):
+        with self._lock:
+            self.generation += 1
+            for token in [t for t, (_, u) in self._entries.items() if u.id == user_id]:
+                del self._entries[token]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_auth_cache = AuthCache()
+
+
+def get_auth_cache() -> AuthCache:
+    return _auth_cache
+
+
+def _verified(payload: dict, row) -> Optional[AuthenticatedUser]:
+    if row is None or (row.token_version or 0) != payload.get('ver', 0):
+        return None
+    return AuthenticatedUser(row.id, row.email, row.token_version or 0)
+
+
+async def authenticate_token(db: AsyncSession, token: str) -> Optional[AuthenticatedUser]:
+    """Verify a token (signature, expiry, token version) against the database and cache the result"""
+    payload = decode_token(token)
+    if not payload:
+        return None
+    
+    generation = _auth_cache.generation  # A revocation racing this lookup voids it
+    result = await db.execute(
+        select(User.id, User.email, User.token_version).filter(User.id == payload['user_id'])
+    )
+    user = _verified(payload, result.first())
+    if user is not None:
+        _auth_cache.put(token, user, payload.get('exp'), generation)
     return user
+
+
+async def get_authenticated_user(
+    authorization: str = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+) -> AuthenticatedUser:
+    """
+    Shared FastAPI dependency for protected routes: the Bearer token's user.
+    Cache hits need no database access (the session never connects); misses
+    query through the request's AsyncSession, so overrides of get_async_db apply.
+    """
+    if not authorization or not authorization.startswith('Bearer '):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    token = authorization.split(' ')[1]
+    user = _auth_cache.get(token)
+    if user is None:
+        user = await authenticate_token(db, token)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
+    return user
+
+
+def revoke_tokens(db: Session, user_id: int):
+    """
+    Invalidate every token issued to the user so far, and commit. The cache is
+    evicted only after the commit: evicting earlier would let a concurrent miss
+    re-cache the old token_version before it's gone.
+    """
+    db.query(User).filter(User.id == user_id).update(
+        {User.token_version: User.token_version + 1}, synchronize_session=False
+    )
+    db.commit()
+    _auth_cache.evict_user(user_id)
@@ -0,0 +1,181 @@
+# benchmark_auth.py
+# Per-request authentication cost: uncached User lookup vs the authenticated-user cache
+#
+# Usage:
+#   python benchmark_auth.py --requests 20000 --users 200
+#   python benchmark_auth.py --requests 20000 --save auth.json
+#
+# Resolves Bearer tokens the three ways a protected route can:
+#
+#   lookup    decode + full User row SELECT on a sync Session (get_current_user,
+#             what every handler used to do)
+#   uncached  decode + (id, email, token_version) SELECT on an AsyncSession
+#             (authenticate_token: a cache miss)
+#   cached    get_authenticated_user with a warm cache (including the request
+#             AsyncSession get_async_db opens, which a hit never uses)
+#
+# and reports per-call latency and SELECTs issued per call. Tokens are drawn
+# from --users users, so the cached run is the steady state of a working set
+# that fits in AUTH_CACHE_SIZE.
+
+from typing import List, Dict, Any, Optional
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _summary(values: List[float], selects: int) -> Dict[str, float]:
+    return {
+        "calls_per_sec": round(len(values) / sum(values), 1) if values else 0.0,
+        "p50_us": round(_percentile(values, 0.50) * 1e6, 1),
+        "p99_us": round(_percentile(values, 0.99) * 1e6, 1),
+        "mean_us": round(statistics.mean(values) * 1e6, 1) if values else 0.0,
+        "selects_per_call": round(selects / len(values), 3) if values else 0.0,
+    }
+
+
+def seed(users: int) -> Dict[int, str]:
+    from database import init_db, SessionLocal, User
+    from auth_service import create_access_token
+
+    init_db()
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        db.bulk_insert_mappings(User, [
+            {"id": u, "email": f"user{u}@bench.local", "password_hash": "x", "token_version": 0, "created_at": now}
+            for u in range(1, users + 1)
+        ])
+        db.commit()
+    finally:
+        db.close()
+    return {u: create_access_token(u, f"user{u}@bench.local") for u in range(1, users + 1)}
+
+
+class SelectCounter:
+    """Counts SELECTs issued through the sync and async engines."""
+
+    def __init__(self):
+        from sqlalchemy import event
+        from database import engine
+        from async_database import async_engine
+
+        self.count = 0
+        for target in (engine, async_engine.sync_engine):
+            event.listen(target, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.count += 1
+
+
+def run_lookup(tokens: List[str], counter: SelectCounter) -> Dict[str, float]:
+    from database import SessionLocal
+    from auth_service import get_current_user
+
+    latencies = []
+    start_count = counter.count
+    for token in tokens:
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            assert get_current_user(db, token) is not None
+        finally:
+            db.close()
+        latencies.append(time.perf_counter() - started)
+    return _summary(latencies, counter.count - start_count)
+
+
+async def run_uncached(tokens: List[str], counter: SelectCounter) -> Dict[str, float]:
+    from async_database import AsyncSessionLocal
+    from auth_service import authenticate_token
+
+    latencies = []
+    start_count = counter.count
+    for token in tokens:
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            assert await authenticate_token(db, token) is not None
+        latencies.append(time.perf_counter() - started)
+    return _summary(latencies, counter.count - start_count)
+
+
+async def run_cached(tokens: List[str], counter: SelectCounter) -> Dict[str, float]:
+    from async_database import AsyncSessionLocal
+    from auth_service import get_authenticated_user, get_auth_cache
+
+    cache = get_auth_cache()
+    cache.clear()
+    for token in set(tokens):
+        async with AsyncSessionLocal() as db:
+            await get_authenticated_user(f"Bearer {token}", db)  # Warm up
+
+    latencies = []
+    start_count = counter.count
+    hits = cache.hits
+    for token in tokens:
+        started = time.perf_counter()
+        # The request's session, as get_async_db provides it (unused on a hit)
+        async with AsyncSessionLocal() as db:
+            await get_authenticated_user(f"Bearer {token}", db)
+        latencies.append(time.perf_counter() - started)
+    result = _summary(latencies, counter.count - start_count)
+    result["hit_rate"] = round((cache.hits - hits) / len(tokens), 3)
+    return result
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Per-request authentication cost with and without the auth cache")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--workdir", default=".bench")
+    parser.add_argument("--save", default=None, help="Write results JSON here")
+    args = parser.parse_args(argv)
+
+    # Point the app's engines at a scratch database before anything imports database.py
+    os.makedirs(args.workdir, exist_ok=True)
+    path = os.path.abspath(os.path.join(args.workdir, "auth.db"))
+    for stale in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    if "database" in sys.modules:
+        raise RuntimeError("database was imported before the scratch DATABASE_URL was set")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    by_user = seed(args.users)
+    rnd = random.Random(7)
+    tokens = [by_user[rnd.randint(1, args.users)] for _ in range(args.requests)]
+    counter = SelectCounter()
+    print(f"{args.requests:,} token checks over {args.users} users")
+
+    results = {
+        "lookup": run_lookup(tokens, counter),
+        "uncached": asyncio.run(run_uncached(tokens, counter)),
+        "cached": asyncio.run(run_cached(tokens, counter)),
+    }
+    for name, r in results.items():
+        print(f"  {name:<9} {r['calls_per_sec']:>10,.1f}/s  p50 {r['p50_us']:>8.1f} us  "
+              f"p99 {r['p99_us']:>8.1f} us  selects/call {r['selects_per_call']}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"Saved results to {args.save}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
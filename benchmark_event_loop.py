@@ -0,0 +1,215 @@
+# benchmark_event_loop.py
+# Event-loop lag under concurrent canvas + extraction traffic
+#
+# Usage:
+#   python benchmark_event_loop.py --clients 32 --seconds 15 --save loop_baseline.json
+#   python benchmark_event_loop.py --clients 32 --seconds 15 --compare loop_baseline.json
+#
+# Mounts the canvas, extraction and styling routers on a bare FastAPI app over a
+# scratch SQLite database and drives them in-process (httpx ASGITransport) from
+# --clients concurrent clients. Alongside, a probe task sleeps PROBE_INTERVAL
+# and records how late it wakes up: that overshoot is time the loop spent
+# blocked in something (a sync query, serialization, ...) instead of serving
+# other requests.
+
+from typing import List, Dict, Any, Optional
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+
+PROBE_INTERVAL = 0.005  # seconds
+ITEMS = [f"{kind}-{n}" for kind in ("blazer", "top", "jeans", "pants", "shoes") for n in range(40)]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+        "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2) if values else 0.0,
+        "mean_ms": round(statistics.mean(values) * 1000, 2) if values else 0.0,
+    }
+
+
+def seed(users: int, canvases: int, interactions: int):
+    """Users, their canvases and enough interaction history for the extraction stats to scan."""
+    from database import Base, User, SessionLocal, engine
+    from canvas_models import Canvas
+    from interaction_models import UserInteraction
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    rnd = random.Random(3)
+    now = datetime.utcnow()
+    try:
+        db.bulk_insert_mappings(User, [
+            {"id": u, "email": f"user{u}@bench.local", "password_hash": "x", "created_at": now}
+            for u in range(1, users + 1)
+        ])
+        db.bulk_insert_mappings(Canvas, [
+            {
+                "user_id": rnd.randint(1, users), "name": f"Outfit {c}", "items": rnd.sample(ITEMS, 3),
+                "item_positions": {}, "tags": [], "is_public": rnd.random() < 0.5,
+                "view_count": 0, "like_count": 0, "save_count": 0, "vto_generated": False,
+                "created_at": now, "updated_at": now,
+            }
+            for c in range(canvases)
+        ])
+        actions = ["outfit_photo_upload", "wardrobe_add", "view_product", "canvas_add", "favorite_product"]
+        db.bulk_insert_mappings(UserInteraction, [
+            {
+                "user_id": rnd.randint(1, users), "action_type": rnd.choice(actions),
+                "item_id": rnd.choice(ITEMS), "item_type": "product", "weight": 1.0,
+                "interaction_metadata": {"source": "outfit_extraction", "category": "tops"},
+                "created_at": now - timedelta(minutes=rnd.randint(0, 60 * 24 * 90)),
+            }
+            for _ in range(interactions)
+        ])
+        db.commit()
+        return [c for (c,) in db.query(Canvas.id).all()]
+    finally:
+        db.close()
+
+
+def build_app():
+    from fastapi import FastAPI
+    from canvas_endpoints import router as canvas_router
+    from extraction_endpoints import router as extraction_router
+    from styling_endpoints import router as styling_router
+
+    app = FastAPI()
+    app.include_router(canvas_router)
+    app.include_router(extraction_router)
+    app.include_router(styling_router)
+    return app
+
+
+async def drive(app, users: int, canvas_ids: List[int], clients: int, seconds: float) -> Dict[str, Any]:
+    import httpx
+    from auth_service import create_access_token
+
+    tokens = {u: create_access_token(u, f"user{u}@bench.local") for u in range(1, users + 1)}
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    lag: List[float] = []
+    deadline = time.perf_counter() + seconds
+
+    requests = [
+        ("GET", "canvas.my-canvases", lambda rnd: "/canvas/my-canvases"),
+        ("GET", "canvas.get", lambda rnd: f"/canvas/{rnd.choice(canvas_ids)}"),
+        ("POST", "canvas.add-item", lambda rnd: f"/canvas/{rnd.choice(canvas_ids)}/items/{rnd.choice(ITEMS)}"),
+        ("GET", "canvas.discover", lambda rnd: "/canvas/discover/public"),
+        ("GET", "extract.stats", lambda rnd: "/extract/extraction-stats"),
+    ]
+
+    async def probe():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            lag.append(max(0.0, time.perf_counter() - started - PROBE_INTERVAL))
+
+    async def client(seed: int, http):
+        rnd = random.Random(seed)
+        while time.perf_counter() < deadline:
+            method, name, path = rnd.choice(requests)
+            user_id = rnd.randint(1, users)
+            started = time.perf_counter()
+            response = await http.request(method, path(rnd), headers={"Authorization": f"Bearer {tokens[user_id]}"})
+            elapsed = time.perf_counter() - started
+            # 403/404 are expected (other users' private canvases)
+            if response.status_code >= 500:
+                errors[name] = errors.get(name, 0) + 1
+            else:
+                latencies.setdefault(name, []).append(elapsed)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        await asyncio.gather(probe(), *(client(i, http) for i in range(clients)))
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "requests_per_sec": round(total / seconds, 1),
+        "loop_lag": _summary(lag),
+        "requests": {name: {"count": len(v), **_summary(v)} for name, v in sorted(latencies.items())},
+        "errors": errors,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    print("\n=== Comparison vs baseline ===")
+    print(f"{'metric':<30} {'base':>10} {'now':>10}")
+    rows = [("requests/sec", baseline["requests_per_sec"], current["requests_per_sec"])]
+    for key in ("p50_ms", "p99_ms", "max_ms"):
+        rows.append((f"loop lag {key}", baseline["loop_lag"][key], current["loop_lag"][key]))
+    for name, stats in current["requests"].items():
+        base = baseline["requests"].get(name)
+        if base:
+            rows.append((f"{name} p99_ms", base["p99_ms"], stats["p99_ms"]))
+    for label, base, now in rows:
+        print(f"{label:<30} {base:>10} {now:>10}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Event-loop lag under concurrent canvas/extraction traffic")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--canvases", type=int, default=2000)
+    parser.add_argument("--interactions", type=int, default=300000)
+    parser.add_argument("--workdir", default=".bench")
+    parser.add_argument("--save", default=None, help="Write results JSON here")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    # Point the app's engines at a scratch database before anything imports database.py
+    os.makedirs(args.workdir, exist_ok=True)
+    path = os.path.abspath(os.path.join(args.workdir, "event_loop.db"))
+    for stale in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    if "database" in sys.modules:
+        raise RuntimeError("database was imported before the scratch DATABASE_URL was set")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    started = time.perf_counter()
+    canvas_ids = seed(args.users, args.canvases, args.interactions)
+    print(f"Seeded {args.users} users, {len(canvas_ids)} canvases, {args.interactions} interactions "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    app = build_app()
+    print(f"{args.clients} clients for {args.seconds:g}s ...")
+    result = asyncio.run(drive(app, args.users, canvas_ids, args.clients, args.seconds))
+
+    lag = result["loop_lag"]
+    print(f"  requests/sec   {result['requests_per_sec']:,.1f}")
+    print(f"  loop lag       p50 {lag['p50_ms']} ms  p99 {lag['p99_ms']} ms  max {lag['max_ms']} ms")
+    for name, stats in result["requests"].items():
+        print(f"  {name:<20} n={stats['count']:<6} p50 {stats['p50_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms")
+    if result["errors"]:
+        print(f"  errors: {result['errors']}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"config": vars(args), **result}, f, indent=2)
+        print(f"Saved results to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+    return result
+
+
+if __name__ == "__main__":
+    main()
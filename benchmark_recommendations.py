@@ -0,0 +1,252 @@
+# benchmark_recommendations.py
+# Benchmark harness for the recommendation engine, tailored alternatives and /recommendations/* endpoints
+#
+# Usage:
+#   python benchmark_recommendations.py --scales small medium --iterations 10 --save bench_baseline.json
+#   python benchmark_recommendations.py --scales small medium --compare bench_baseline.json
+#
+# Each scale gets a synthetic database (see synthetic_data.py). Every target is timed
+# over a sample of users and reported as latency percentiles plus SQL queries per call.
+
+from typing import List, Dict, Any, Callable, Optional
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from database import make_engine
+from synthetic_data import generate, SCALES
+
+
+STRATEGIES = ["content", "collaborative", "trending", "hybrid"]
+
+ENDPOINTS = [
+    "/recommendations/for-me?strategy=hybrid",
+    "/recommendations/for-me?strategy=content",
+    "/recommendations/trending?timeframe=week",
+    "/recommendations/similar-to/{product_id}",
+    "/recommendations/from-creators",
+    "/recommendations/similar-users-bought",
+    "/recommendations/hot-items",
+]
+
+
+class QueryCounter:
+    """Counts SQL statements executed on an engine."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _measure(
+    fn: Callable[[int], Any],
+    user_ids: List[int],
+    counter: QueryCounter
+) -> Dict[str, Any]:
+    """Run fn once per sampled user; collect latency (ms) and queries per call."""
+    latencies, queries, errors = [], [], 0
+    last_error = None
+    for user_id in user_ids:
+        before = counter.count
+        started = time.perf_counter()
+        try:
+            fn(user_id)
+        except Exception as e:
+            errors += 1
+            last_error = f"{type(e).__name__}: {e}"
+            continue
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        queries.append(counter.count - before)
+
+    result = {
+        "calls": len(latencies),
+        "errors": errors,
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.mean(latencies), 2) if latencies else 0.0,
+        "queries_per_call": round(statistics.mean(queries), 1) if queries else 0.0,
+    }
+    if last_error:
+        result["last_error"] = last_error[:200]
+    return result
+
+
+def _endpoint_client(Session, url: str):
+    """FastAPI TestClient over just the recommendation router, bound to the scratch DB."""
+    try:
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+    except ImportError:
+        print("fastapi[testclient] not installed - skipping endpoint benchmarks")
+        return None
+
+    from database import get_db
+    from async_database import get_async_db, make_async_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from recommendation_endpoints import router
+
+    AsyncSession = async_sessionmaker(make_async_engine(url), autoflush=False, expire_on_commit=False)
+
+    def _get_scratch_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def _get_scratch_async_db():
+        async with AsyncSession() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = _get_scratch_db
+    app.dependency_overrides[get_async_db] = _get_scratch_async_db  # Authentication
+    return TestClient(app)
+
+
+def run_scale(
+    name: str,
+    sizes: Dict[str, int],
+    workdir: str,
+    iterations: int,
+    reuse: bool = False,
+    seed: int = 7
+) -> Dict[str, Any]:
+    """Benchmark every target against one synthetic database."""
+    from recommendation_engine import RecommendationEngine
+    from tailored_recommendations import TailoredRecommendationEngine
+    from creator_models import CreatorPost
+    from interaction_models import ProductAnalytics
+    from auth_service import create_access_token
+
+    path = os.path.join(workdir, f"bench_{name}.db")
+    if not (reuse and os.path.exists(path)):
+        generate(path, **sizes)
+
+    engine = make_engine(f"sqlite:///{path}")
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    counter = QueryCounter(engine)
+    rnd = random.Random(seed)
+
+    user_ids = [rnd.randint(1, sizes['users']) for _ in range(iterations)]
+    db = Session()
+    post_ids = [p[0] for p in db.query(CreatorPost.id).all()]
+    product_ids = [p[0] for p in db.query(ProductAnalytics.product_id).limit(500).all()]
+    db.close()
+
+    results: Dict[str, Any] = {}
+
+    def engine_call(strategy):
+        def call(user_id):
+            session = Session()
+            try:
+                return RecommendationEngine(session).get_recommendations(user_id, limit=20, strategy=strategy)
+            finally:
+                session.close()
+        return call
+
+    for strategy in STRATEGIES:
+        results[f"engine.{strategy}"] = _measure(engine_call(strategy), user_ids, counter)
+        print(f"  [{name}] engine.{strategy}: {results[f'engine.{strategy}']}")
+
+    def tailored_call(user_id):
+        session = Session()
+        try:
+            post_id = rnd.choice(post_ids) if post_ids else None
+            return TailoredRecommendationEngine(session).generate_alternatives_for_post(post_id, user_id)
+        finally:
+            session.close()
+
+    results["tailored.generate_alternatives_for_post"] = _measure(tailored_call, user_ids, counter)
+    print(f"  [{name}] tailored: {results['tailored.generate_alternatives_for_post']}")
+
+    client = _endpoint_client(Session, f"sqlite:///{path}")
+    if client is not None:
+        for path_template in ENDPOINTS:
+            def endpoint_call(user_id, path_template=path_template):
+                token = create_access_token(user_id, f"user{user_id}@bench.local")
+                url = path_template.format(product_id=rnd.choice(product_ids) if product_ids else "none")
+                response = client.get(url, headers={"Authorization": f"Bearer {token}"})
+                if response.status_code != 200:
+                    raise RuntimeError(f"HTTP {response.status_code}: {response.text[:100]}")
+                return response
+
+            key = f"endpoint.{path_template.split('?')[0].replace('/recommendations/', '')}"
+            if '?' in path_template:
+                key += f"?{path_template.split('?')[1]}"
+            results[key] = _measure(endpoint_call, user_ids, counter)
+            print(f"  [{name}] {key}: {results[key]}")
+
+    engine.dispose()
+    return {"sizes": sizes, "results": results}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print p50/p95/query deltas against a saved baseline run."""
+    print("\n=== Comparison vs baseline ===")
+    print(f"{'scale':<8} {'target':<50} {'p50 base':>10} {'p50 now':>10} {'delta':>8} {'q base':>8} {'q now':>8}")
+    for scale, data in current["scales"].items():
+        base_scale = baseline.get("scales", {}).get(scale)
+        if not base_scale:
+            print(f"{scale:<8} (not in baseline)")
+            continue
+        for target, now in data["results"].items():
+            base = base_scale["results"].get(target)
+            if not base:
+                continue
+            delta = ((now["p50_ms"] - base["p50_ms"]) / base["p50_ms"] * 100.0) if base["p50_ms"] else 0.0
+            print(f"{scale:<8} {target:<50} {base['p50_ms']:>10.1f} {now['p50_ms']:>10.1f} "
+                  f"{delta:>+7.1f}% {base['queries_per_call']:>8.1f} {now['queries_per_call']:>8.1f}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark recommendation paths on synthetic data")
+    parser.add_argument("--scales", nargs="+", default=["small"], choices=sorted(SCALES))
+    parser.add_argument("--iterations", type=int, default=10, help="Sampled users per target")
+    parser.add_argument("--workdir", default=".bench")
+    parser.add_argument("--reuse", action="store_true", help="Reuse existing scratch databases")
+    parser.add_argument("--save", default=None, help="Write results JSON here")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    report = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "iterations": args.iterations, "scales": {}}
+
+    for scale in args.scales:
+        print(f"\n=== Scale: {scale} {SCALES[scale]} ===")
+        report["scales"][scale] = run_scale(scale, SCALES[scale], args.workdir, args.iterations, args.reuse)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+# benchmark_serialization.py
+# Build + serialize cost of large list responses: ORM + stdlib JSON vs projection + orjson
+#
+# Usage:
+#   python benchmark_serialization.py --rows 1000 --repeat 30
+#   python benchmark_serialization.py --rows 1000 --save serialization.json
+#
+# For the wardrobe, favorites and interactions lists, one page of --rows rows is
+# produced two ways and timed end to end (query, row -> dict, body bytes):
+#
+#   orm       full ORM objects, json.loads on JSON text columns, then what FastAPI
+#             does with a returned dict: jsonable_encoder + the stdlib JSONResponse
+#   current   what the endpoints now do: projection queries (paginate over
+#             columns), raw_json pass-through and ORJSONResponse
+#
+# Both bodies are decoded and compared, so a speedup can't come from returning
+# something different.
+
+from typing import List, Dict, Any, Callable, Optional
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+
+CATEGORIES = ["tops", "bottoms", "dresses", "outerwear", "shoes", "bags"]
+TAGS = ["casual", "minimal", "streetwear", "formal", "boho", "sporty", "vintage"]
+
+
+def seed(rows: int):
+    from database import init_db, SessionLocal, User, WardrobeItem, Favorite
+    from interaction_models import UserInteraction
+
+    init_db()
+    db = SessionLocal()
+    rnd = random.Random(5)
+    now = datetime.utcnow()
+    try:
+        db.add(User(id=1, email="user1@bench.local", password_hash="x"))
+        db.bulk_insert_mappings(WardrobeItem, [
+            {
+                "user_id": 1, "image_url": f"/uploads/wardrobe/{n}.jpg", "category": rnd.choice(CATEGORIES),
+                "color": "black", "fabric": "cotton", "pattern": "solid",
+                "style_tags": json.dumps(rnd.sample(TAGS, 3)), "created_at": now - timedelta(seconds=n),
+            }
+            for n in range(rows)
+        ])
+        db.bulk_insert_mappings(Favorite, [
+            {
+                "user_id": 1, "product_id": f"asos-{n}", "title": f"Product {n}", "price": round(rnd.uniform(10, 200), 2),
+                "image_url": f"https://images.example.com/{n}.jpg", "product_url": f"https://shop.example.com/{n}",
+                "retailer": "ASOS", "brand": "Bench", "created_at": now - timedelta(seconds=n),
+            }
+            for n in range(rows)
+        ])
+        db.bulk_insert_mappings(UserInteraction, [
+            {
+                "user_id": 1, "action_type": "view_product", "item_id": f"asos-{n}", "item_type": "product",
+                "interaction_metadata": {"brand": "Bench", "price": round(rnd.uniform(10, 200), 2),
+                                         "category": rnd.choice(CATEGORIES), "tags": rnd.sample(TAGS, 2)},
+                "weight": 1.0, "source": "benchmark", "created_at": now - timedelta(seconds=n),
+            }
+            for n in range(rows)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def _stdlib_body(payload: Dict[str, Any]) -> bytes:
+    """What FastAPI does with a dict returned under the stock JSONResponse."""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+# ============================================
+# ORM + STDLIB (before)
+# ============================================
+
+def wardrobe_orm(db, user, rows: int) -> bytes:
+    from database import WardrobeItem
+    from pagination import paginate
+
+    items, next_cursor = paginate(db.query(WardrobeItem).filter(WardrobeItem.user_id == user.id),
+                                  WardrobeItem, limit=rows, max_limit=rows)
+    return _stdlib_body({
+        "items": [
+            {
+                "id": item.id, "image_url": item.image_url, "category": item.category, "color": item.color,
+                "fabric": item.fabric, "pattern": item.pattern,
+                "style_tags": json.loads(item.style_tags) if item.style_tags else [],
+                "created_at": item.created_at.isoformat()
+            }
+            for item in items
+        ],
+        "next_cursor": next_cursor
+    })
+
+
+def favorites_orm(db, user, rows: int) -> bytes:
+    from database import Favorite
+    from pagination import paginate
+
+    favs, next_cursor = paginate(db.query(Favorite).filter(Favorite.user_id == user.id),
+                                 Favorite, limit=rows, max_limit=rows)
+    return _stdlib_body({
+        "favorites": [
+            {
+                "id": fav.id, "product_id": fav.product_id, "title": fav.title, "image_url": fav.image_url,
+                "canvas_image_url": fav.canvas_image_url, "canvas_processing_status": fav.canvas_processing_status,
+                "brand": fav.brand, "retailer": fav.retailer, "price": fav.price, "product_url": fav.product_url,
+                "created_at": fav.created_at.isoformat()
+            }
+            for fav in favs
+        ],
+        "next_cursor": next_cursor
+    })
+
+
+def interactions_orm(db, user, rows: int) -> bytes:
+    from interaction_models import UserInteraction
+    from pagination import paginate
+
+    interactions, next_cursor = paginate(db.query(UserInteraction).filter(UserInteraction.user_id == user.id),
+                                         UserInteraction, limit=rows, max_limit=rows)
+    return _stdlib_body({
+        "interactions": [
+            {
+                "id": i.id, "action_type": i.action_type, "item_id": i.item_id, "item_type": i.item_type,
+                "metadata": i.interaction_metadata, "source": i.source, "weight": i.weight,
+                "created_at": i.created_at.isoformat()
+            }
+            for i in interactions
+        ],
+        "total": len(interactions),
+        "next_cursor": next_cursor
+    })
+
+
+# ============================================
+# PROJECTION + ORJSON (the endpoints now)
+# ============================================
+
+def wardrobe_current(db, user, rows: int) -> bytes:
+    from database import WardrobeItem
+    from pagination import paginate
+    from json_responses import ORJSONResponse, raw_json
+
+    items, next_cursor = paginate(
+        db.query(
+            WardrobeItem.id, WardrobeItem.image_url, WardrobeItem.category, WardrobeItem.color,
+            WardrobeItem.fabric, WardrobeItem.pattern, WardrobeItem.style_tags, WardrobeItem.created_at
+        ).filter(WardrobeItem.user_id == user.id),
+        WardrobeItem, limit=rows, max_limit=rows
+    )
+    return ORJSONResponse({
+        "items": [
+            {
+                "id": item.id, "image_url": item.image_url, "category": item.category, "color": item.color,
+                "fabric": item.fabric, "pattern": item.pattern,
+                "style_tags": raw_json(item.style_tags, []), "created_at": item.created_at
+            }
+            for item in items
+        ],
+        "next_cursor": next_cursor
+    }).body
+
+
+def favorites_current(db, user, rows: int) -> bytes:
+    from database import Favorite
+    from pagination import paginate
+    from json_responses import ORJSONResponse
+
+    favs, next_cursor = paginate(
+        db.query(
+            Favorite.id, Favorite.product_id, Favorite.title, Favorite.image_url,
+            Favorite.canvas_image_url, Favorite.canvas_processing_status, Favorite.brand,
+            Favorite.retailer, Favorite.price, Favorite.product_url, Favorite.created_at
+        ).filter(Favorite.user_id == user.id),
+        Favorite, limit=rows, max_limit=rows
+    )
+    return ORJSONResponse({
+        "favorites": [
+            {
+                "id": fav.id, "product_id": fav.product_id, "title": fav.title, "image_url": fav.image_url,
+                "canvas_image_url": fav.canvas_image_url, "canvas_processing_status": fav.canvas_processing_status,
+                "brand": fav.brand, "retailer": fav.retailer, "price": fav.price, "product_url": fav.product_url,
+                "created_at": fav.created_at
+            }
+            for fav in favs
+        ],
+        "next_cursor": next_cursor
+    }).body
+
+
+def interactions_current(db, user, rows: int) -> bytes:
+    from sqlalchemy import Text, cast
+    from interaction_models import UserInteraction
+    from pagination import paginate
+    from json_responses import ORJSONResponse, raw_json
+
+    interactions, next_cursor = paginate(
+        db.query(
+            UserInteraction.id, UserInteraction.action_type, UserInteraction.item_id, UserInteraction.item_type,
+            cast(UserInteraction.interaction_metadata, Text).label('metadata'),
+            UserInteraction.source, UserInteraction.weight, UserInteraction.created_at
+        ).filter(UserInteraction.user_id == user.id),
+        UserInteraction, limit=rows, max_limit=rows
+    )
+    return ORJSONResponse({
+        "interactions": [
+            {
+                "id": i.id, "action_type": i.action_type, "item_id": i.item_id, "item_type": i.item_type,
+                "metadata": raw_json(i.metadata), "source": i.source, "weight": i.weight,
+                "created_at": i.created_at
+            }
+            for i in interactions
+        ],
+        "total": len(interactions),
+        "next_cursor": next_cursor
+    }).body
+
+
+LISTS: Dict[str, Dict[str, Callable]] = {
+    "wardrobe": {"orm": wardrobe_orm, "current": wardrobe_current},
+    "favorites": {"orm": favorites_orm, "current": favorites_current},
+    "interactions": {"orm": interactions_orm, "current": interactions_current},
+}
+
+
+def _time(fn: Callable, user, rows: int, repeat: int):
+    from database import SessionLocal
+
+    timings = []
+    body = b""
+    for _ in range(repeat):
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            body = fn(db, user, rows)
+            timings.append(time.perf_counter() - started)
+        finally:
+            db.close()
+    return timings, body
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="List response build + serialization cost")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--workdir", default=".bench")
+    parser.add_argument("--save", default=None, help="Write results JSON here")
+    args = parser.parse_args(argv)
+
+    # Point the app's engines at a scratch database before anything imports database.py
+    os.makedirs(args.workdir, exist_ok=True)
+    path = os.path.abspath(os.path.join(args.workdir, "serialization.db"))
+    for stale in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    if "database" in sys.modules:
+        raise RuntimeError("database was imported before the scratch DATABASE_URL was set")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    seed(args.rows)
+    import pagination
+    pagination.MAX_PAGE_SIZE = max(pagination.MAX_PAGE_SIZE, args.rows)  # One page of --rows
+    from auth_service import AuthenticatedUser
+    user = AuthenticatedUser(1, "user1@bench.local", 0)
+    print(f"{args.rows:,}-row responses, best of {args.repeat}")
+
+    results: Dict[str, Any] = {}
+    for name, variants in LISTS.items():
+        results[name] = {}
+        bodies = {}
+        for variant, fn in variants.items():
+            _time(fn, user, args.rows, 2)  # Warm up
+            timings, bodies[variant] = _time(fn, user, args.rows, args.repeat)
+            results[name][variant] = {
+                "best_ms": round(min(timings) * 1000, 2),
+                "median_ms": round(statistics.median(timings) * 1000, 2),
+                "bytes": len(bodies[variant]),
+            }
+        if json.loads(bodies["orm"]) != json.loads(bodies["current"]):
+            raise AssertionError(f"{name}: responses differ")
+        orm, current = results[name]["orm"], results[name]["current"]
+        results[name]["speedup"] = round(orm["median_ms"] / current["median_ms"], 2)
+        print(f"  {name:<13} orm {orm['median_ms']:>8.2f} ms   current {current['median_ms']:>8.2f} ms   "
+              f"x{results[name]['speedup']}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"Saved results to {args.save}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+# candidate_retrieval.py
+# Stage 1 of the recommendation pipeline: cheap, budgeted candidate retrieval
+#
+# Each source returns at most its own budget of product IDs. The merged pool is
+# interleaved round-robin (so no single source crowds the others out),
+# de-duplicated, filtered against the user's exclusions and capped at the total
+# candidate budget. Stage 2 (vectorized scoring) lives in RecommendationEngine.
+
+from typing import List, Dict, Any, Optional, Set, Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import threading
+import time
+
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import func, desc
+
+from interaction_models import UserInteraction, ProductAnalytics
+from creator_models import CreatorPost, PostProduct
+from product_catalog import get_product_catalog
+from user_features import (
+    UserFeatures, FEATURE_KINDS, get_feature_space, extract_attributes, attribute_affinity_scores
+)
+
+
+# Candidates per source, and for the merged pool
+RETRIEVAL_BUDGETS = {
+    'taste': 200,          # Nearest products to the user's taste vector
+    'co_occurrence': 150,  # Items co-interacted with the user's recent items
+    'creators': 100,       # Products tagged by followed creators
+    'trending': 100,       # Global engagement
+}
+CANDIDATE_BUDGET = 400
+
+TASTE_INDEX_TTL = timedelta(minutes=10)
+CO_OCCURRENCE_SEED_ITEMS = 20
+CO_OCCURRENCE_NEIGHBORS = 100
+CO_OCCURRENCE_WINDOW = timedelta(days=90)
+
+
+@dataclass
+class CandidatePool:
+    """Merged stage-1 output plus instrumentation."""
+    product_ids: List[str] = field(default_factory=list)
+    sources: Dict[str, List[str]] = field(default_factory=dict)  # product_id -> sources
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+
+# ============================================
+# TASTE INDEX
+# ============================================
+
+class TasteIndex:
+    """
+    Every known product's attribute ids as one (n_products, n_kinds) matrix.
+    Retrieval against a taste vector is an exact top-k over a gather + dot product,
+    which is cheap enough (4 int32 per product) to stand in for an ANN index.
+    """
+
+    def __init__(self):
+        self.product_ids = np.array([], dtype=object)
+        self.matrix = np.full((0, len(FEATURE_KINDS)), -1, dtype=np.int32)
+        self.positions: Dict[str, int] = {}
+        self.built_at: Optional[datetime] = None
+
+    def is_stale(self) -> bool:
+        return self.built_at is None or datetime.now() - self.built_at > TASTE_INDEX_TTL
+
+    def build(self, db: Session) -> "TasteIndex":
+        """
+        Catalog attributes first, then one streaming scan of product-interaction
+        metadata fills whatever the catalog doesn't know; latest attributes win.
+        """
+        space = get_feature_space(db)
+        attributes: Dict[str, List[int]] = {}
+
+        rows = db.query(UserInteraction.item_id, UserInteraction.interaction_metadata).filter(
+            UserInteraction.item_type == 'product',
+            UserInteraction.item_id.isnot(None),
+            UserInteraction.interaction_metadata.isnot(None)
+        ).order_by(UserInteraction.created_at.desc()).yield_per(5000)
+
+        for item_id, metadata in rows:
+            row = attributes.get(item_id)
+            if row is None:
+                row = attributes[item_id] = [-1] * len(FEATURE_KINDS)
+            for kind, value in extract_attributes(metadata).items():
+                column = FEATURE_KINDS.index(kind)
+                if row[column] < 0:
+                    row[column] = space.lookup(kind, value)
+
+        catalog = get_product_catalog(db)
+        for product_id in catalog.product_ids:
+            attributes.setdefault(product_id, [-1] * len(FEATURE_KINDS))
+
+        self.product_ids = np.array(list(attributes.keys()), dtype=object)
+        self.matrix = np.array(list(attributes.values()), dtype=np.int32).reshape(-1, len(FEATURE_KINDS))
+        if len(catalog):
+            from_catalog = catalog.attributes_for(db, list(self.product_ids))
+            self.matrix = np.where(from_catalog >= 0, from_catalog, self.matrix)
+        self.positions = {product_id: i for i, product_id in enumerate(attributes)}
+        self.built_at = datetime.now()
+        return self
+
+    def attributes_for(self, product_ids: List[str]) -> np.ndarray:
+        """Attribute rows for specific products (-1 for products not in the index)."""
+        rows = np.array([self.positions.get(pid, -1) for pid in product_ids], dtype=np.int64)
+        matrix = np.full((len(product_ids), len(FEATURE_KINDS)), -1, dtype=np.int32)
+        known = rows >= 0
+        matrix[known] = self.matrix[rows[known]]
+        return matrix
+
+    def search(self, user_vector: np.ndarray, k: int) -> List[str]:
+        if len(self.product_ids) == 0 or k <= 0:
+            return []
+        scores = attribute_affinity_scores(user_vector, self.matrix)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.product_ids[i] for i in top if scores[i] > 0]
+
+
+_taste_indexes: Dict[str, TasteIndex] = {}
+_taste_rebuilding: Set[str] = set()
+_taste_lock = threading.Lock()
+
+
+def _rebuild_taste_index(key: str, bind):
+    """Background rebuild on its own session; requests keep the stale index until the swap."""
+    db = Session(bind=bind)
+    try:
+        started = time.perf_counter()
+        index = TasteIndex().build(db)
+        _taste_indexes[key] = index
+        print(f"Rebuilt taste index: {len(index.product_ids)} products in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        print(f"Taste index rebuild failed: {e}")
+    finally:
+        db.close()
+        with _taste_lock:
+            _taste_rebuilding.discard(key)
+
+
+def get_taste_index(db: Session) -> TasteIndex:
+    """
+    Per-database taste index. Only the very first build happens on a request;
+    after that a stale index (older than TASTE_INDEX_TTL) is served while one
+    background thread rebuilds it.
+    """
+    key = str(db.get_bind().url)
+    index = _taste_indexes.get(key)
+    if index is None:
+        with _taste_lock:
+            index = _taste_indexes.get(key)
+            if index is None:
+                index = _taste_indexes[key] = TasteIndex().build(db)
+        return index
+
+    if index.is_stale():
+        with _taste_lock:
+            if key in _taste_rebuilding:
+                return index
+            _taste_rebuilding.add(key)
+        threading.Thread(target=_rebuild_taste_index, args=(key, db.get_bind()), daemon=True).start()
+    return index
+
+
+# ============================================
+# RETRIEVER
+# ============================================
+
+class CandidateRetriever:
+    """Pulls a budgeted candidate pool for one user from several cheap sources."""
+
+    def __init__(
+        self,
+        db: Session,
+        budgets: Optional[Dict[str, int]] = None,
+        total_budget: int = CANDIDATE_BUDGET
+    ):
+        self.db = db
+        self.budgets = {**RETRIEVAL_BUDGETS, **(budgets or {})}
+        self.total_budget = total_budget
+
+    def retrieve(
+        self,
+        user_id: int,
+        features: UserFeatures,
+        exclude: Set[str]
+    ) -> CandidatePool:
+        sources: Dict[str, Callable[[int, UserFeatures, int], List[str]]] = {
+            'taste': self._from_taste,
+            'co_occurrence': self._from_co_occurrence,
+            'creators': self._from_creators,
+            'trending': self._from_trending,
+        }
+
+        started = time.perf_counter()
+        per_source: Dict[str, List[str]] = {}
+        stats: Dict[str, Any] = {'sources': {}}
+
+        for name, fetch in sources.items():
+            budget = self.budgets.get(name, 0)
+            source_started = time.perf_counter()
+            try:
+                # Over-fetch (bounded) so exclusions don't starve the source
+                ids = fetch(user_id, features, min(budget + len(exclude), budget * 5))
+            except Exception as e:
+                print(f"Candidate source '{name}' failed for user {user_id}: {e}")
+                self.db.rollback()
+                ids = []
+            ids = [pid for pid in ids if pid not in exclude][:budget]
+            per_source[name] = ids
+            stats['sources'][name] = {
+                'count': len(ids),
+                'time_ms': round((time.perf_counter() - source_started) * 1000.0, 2),
+            }
+
+        pool = self._merge(per_source)
+        stats['merged'] = len(pool.product_ids)
+        stats['raw'] = sum(len(ids) for ids in per_source.values())
+        stats['time_ms'] = round((time.perf_counter() - started) * 1000.0, 2)
+        pool.stats = stats
+        return pool
+
+    def _merge(self, per_source: Dict[str, List[str]]) -> CandidatePool:
+        """Round-robin interleave, de-duplicate, cap at the total budget."""
+        pool = CandidatePool()
+        iterators = {name: iter(ids) for name, ids in per_source.items()}
+
+        while iterators and len(pool.product_ids) < self.total_budget:
+            for name in list(iterators):
+                product_id = next(iterators[name], None)
+                if product_id is None:
+                    del iterators[name]
+                    continue
+                if product_id in pool.sources:
+                    pool.sources[product_id].append(name)
+                    continue
+                pool.sources[product_id] = [name]
+                pool.product_ids.append(product_id)
+                if len(pool.product_ids) >= self.total_budget:
+                    break
+
+        return pool
+
+    def _from_taste(self, user_id: int, features: UserFeatures, k: int) -> List[str]:
+        if not features.weights:
+            return []
+        user_vector = features.dense(get_feature_space(self.db))
+        return get_taste_index(self.db).search(user_vector, k)
+
+    def _from_co_occurrence(self, user_id: int, features: UserFeatures, k: int) -> List[str]:
+        """Items other users engaged with alongside the user's most recent items."""
+        seeds = [
+            row[0] for row in self.db.query(UserInteraction.item_id).filter(
+                UserInteraction.user_id == user_id,
+                UserInteraction.item_type == 'product',
+                UserInteraction.item_id.isnot(None)
+            ).order_by(desc(UserInteraction.created_at)).limit(CO_OCCURRENCE_SEED_ITEMS).all()
+        ]
+        if not seeds:
+            return []
+
+        # Most recent co-users of those items, then what they engaged with
+        co_users = [
+            row[0] for row in self.db.query(UserInteraction.user_id).filter(
+                UserInteraction.item_id.in_(set(seeds)),
+                UserInteraction.user_id != user_id
+            ).group_by(UserInteraction.user_id).order_by(
+                desc(func.max(UserInteraction.created_at))
+            ).limit(CO_OCCURRENCE_NEIGHBORS).all()
+        ]
+        if not co_users:
+            return []
+
+        rows = self.db.query(
+            UserInteraction.item_id,
+            func.sum(UserInteraction.weight).label('total_weight')
+        ).filter(
+            UserInteraction.user_id.in_(co_users),
+            UserInteraction.item_type == 'product',
+            UserInteraction.item_id.isnot(None),
+            UserInteraction.created_at >= datetime.now() - CO_OCCURRENCE_WINDOW
+        ).group_by(UserInteraction.item_id).order_by(desc('total_weight')).limit(k + len(seeds)).all()
+        seed_set = set(seeds)
+        return [item_id for item_id, _ in rows if item_id not in seed_set][:k]
+
+    def _from_creators(self, user_id: int, features: UserFeatures, k: int) -> List[str]:
+        """Products tagged in followed creators' newest posts."""
+        followed = [
+            row[0] for row in self.db.query(UserInteraction.item_id).filter(
+                UserInteraction.user_id == user_id,
+                UserInteraction.action_type == 'follow_creator',
+                UserInteraction.item_id.isnot(None)
+            ).distinct().all()
+        ]
+        if not followed:
+            return []
+
+        rows = self.db.query(PostProduct.product_id).join(
+            CreatorPost, CreatorPost.id == PostProduct.post_id
+        ).filter(
+            CreatorPost.creator_id.in_(followed),
+            PostProduct.product_id.isnot(None)
+        ).order_by(desc(CreatorPost.created_at)).limit(k).all()
+        return [row[0] for row in rows]
+
+    def _from_trending(self, user_id: int, features: UserFeatures, k: int) -> List[str]:
+        rows = self.db.query(ProductAnalytics.product_id).order_by(
+            desc(ProductAnalytics.favorite_count + ProductAnalytics.canvas_add_count)
+        ).limit(k).all()
+        return [row[0] for row in rows]
@@ -3,36 +3,19 @@ Canvas/Outfit Builder Endpoints
 Users create, save, and share outfit combinations
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 from datetime import datetime
 
-from database import get_db, User
+from async_database import get_async_db
 from canvas_models import Canvas, CanvasLike, OutfitSuggestion, CanvasTemplate
-from auth_service import get_current_user
-from fastapi import Header
+from auth_service import get_authenticated_user, AuthenticatedUser
 
 router = APIRouter(prefix="/canvas", tags=["canvas"])
 
 
-# Helper function for authentication
-def get_user_from_token(
-    authorization: str = Header(None),
-    db: Session = Depends(get_db)
-) -> User:
-    """Extract and validate user from Bearer token"""
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    return user
-
-
 # ==================== SCHEMAS ====================
 
 class CanvasCreate(BaseModel):
@@ -86,8 +69,8 @@ class CanvasResponse(BaseModel):
 @router.post("/", response_model=CanvasResponse)
 async def create_canvas(
     canvas_data: CanvasCreate,
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new outfit canvas
@@ -107,8 +90,8 @@ async def create_canvas(
     )
     
     db.add(canvas)
-    db.commit()
-    db.refresh(canvas)
+    await db.commit()
+    await db.refresh(canvas)
     
     # Track canvas creation as high-value interaction
     from interaction_models import UserInteraction
@@ -124,25 +107,28 @@ async def create_canvas(
         }
     )
     db.add(interaction)
-    db.commit()
+    await db.commit()
     
     return canvas
 
 
 @router.get("/my-canvases", response_model=List[CanvasResponse])
 async def get_my_canvases(
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db),
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db),
     limit: int = Query(50, le=100)
 ):
     """
     Get all canvases created by current user
     """
-    canvases = db.query(Canvas).filter(
-        Canvas.user_id == current_user.id
-    ).order_by(
-        Canvas.updated_at.desc()
-    ).limit(limit).all()
+    result = await db.execute(
+        select(Canvas).filter(
+            Canvas.user_id == current_user.id
+        ).order_by(
+            Canvas.updated_at.desc()
+        ).limit(limit)
+    )
+    canvases = result.scalars().all()
     
     return canvases
 
@@ -150,13 +136,13 @@ async def get_my_canvases(
 @router.get("/{canvas_id}", response_model=CanvasResponse)
 async def get_canvas(
     canvas_id: int,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_user_from_token)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[AuthenticatedUser] = Depends(get_authenticated_user)
 ):
     """
     Get a specific canvas by ID
     """
-    canvas = db.query(Canvas).filter(Canvas.id == canvas_id).first()
+    canvas = await db.get(Canvas, canvas_id)
     
     if not canvas:
         raise HTTPException(status_code=404, detail="Canvas not found")
@@ -167,7 +153,7 @@ async def get_canvas(
     
     # Increment view count
     canvas.view_count += 1
-    db.commit()
+    await db.commit()
     
     return canvas
 
@@ -176,16 +162,18 @@ async def get_canvas(
 async def update_canvas(
     canvas_id: int,
     canvas_data: CanvasUpdate,
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update canvas (add/remove items, change layout, etc.)
     """
-    canvas = db.query(Canvas).filter(
-        Canvas.id == canvas_id,
-        Canvas.user_id == current_user.id
-    ).first()
+    canvas = (await db.execute(
+        select(Canvas).filter(
+            Canvas.id == canvas_id,
+            Canvas.user_id == current_user.id
+        )
+    )).scalars().first()
     
     if not canvas:
         raise HTTPException(status_code=404, detail="Canvas not found")
@@ -210,8 +198,8 @@ async def update_canvas(
     
     canvas.updated_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(canvas)
+    await db.commit()
+    await db.refresh(canvas)
     
     return canvas
 
@@ -219,22 +207,24 @@ async def update_canvas(
 @router.delete("/{canvas_id}")
 async def delete_canvas(
     canvas_id: int,
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Delete a canvas
     """
-    canvas = db.query(Canvas).filter(
-        Canvas.id == canvas_id,
-        Canvas.user_id == current_user.id
-    ).first()
+    canvas = (await db.execute(
+        select(Canvas).filter(
+            Canvas.id == canvas_id,
+            Canvas.user_id == current_user.id
+        )
+    )).scalars().first()
     
     if not canvas:
         raise HTTPException(status_code=404, detail="Canvas not found")
     
-    db.delete(canvas)
-    db.commit()
+    await db.delete(canvas)
+    await db.commit()
     
     return {"message": "Canvas deleted"}
 
@@ -246,33 +236,34 @@ async def add_item_to_canvas(
     canvas_id: int,
     item_id: str,
     position: Optional[Dict[str, float]] = None,
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Add an item to canvas
     Quick action: "Add to Canvas" button
     """
-    canvas = db.query(Canvas).filter(
-        Canvas.id == canvas_id,
-        Canvas.user_id == current_user.id
-    ).first()
+    canvas = (await db.execute(
+        select(Canvas).filter(
+            Canvas.id == canvas_id,
+            Canvas.user_id == current_user.id
+        )
+    )).scalars().first()
     
     if not canvas:
         raise HTTPException(status_code=404, detail="Canvas not found")
     
     # Add item if not already there
     if item_id not in canvas.items:
-        canvas.items.append(item_id)
+        # Reassign (not mutate) so the JSON columns are flushed
+        canvas.items = canvas.items + [item_id]
         
         # Set position
         if position:
-            if not canvas.item_positions:
-                canvas.item_positions = {}
-            canvas.item_positions[item_id] = position
+            canvas.item_positions = {**(canvas.item_positions or {}), item_id: position}
         
         canvas.updated_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
         
         # Track as canvas add (20x weight)
         from interaction_models import UserInteraction
@@ -285,7 +276,17 @@ async def add_item_to_canvas(
             interaction_metadata={"canvas_id": canvas_id}
         )
         db.add(interaction)
-        db.commit()
+        from user_features import apply_interaction
+        from profile_builder import apply_profile_interaction
+        from item_exclusions import record_exclusion_event
+        await db.run_sync(apply_interaction, interaction)
+        await db.run_sync(apply_profile_interaction, interaction)
+        await db.run_sync(record_exclusion_event, current_user.id, item_id, "canvas_add")
+        await db.commit()
+        
+        # Feed the live session re-ranker
+        from session_events import record_session_event
+        record_session_event(current_user.id, "canvas_add", item_id)
     
     return {
         "message": "Item added to canvas",
@@ -299,29 +300,31 @@ async def add_item_to_canvas(
 async def remove_item_from_canvas(
     canvas_id: int,
     item_id: str,
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Remove an item from canvas
     """
-    canvas = db.query(Canvas).filter(
-        Canvas.id == canvas_id,
-        Canvas.user_id == current_user.id
-    ).first()
+    canvas = (await db.execute(
+        select(Canvas).filter(
+            Canvas.id == canvas_id,
+            Canvas.user_id == current_user.id
+        )
+    )).scalars().first()
     
     if not canvas:
         raise HTTPException(status_code=404, detail="Canvas not found")
     
     if item_id in canvas.items:
-        canvas.items.remove(item_id)
+        canvas.items = [i for i in canvas.items if i != item_id]
         
         # Remove position
         if canvas.item_positions and item_id in canvas.item_positions:
-            del canvas.item_positions[item_id]
+            canvas.item_positions = {k: v for k, v in canvas.item_positions.items() if k != item_id}
         
         canvas.updated_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
     
     return {
         "message": "Item removed from canvas",
@@ -335,41 +338,43 @@ async def remove_item_from_canvas(
 @router.post("/{canvas_id}/like")
 async def like_canvas(
     canvas_id: int,
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Like someone's outfit canvas
     """
-    canvas = db.query(Canvas).filter(Canvas.id == canvas_id).first()
+    canvas = await db.get(Canvas, canvas_id)
     
     if not canvas:
         raise HTTPException(status_code=404, detail="Canvas not found")
     
     # Check if already liked
-    existing_like = db.query(CanvasLike).filter(
-        CanvasLike.canvas_id == canvas_id,
-        CanvasLike.user_id == current_user.id
-    ).first()
+    existing_like = (await db.execute(
+        select(CanvasLike).filter(
+            CanvasLike.canvas_id == canvas_id,
+            CanvasLike.user_id == current_user.id
+        ).limit(1)
+    )).scalars().first()
     
     if existing_like:
         # Unlike
-        db.delete(existing_like)
+        await db.delete(existing_like)
         canvas.like_count = max(0, canvas.like_count - 1)
-        db.commit()
+        await db.commit()
         return {"message": "Unliked", "like_count": canvas.like_count}
     else:
         # Like
         like = CanvasLike(canvas_id=canvas_id, user_id=current_user.id)
         db.add(like)
         canvas.like_count += 1
-        db.commit()
+        await db.commit()
         return {"message": "Liked", "like_count": canvas.like_count}
 
 
 @router.get("/discover/public", response_model=List[CanvasResponse])
 async def discover_public_canvases(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     occasion: Optional[str] = None,
     season: Optional[str] = None,
     limit: int = Query(20, le=50)
@@ -378,17 +383,20 @@ async def discover_public_canvases(
     Discover public outfit canvases
     Browse other people's style
     """
-    query = db.query(Canvas).filter(Canvas.is_public == True)
+    query = select(Canvas).filter(Canvas.is_public == True)
     
     if occasion:
         query = query.filter(Canvas.occasion == occasion)
     if season:
         query = query.filter(Canvas.season == season)
     
-    canvases = query.order_by(
-        Canvas.like_count.desc(),
-        Canvas.created_at.desc()
-    ).limit(limit).all()
+    result = await db.execute(
+        query.order_by(
+            Canvas.like_count.desc(),
+            Canvas.created_at.desc()
+        ).limit(limit)
+    )
+    canvases = result.scalars().all()
     
     return canvases
 
@@ -398,14 +406,14 @@ async def discover_public_canvases(
 @router.get("/{canvas_id}/suggestions")
 async def get_outfit_suggestions(
     canvas_id: int,
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get AI suggestions to complete this outfit
     "You might also need..."
     """
-    canvas = db.query(Canvas).filter(Canvas.id == canvas_id).first()
+    canvas = await db.get(Canvas, canvas_id)
     
     if not canvas:
         raise HTTPException(status_code=404, detail="Canvas not found")
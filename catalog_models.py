@@ -0,0 +1,45 @@
+"""
+Product Catalog - Database Models
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Float, Index
+from datetime import datetime
+from database import Base
+
+
+class ProductCatalog(Base):
+    """
+    One row per product we can recommend.
+    Read through product_catalog.py's in-memory columnar cache, never per product.
+    """
+    __tablename__ = "product_catalog"
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(String, unique=True, nullable=False, index=True)
+    name = Column(String, nullable=True)
+    category = Column(String, nullable=True)
+    brand = Column(String, nullable=True)
+    color = Column(String, nullable=True)
+    style = Column(String, nullable=True)
+    price = Column(Float, nullable=True)
+    retailer = Column(String, nullable=True)
+    image_url = Column(String, nullable=True)
+    embedding_row = Column(Integer, nullable=True)  # Row in the product embedding matrix (CLIP)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+
+class ProductPricePoint(Base):
+    """
+    Append-only price time series, one series per product (shared by every
+    user who favorited it). Read through price_history.py, which downsamples.
+    """
+    __tablename__ = "product_price_points"
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(String, nullable=False)
+    ts = Column(DateTime, nullable=False, default=datetime.utcnow)
+    price = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index('idx_price_point_product_ts', 'product_id', 'ts'),
+    )
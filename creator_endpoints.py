@@ -1,7 +1,7 @@
 """
 Creator Posts API Endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
@@ -12,6 +12,7 @@ import shutil
 
 from database import get_db, User
 from creator_models import CreatorPost, PostProduct
+from pagination import paginate
 
 router = APIRouter(prefix="/creators", tags=["creators"])
 
@@ -66,8 +67,8 @@ class CreatorProfileResponse(BaseModel):
 
 class PostsListResponse(BaseModel):
     posts: List[CreatorPostResponse]
-    total_count: int
     has_more: bool
+    next_cursor: Optional[str] = None
 
 
 # ==================== ENDPOINTS ====================
@@ -75,27 +76,20 @@ class PostsListResponse(BaseModel):
 @router.get("/{creator_id}/posts", response_model=PostsListResponse)
 def get_creator_posts(
     creator_id: str,
-    limit: int = 20,
-    offset: int = 0,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get posts for a specific creator"""
-    total_count = db.query(CreatorPost).filter(
-        CreatorPost.creator_id == creator_id
-    ).count()
-    
-    posts = db.query(CreatorPost).filter(
-        CreatorPost.creator_id == creator_id
-    ).order_by(
-        CreatorPost.created_at.desc()
-    ).limit(limit).offset(offset).all()
-    
-    has_more = (offset + limit) < total_count
+    """Get posts for a specific creator, newest first (pass next_cursor for the next page)"""
+    posts, next_cursor = paginate(
+        db.query(CreatorPost).filter(CreatorPost.creator_id == creator_id),
+        CreatorPost, cursor=cursor, limit=limit
+    )
     
     return {
         "posts": posts,
-        "total_count": total_count,
-        "has_more": has_more
+        "has_more": next_cursor is not None,
+        "next_cursor": next_cursor
     }
 
 
@@ -1,7 +1,7 @@
 """
 Creator Posts System - Database Models
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -25,6 +25,15 @@ class CreatorPost(Base):
     # No back_populates - one-way relationship only
     products = relationship("PostProduct", back_populates="post", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('idx_creator_posts_creator_created', 'creator_id', 'created_at', 'id'),  # Keyset pagination
+    )
+    
+    @property
+    def product_ids(self):
+        """IDs of the products tagged in this post"""
+        return [p.product_id for p in self.products if p.product_id]
+
 
 class PostProduct(Base):
     """Products tagged in creator posts"""
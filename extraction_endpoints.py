@@ -2,35 +2,19 @@
 Item Extraction Endpoints
 Upload outfit photo → Get individual items
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 
-from database import get_db, User
-from auth_service import get_current_user
+from async_database import get_async_db
+from auth_service import get_authenticated_user, AuthenticatedUser
 from item_extraction_smart import SmartExtractor as ItemExtractor, create_wardrobe_items_from_extraction
 
 router = APIRouter(prefix="/extract", tags=["extraction"])
 
 
-# Helper function for authentication
-def get_user_from_token(
-    authorization: str = Header(None),
-    db: Session = Depends(get_db)
-) -> User:
-    """Extract and validate user from Bearer token"""
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    return user
-
-
 # ==================== SCHEMAS ====================
 
 class ExtractionResult(BaseModel):
@@ -53,8 +37,8 @@ class ItemConfirmation(BaseModel):
 async def extract_items_from_outfit(
     file: UploadFile = File(...),
     upload_type: str = Form("auto"),
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload a full outfit photo and extract individual items
@@ -102,7 +86,7 @@ async def extract_items_from_outfit(
         }
     )
     db.add(interaction)
-    db.commit()
+    await db.commit()
     
     return results
 
@@ -110,8 +94,8 @@ async def extract_items_from_outfit(
 @router.post("/confirm-items")
 async def confirm_extracted_items(
     items: List[ItemConfirmation],
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Confirm which extracted items to add to wardrobe
@@ -156,7 +140,7 @@ async def confirm_extracted_items(
             )
             db.add(interaction)
     
-    db.commit()
+    await db.commit()
     
     return {
         "confirmed_count": len(confirmed_items),
@@ -168,8 +152,8 @@ async def confirm_extracted_items(
 @router.post("/batch-upload")
 async def batch_upload_outfits(
     files: List[UploadFile] = File(...),
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload multiple outfit photos at once
@@ -212,8 +196,8 @@ async def batch_upload_outfits(
 
 @router.get("/extraction-stats")
 async def get_extraction_stats(
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get stats on user's item extractions
@@ -227,17 +211,21 @@ async def get_extraction_stats(
     from interaction_models import UserInteraction
     
     # Count outfit uploads
-    uploads = db.query(UserInteraction).filter(
-        UserInteraction.user_id == current_user.id,
-        UserInteraction.action_type == "outfit_photo_upload"
-    ).count()
+    uploads = await db.scalar(
+        select(func.count(UserInteraction.id)).filter(
+            UserInteraction.user_id == current_user.id,
+            UserInteraction.action_type == "outfit_photo_upload"
+        )
+    )
     
     # Count items added from extraction
-    wardrobe_adds = db.query(UserInteraction).filter(
-        UserInteraction.user_id == current_user.id,
-        UserInteraction.action_type == "wardrobe_add",
-        UserInteraction.interaction_metadata.contains({"source": "outfit_extraction"})
-    ).count()
+    wardrobe_adds = await db.scalar(
+        select(func.count(UserInteraction.id)).filter(
+            UserInteraction.user_id == current_user.id,
+            UserInteraction.action_type == "wardrobe_add",
+            UserInteraction.interaction_metadata.contains({"source": "outfit_extraction"})
+        )
+    )
     
     return {
         "outfit_photos_uploaded": uploads,
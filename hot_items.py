@@ -0,0 +1,228 @@
+# hot_items.py
+# Real-time hot items: Count-Min Sketches + top-K candidates over sliding windows
+#
+# Every tracked product interaction is added to two windows: the last hour
+# (12 x 5-minute buckets) and the last day (24 x 1-hour buckets). Each bucket is
+# a pair of Count-Min Sketches (event count, summed action weight); a window
+# keeps the running sum of its live buckets, so estimates are O(depth) and
+# memory is fixed regardless of traffic. A bounded candidate set per window
+# remembers which items are worth estimating when someone asks for the top-K.
+#
+# State is per process and snapshotted to HOT_ITEMS_SNAPSHOT every
+# SNAPSHOT_INTERVAL seconds (and at exit), then reloaded on start so a restart
+# doesn't wipe the last hour.
+
+from typing import List, Dict, Any, Optional, Tuple
+import atexit
+import hashlib
+import heapq
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+HOT_ITEMS_SNAPSHOT = os.getenv("HOT_ITEMS_SNAPSHOT", "snapshots/hot_items.npz")
+SNAPSHOT_INTERVAL = 60  # seconds
+
+SKETCH_WIDTH = 2048
+SKETCH_DEPTH = 4
+TOP_K_CAPACITY = 200
+
+# name -> (bucket seconds, bucket count)
+WINDOWS = {
+    '1h': (300, 12),
+    '24h': (3600, 24),
+}
+
+
+# ============================================
+# COUNT-MIN SKETCH
+# ============================================
+
+def _hash_columns(key: str) -> np.ndarray:
+    """SKETCH_DEPTH column indexes from one stable digest (stable across restarts, unlike hash())."""
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=4 * SKETCH_DEPTH).digest()
+    return np.frombuffer(digest, dtype=np.uint32) % SKETCH_WIDTH
+
+
+_ROWS = np.arange(SKETCH_DEPTH)
+
+
+class SlidingWindow:
+    """Ring of sketch buckets plus their running sum and a bounded top-K candidate set."""
+
+    def __init__(self, bucket_seconds: int, buckets: int):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        # [bucket, channel (0=count, 1=weight), depth, width]
+        self.ring = np.zeros((buckets, 2, SKETCH_DEPTH, SKETCH_WIDTH), dtype=np.float32)
+        self.total = np.zeros((2, SKETCH_DEPTH, SKETCH_WIDTH), dtype=np.float32)
+        self.slot = int(time.time() // bucket_seconds)
+        self.candidates: Dict[str, float] = {}
+        self.floor = 0.0  # Weight an item needs to become a candidate once the set is full
+
+    def advance(self, now: float):
+        """Expire every bucket that has slid out of the window."""
+        slot = int(now // self.bucket_seconds)
+        if slot <= self.slot:
+            return
+        if slot - self.slot >= self.buckets:
+            self.ring[:] = 0
+            self.total[:] = 0
+            self.candidates.clear()
+        else:
+            for expired in range(self.slot + 1, slot + 1):
+                bucket = self.ring[expired % self.buckets]
+                self.total -= bucket
+                bucket[:] = 0
+            np.maximum(self.total, 0, out=self.total)  # float drift
+        self.floor = 0.0
+        self.slot = slot
+
+    def add(self, columns: np.ndarray, item_id: str, increment: np.ndarray):
+        """increment is [[1], [weight]]: one event on the count channel, its weight on the other."""
+        self.ring[self.slot % self.buckets][:, _ROWS, columns] += increment
+        self.total[:, _ROWS, columns] += increment
+
+        score = float(self.total[1, _ROWS, columns].min())
+        if item_id in self.candidates or score > self.floor:
+            self.candidates[item_id] = score
+            if len(self.candidates) > TOP_K_CAPACITY * 2:
+                self._prune()
+
+    def estimate(self, columns: np.ndarray) -> Tuple[float, float]:
+        """(count, weight) upper-bound estimates for one item."""
+        return (
+            float(self.total[0, _ROWS, columns].min()),
+            float(self.total[1, _ROWS, columns].min())
+        )
+
+    def top(self, k: int) -> List[Tuple[str, float, float]]:
+        """Re-estimate the candidates against the live window and keep the k heaviest."""
+        scored = []
+        for item_id in self.candidates:
+            count, weight = self.estimate(_hash_columns(item_id))
+            if count > 0:
+                scored.append((item_id, count, weight))
+        return heapq.nlargest(k, scored, key=lambda entry: entry[2])
+
+    def _prune(self):
+        keep = heapq.nlargest(TOP_K_CAPACITY, self.candidates.items(), key=lambda entry: entry[1])
+        self.candidates = dict(keep)
+        self.floor = keep[-1][1] if keep else 0.0
+
+
+# ============================================
+# TRACKER
+# ============================================
+
+class HotItemsTracker:
+    """Heavy hitters over the last hour and day, fed by track_interaction."""
+
+    def __init__(self, snapshot_path: Optional[str] = HOT_ITEMS_SNAPSHOT):
+        self.snapshot_path = snapshot_path
+        self.windows = {name: SlidingWindow(*spec) for name, spec in WINDOWS.items()}
+        self.events = 0
+        self.last_snapshot = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, item_id: str, weight: float = 1.0, now: Optional[float] = None):
+        if not item_id or weight <= 0:
+            return
+        now = now or time.time()
+        columns = _hash_columns(item_id)
+        increment = np.array([[1.0], [weight]], dtype=np.float32)
+        with self._lock:
+            for window in self.windows.values():
+                window.advance(now)
+                window.add(columns, item_id, increment)
+            self.events += 1
+
+    def estimate(self, item_id: str, window: str = '24h') -> Dict[str, float]:
+        """Interactions and summed weight for one item in the window (never under-counts)."""
+        columns = _hash_columns(item_id)
+        with self._lock:
+            self.windows[window].advance(time.time())
+            count, weight = self.windows[window].estimate(columns)
+        return {"count": count, "weight": weight}
+
+    def top(self, k: int = 20, window: str = '1h') -> List[Dict[str, Any]]:
+        with self._lock:
+            self.windows[window].advance(time.time())
+            entries = self.windows[window].top(k)
+        return [
+            {"product_id": item_id, "count": int(round(count)), "weight": weight}
+            for item_id, count, weight in entries
+        ]
+
+    # ---------- snapshots ----------
+
+    def snapshot(self):
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            arrays = {}
+            meta = {"events": self.events, "saved_at": time.time(), "windows": {}}
+            for name, window in self.windows.items():
+                arrays[f"{name}_ring"] = window.ring.copy()
+                arrays[f"{name}_total"] = window.total.copy()
+                meta["windows"][name] = {"slot": window.slot, "candidates": dict(window.candidates)}
+
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        tmp = self.snapshot_path + ".tmp.npz"
+        np.savez(tmp, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, self.snapshot_path)
+        self.last_snapshot = time.time()
+
+    def restore(self) -> bool:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            data = np.load(self.snapshot_path, allow_pickle=False)
+            meta = json.loads(str(data["meta"]))
+            for name, window in self.windows.items():
+                saved = meta["windows"].get(name)
+                ring = data[f"{name}_ring"] if f"{name}_ring" in data.files else None
+                if saved is None or ring is None or ring.shape != window.ring.shape:
+                    continue  # Window layout changed since the snapshot
+                window.ring[:] = ring
+                window.total[:] = data[f"{name}_total"]
+                window.slot = saved["slot"]
+                window.candidates = dict(saved["candidates"])
+                window.advance(time.time())
+            self.events = meta.get("events", 0)
+            return True
+        except Exception as e:
+            print(f"Could not restore hot items snapshot {self.snapshot_path}: {e}")
+            return False
+
+
+_tracker: Optional[HotItemsTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def _snapshot_loop(tracker: HotItemsTracker):
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL)
+        try:
+            tracker.snapshot()
+        except Exception as e:
+            print(f"Hot items snapshot failed: {e}")
+
+
+def get_hot_items_tracker() -> HotItemsTracker:
+    """Process-wide tracker, restored from the last snapshot and snapshotted in the background."""
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                tracker = HotItemsTracker()
+                if tracker.restore():
+                    print(f"Restored hot items from {tracker.snapshot_path} ({tracker.events} events)")
+                threading.Thread(target=_snapshot_loop, args=(tracker,), daemon=True).start()
+                atexit.register(tracker.snapshot)
+                _tracker = tracker
+    return _tracker
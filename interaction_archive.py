@@ -0,0 +1,350 @@
+# interaction_archive.py
+# Retention for user_interactions: a 90-day hot table, monthly SQLite archive files
+#
+# Usage:
+#   python interaction_archive.py                 # archive everything past retention
+#   python interaction_archive.py --migrate       # first run on an old DB: roll up, archive, VACUUM
+#   python interaction_archive.py --status        # hot table, archivable rows, archive files
+#   python interaction_archive.py --query --user 42 --since 2025-01-01 --action view_product
+#
+# The engine only reads the last 90 days, so older activity moves out in
+# ARCHIVE_BATCH-row batches to ARCHIVE_DIR/interactions_YYYY_MM.db (same
+# columns, metadata as JSON text). Each batch is committed to its archive file
+# before it is deleted from the hot table, and archive inserts are keyed by the
+# original id, so a crash between the two steps just re-archives that batch.
+#
+# Long-term stats stay in interaction_rollups_daily: rows are only archived
+# once the daily rollup watermark has passed them and their id is one the
+# rollups have covered (a late row waits for the roller). Actions that record
+# state rather than activity (ownership, follows, purchases, dislikes) stay in
+# the hot table whatever their age, because wardrobe analysis, followed-creator
+# recommendations and exclusions read them over the user's whole history.
+
+from typing import List, Dict, Any, Optional, Iterator
+from datetime import datetime, timedelta
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, init_db
+from interaction_models import UserInteraction
+from interaction_rollups import run_rollups, _get_watermark, _get_rolled_id, _set_watermark, _floor_day
+
+
+HOT_RETENTION_DAYS = int(os.getenv("INTERACTION_RETENTION_DAYS", "90"))
+ARCHIVE_DIR = os.getenv("INTERACTION_ARCHIVE_DIR", "archive/interactions")
+ARCHIVE_BATCH = 5000
+ARCHIVE_INTERVAL = 6 * 3600  # Seconds between background runs
+
+PINNED_ACTIONS = {
+    'wardrobe_upload', 'wardrobe_add', 'outfit_photo_upload', 'canvas_add',
+    'purchase_complete', 'dislike_product', 'follow_creator'
+}
+
+_COLUMNS = (
+    'id', 'user_id', 'action_type', 'item_id', 'item_type',
+    'interaction_metadata', 'weight', 'source', 'created_at'
+)
+
+_ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_interactions (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    action_type TEXT NOT NULL,
+    item_id TEXT,
+    item_type TEXT,
+    interaction_metadata TEXT,
+    weight REAL,
+    source TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_archive_user_time ON user_interactions (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_archive_item ON user_interactions (item_id, created_at);
+"""
+
+
+# ============================================
+# ARCHIVE FILES
+# ============================================
+
+def _month_key(dt: datetime) -> str:
+    return dt.strftime('%Y_%m')
+
+
+def _archive_path(month: str, archive_dir: str = ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, f"interactions_{month}.db")
+
+
+def _open_archive(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(_ARCHIVE_SCHEMA)
+    return conn
+
+
+def _write_archive(month: str, rows: List[tuple], archive_dir: str = ARCHIVE_DIR):
+    """Append rows (in _COLUMNS order) to a month's file; re-archived ids are ignored."""
+    conn = _open_archive(_archive_path(month, archive_dir))
+    try:
+        with conn:
+            conn.executemany(
+                f"INSERT OR IGNORE INTO user_interactions ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                [
+                    (
+                        row.id, row.user_id, row.action_type, row.item_id, row.item_type,
+                        json.dumps(row.interaction_metadata) if row.interaction_metadata is not None else None,
+                        row.weight, row.source,
+                        row.created_at.replace(tzinfo=None).isoformat(sep=' ')
+                    )
+                    for row in rows
+                ]
+            )
+    finally:
+        conn.close()
+
+
+def archive_files(archive_dir: str = ARCHIVE_DIR) -> Dict[str, str]:
+    """month ('YYYY_MM') -> path, oldest first."""
+    files = {}
+    for path in sorted(glob.glob(os.path.join(archive_dir, "interactions_*.db"))):
+        files[os.path.basename(path)[len("interactions_"):-len(".db")]] = path
+    return files
+
+
+# ============================================
+# ARCHIVER
+# ============================================
+
+def archive_cutoff(db: Session, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Rows before this can leave the hot table: past retention and already in the daily rollups."""
+    daily_watermark = _get_watermark(db, 'daily')
+    if daily_watermark is None:
+        return None
+    retention = _floor_day((now or datetime.utcnow()) - timedelta(days=HOT_RETENTION_DAYS))
+    return min(retention, daily_watermark)
+
+
+def _archivable(db: Session, cutoff: datetime, rolled_id: int):
+    return db.query(UserInteraction).filter(
+        UserInteraction.created_at < cutoff,
+        UserInteraction.id <= rolled_id,
+        UserInteraction.action_type.notin_(PINNED_ACTIONS)
+    )
+
+
+def archive_interactions(
+    db: Session,
+    now: Optional[datetime] = None,
+    batch_size: int = ARCHIVE_BATCH,
+    archive_dir: str = ARCHIVE_DIR
+) -> Dict[str, Any]:
+    """Move every archivable row to its monthly file, batch by batch."""
+    started = time.perf_counter()
+    cutoff = archive_cutoff(db, now)
+    rolled_id = _get_rolled_id(db)
+    if cutoff is None or rolled_id is None:
+        print("No daily rollups yet; run interaction_rollups.py before archiving")
+        return {'archived': 0, 'months': [], 'cutoff': None, 'seconds': 0.0}
+
+    archived = 0
+    months = set()
+    last_id = 0
+    while True:
+        rows = db.query(*(getattr(UserInteraction, c) for c in _COLUMNS)).filter(
+            UserInteraction.id > last_id,
+            UserInteraction.id <= rolled_id,  # Late rows wait until they're rolled up
+            UserInteraction.created_at < cutoff,
+            UserInteraction.action_type.notin_(PINNED_ACTIONS)
+        ).order_by(UserInteraction.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        by_month: Dict[str, List[tuple]] = {}
+        for row in rows:
+            by_month.setdefault(_month_key(row.created_at), []).append(row)
+        for month, month_rows in by_month.items():
+            _write_archive(month, month_rows, archive_dir)
+        months.update(by_month)
+
+        # Only after the archive commit
+        db.query(UserInteraction).filter(
+            UserInteraction.id.in_([row.id for row in rows])
+        ).delete(synchronize_session=False)
+        db.commit()
+
+        archived += len(rows)
+        last_id = rows[-1].id
+        print(f"Archived {archived} interactions (through {rows[-1].created_at})")
+
+    _set_watermark(db, 'archive', cutoff)
+    db.commit()
+
+    result = {
+        'archived': archived,
+        'months': sorted(months),
+        'cutoff': cutoff.isoformat(),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    if archived:
+        print(f"Archived {archived} interactions before {cutoff} into {len(months)} monthly files in {result['seconds']}s")
+    return result
+
+
+def migrate(db: Session, vacuum: bool = True, archive_dir: str = ARCHIVE_DIR) -> Dict[str, Any]:
+    """
+    One-off path for a database that has never been pruned: build the rollups
+    over the full history, archive everything past retention, then VACUUM
+    (SQLite) so the file actually shrinks.
+    """
+    run_rollups(db)
+    result = archive_interactions(db, archive_dir=archive_dir)
+    if vacuum and result['archived'] and db.get_bind().dialect.name == 'sqlite':
+        print("Vacuuming...")
+        db.close()
+        with db.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM")
+    return result
+
+
+def archive_status(db: Session, archive_dir: str = ARCHIVE_DIR) -> Dict[str, Any]:
+    cutoff = archive_cutoff(db)
+    rolled_id = _get_rolled_id(db)
+    status = {
+        'hot_rows': db.query(func.count(UserInteraction.id)).scalar(),
+        'oldest_hot': db.query(func.min(UserInteraction.created_at)).scalar(),
+        'archive_watermark': _get_watermark(db, 'archive'),
+        'cutoff': cutoff,
+        'archivable_rows': _archivable(db, cutoff, rolled_id).count() if cutoff and rolled_id is not None else None,
+        'files': [],
+    }
+    for month, path in archive_files(archive_dir).items():
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute("SELECT COUNT(*) FROM user_interactions").fetchone()[0]
+        finally:
+            conn.close()
+        status['files'].append({'month': month, 'rows': rows, 'bytes': os.path.getsize(path)})
+    return status
+
+
+_archiver_started = False
+_archiver_lock = threading.Lock()
+
+
+def _archiver_loop(session_factory, interval: int):
+    while True:
+        time.sleep(interval)
+        db = session_factory()
+        try:
+            archive_interactions(db)
+        except Exception as e:
+            print(f"Interaction archival failed: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+
+def start_archiver(session_factory=SessionLocal, interval: int = ARCHIVE_INTERVAL):
+    """Start the background archiver once per process."""
+    global _archiver_started
+    with _archiver_lock:
+        if _archiver_started:
+            return
+        threading.Thread(target=_archiver_loop, args=(session_factory, interval), daemon=True).start()
+        _archiver_started = True
+
+
+# ============================================
+# READ PATH
+# ============================================
+
+def query_archive(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user_id: Optional[int] = None,
+    item_id: Optional[str] = None,
+    action_type: Optional[str] = None,
+    limit: Optional[int] = None,
+    archive_dir: str = ARCHIVE_DIR
+) -> Iterator[Dict[str, Any]]:
+    """Archived interactions in [since, until), oldest first, opening only the months in range."""
+    clauses, params = [], []
+    if since is not None:
+        clauses.append("created_at >= ?")
+        params.append(since.isoformat(sep=' '))
+    if until is not None:
+        clauses.append("created_at < ?")
+        params.append(until.isoformat(sep=' '))
+    for column, value in (('user_id', user_id), ('item_id', item_id), ('action_type', action_type)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    sql = f"SELECT {', '.join(_COLUMNS)} FROM user_interactions"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY created_at, id"
+
+    remaining = limit
+    for month, path in archive_files(archive_dir).items():
+        if since is not None and month < _month_key(since):
+            continue
+        if until is not None and month > _month_key(until):
+            break
+        conn = sqlite3.connect(path)
+        try:
+            for row in conn.execute(sql + (f" LIMIT {int(remaining)}" if remaining is not None else ""), params):
+                record = dict(zip(_COLUMNS, row))
+                record['interaction_metadata'] = json.loads(record['interaction_metadata']) if record['interaction_metadata'] else None
+                record['created_at'] = datetime.fromisoformat(record['created_at'])
+                yield record
+                if remaining is not None:
+                    remaining -= 1
+        finally:
+            conn.close()
+        if remaining is not None and remaining <= 0:
+            return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive user_interactions past retention, or query the archive")
+    parser.add_argument("--status", action="store_true", help="Show hot table, cutoff and archive files")
+    parser.add_argument("--migrate", action="store_true", help="Roll up full history, archive, then VACUUM")
+    parser.add_argument("--no-vacuum", action="store_true", help="With --migrate, skip VACUUM")
+    parser.add_argument("--query", action="store_true", help="Print archived interactions as JSON lines")
+    parser.add_argument("--user", type=int)
+    parser.add_argument("--item")
+    parser.add_argument("--action")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    if args.query:
+        for record in query_archive(args.since, args.until, args.user, args.item, args.action, args.limit, args.archive_dir):
+            print(json.dumps(record, default=str))
+        raise SystemExit(0)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.status:
+            status = archive_status(db, args.archive_dir)
+            for key in ('hot_rows', 'oldest_hot', 'archive_watermark', 'cutoff', 'archivable_rows'):
+                print(f"{key}: {status[key]}")
+            for f in status['files']:
+                print(f"  {f['month']}: {f['rows']} rows, {f['bytes'] / 1e6:.1f} MB")
+        elif args.migrate:
+            migrate(db, vacuum=not args.no_vacuum, archive_dir=args.archive_dir)
+        else:
+            archive_interactions(db, archive_dir=args.archive_dir)
+    finally:
+        db.close()
@@ -0,0 +1,394 @@
+# interaction_export.py
+# Incremental Parquet export of user_interactions for offline analytics
+#
+# Usage:
+#   python interaction_export.py                  # export rows added since the last run
+#   python interaction_export.py --from-archive   # also backfill months already archived
+#   python interaction_export.py --status
+#
+# Layout: EXPORT_DIR/day=YYYY-MM-DD/part-<first id>-<last id>.parquet (zstd),
+# one new part per day touched by each run. Rows are picked up by id past the
+# last exported id (kept in EXPORT_DIR/_state.json) rather than by time, so a
+# row flushed late by the write-behind buffer still lands in its own day and
+# nothing is written twice.
+#
+# Metadata is flattened into typed meta_* columns (strings, float price, string
+# lists); keys outside that set are kept as JSON in metadata_extra.
+#
+# The query layer (read_events, product_totals, product_daily_metrics, funnel)
+# reads only the day partitions and columns it needs, so analytics endpoints
+# and notebooks never touch the production database.
+
+from typing import List, Dict, Any, Optional, Iterable
+from datetime import datetime, date
+import argparse
+import json
+import os
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from database import SessionLocal, init_db
+from analytics_counters import ACTION_COUNTERS, COUNTERS
+from interaction_models import UserInteraction
+from product_catalog import parse_price
+
+
+EXPORT_DIR = os.getenv("INTERACTION_EXPORT_DIR", "exports/interactions")
+EXPORT_BATCH = 50000
+EXPORT_INTERVAL = 900  # Seconds between background runs
+
+META_STRINGS = ('brand', 'color', 'category', 'style', 'size', 'query')
+META_LISTS = ('tags', 'colors', 'creator_style')
+
+SCHEMA = pa.schema(
+    [
+        ('id', pa.int64()),
+        ('user_id', pa.int64()),
+        ('action_type', pa.string()),
+        ('item_id', pa.string()),
+        ('item_type', pa.string()),
+        ('source', pa.string()),
+        ('weight', pa.float64()),
+        ('created_at', pa.timestamp('us')),
+    ]
+    + [(f'meta_{key}', pa.string()) for key in META_STRINGS]
+    + [('meta_price', pa.float64())]
+    + [(f'meta_{key}', pa.list_(pa.string())) for key in META_LISTS]
+    + [('metadata_extra', pa.string())]
+)
+
+_FLATTENED = set(META_STRINGS) | set(META_LISTS) | {'price'}
+
+
+# ============================================
+# WRITE PATH
+# ============================================
+
+def _flatten(record: Dict[str, Any]) -> Dict[str, Any]:
+    """One interaction (UserInteraction columns) -> one export row."""
+    metadata = record.get('interaction_metadata')
+    metadata = metadata if isinstance(metadata, dict) else {}
+    row = {
+        'id': record['id'],
+        'user_id': record['user_id'],
+        'action_type': record['action_type'],
+        'item_id': record['item_id'],
+        'item_type': record['item_type'],
+        'source': record['source'],
+        'weight': record['weight'],
+        'created_at': record['created_at'].replace(tzinfo=None),
+        'meta_price': parse_price(metadata.get('price')),
+    }
+    for key in META_STRINGS:
+        value = metadata.get(key)
+        row[f'meta_{key}'] = None if value is None or isinstance(value, (dict, list)) else str(value)
+    for key in META_LISTS:
+        value = metadata.get(key)
+        row[f'meta_{key}'] = [str(v) for v in value if v is not None] if isinstance(value, list) else None
+    extra = {k: v for k, v in metadata.items() if k not in _FLATTENED}
+    row['metadata_extra'] = json.dumps(extra, default=str) if extra else None
+    return row
+
+
+def _read_state(export_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(export_dir, '_state.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'last_id': 0, 'rows': 0}
+
+
+def _write_state(export_dir: str, state: Dict[str, Any]):
+    path = os.path.join(export_dir, '_state.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+def _write_days(records: Iterable[Dict[str, Any]], export_dir: str) -> Dict[str, int]:
+    """Write one part file per day; returns rows per day."""
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        row = _flatten(record)
+        by_day.setdefault(row['created_at'].date().isoformat(), []).append(row)
+
+    for day, rows in by_day.items():
+        directory = os.path.join(export_dir, f"day={day}")
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{rows[0]['id']}-{rows[-1]['id']}.parquet"
+        table = pa.Table.from_pylist(rows, schema=SCHEMA)
+        tmp = os.path.join(directory, '.' + name)  # Dot files are skipped by readers
+        pq.write_table(table, tmp, compression='zstd')
+        os.replace(tmp, os.path.join(directory, name))
+    return {day: len(rows) for day, rows in by_day.items()}
+
+
+def export_interactions(db, export_dir: str = EXPORT_DIR, batch_size: int = EXPORT_BATCH) -> Dict[str, Any]:
+    """Export rows past the last exported id, batch by batch."""
+    started = time.perf_counter()
+    os.makedirs(export_dir, exist_ok=True)
+    state = _read_state(export_dir)
+    if 'archived_before' not in state:
+        # Rows archived before the first export never reached it (see export_archive)
+        from interaction_rollups import _get_watermark
+        watermark = _get_watermark(db, 'archive')
+        state['archived_before'] = watermark.isoformat() if watermark else None
+    columns = [getattr(UserInteraction, c) for c in (
+        'id', 'user_id', 'action_type', 'item_id', 'item_type', 'interaction_metadata', 'weight', 'source', 'created_at'
+    )]
+
+    exported = 0
+    days = set()
+    while True:
+        rows = db.query(*columns).filter(
+            UserInteraction.id > state['last_id']
+        ).order_by(UserInteraction.id).limit(batch_size).all()
+        if not rows:
+            break
+        written = _write_days((row._asdict() for row in rows), export_dir)
+        days.update(written)
+
+        # State after the files, so a crash re-exports (never skips) a batch
+        state['last_id'] = rows[-1].id
+        state['rows'] = state.get('rows', 0) + len(rows)
+        state['exported_at'] = datetime.utcnow().isoformat()
+        _write_state(export_dir, state)
+        exported += len(rows)
+
+    result = {'exported': exported, 'days': sorted(days), 'seconds': round(time.perf_counter() - started, 3)}
+    if exported:
+        print(f"Exported {exported} interactions into {len(days)} day partitions in {result['seconds']}s")
+    return result
+
+
+def export_archive(export_dir: str = EXPORT_DIR, archive_dir: Optional[str] = None) -> int:
+    """
+    Backfill rows interaction_archive.py moved out before the first export.
+    Anything archived later was exported while still hot, so only archived
+    rows older than the archive watermark at that first export are read.
+    """
+    from interaction_archive import ARCHIVE_DIR, archive_files, query_archive
+
+    archive_dir = archive_dir or ARCHIVE_DIR
+    state = _read_state(export_dir)
+    if not state.get('archived_before'):
+        return 0  # Nothing was archived before exports started (or no export has run yet)
+    archived_before = datetime.fromisoformat(state['archived_before'])
+    backfilled = state.get('archive_months', [])
+    exported = 0
+    for month in archive_files(archive_dir):
+        if month in backfilled:
+            continue
+        year, number = (int(part) for part in month.split('_'))
+        start = datetime(year, number, 1)
+        end = datetime(year + number // 12, number % 12 + 1, 1)
+        if start >= archived_before:
+            break
+        records = list(query_archive(since=start, until=min(end, archived_before), archive_dir=archive_dir))
+        if records:
+            _write_days(records, export_dir)
+        backfilled.append(month)
+        state['archive_months'] = backfilled
+        state['rows'] = state.get('rows', 0) + len(records)
+        _write_state(export_dir, state)
+        exported += len(records)
+        print(f"Backfilled {len(records)} archived interactions from {month}")
+    return exported
+
+
+_exporter_started = False
+_exporter_lock = threading.Lock()
+
+
+def _exporter_loop(session_factory, interval: int):
+    while True:
+        time.sleep(interval)
+        db = session_factory()
+        try:
+            export_interactions(db)
+        except Exception as e:
+            print(f"Interaction export failed: {e}")
+        finally:
+            db.close()
+
+
+def start_exporter(session_factory=SessionLocal, interval: int = EXPORT_INTERVAL):
+    """Start the background exporter once per process."""
+    global _exporter_started
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        threading.Thread(target=_exporter_loop, args=(session_factory, interval), daemon=True).start()
+        _exporter_started = True
+
+
+# ============================================
+# QUERY LAYER
+# ============================================
+
+def _day_filter(since: Optional[date], until: Optional[date]):
+    """Partition pruning on the day=... directories, [since, until)."""
+    clauses = []
+    if since is not None:
+        clauses.append(pc.field('day') >= since.isoformat())
+    if until is not None:
+        clauses.append(pc.field('day') < until.isoformat())
+    expression = None
+    for clause in clauses:
+        expression = clause if expression is None else expression & clause
+    return expression
+
+
+def read_events(
+    columns: Optional[List[str]] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    filter=None,
+    export_dir: str = EXPORT_DIR
+) -> pa.Table:
+    """
+    Exported interactions as an Arrow table (call .to_pandas() in a notebook).
+    Only the day partitions in [since, until) and the requested columns are read;
+    `filter` is an extra pyarrow.compute expression, e.g. pc.field('item_id') == 'p1'.
+    """
+    if not os.path.isdir(export_dir):
+        return SCHEMA.empty_table().select(columns) if columns else SCHEMA.empty_table()
+    dataset = ds.dataset(
+        export_dir, format='parquet', schema=SCHEMA.append(pa.field('day', pa.string())),
+        partitioning=ds.partitioning(pa.schema([('day', pa.string())]), flavor='hive')
+    )
+    expression = _day_filter(since, until)
+    if filter is not None:
+        expression = filter if expression is None else expression & filter
+    return dataset.to_table(columns=columns, filter=expression)
+
+
+def product_totals(
+    product_id: str,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    export_dir: str = EXPORT_DIR
+) -> Dict[str, Any]:
+    """
+    The ProductAnalytics counters for one product (view/favorite/canvas add/
+    click-through counts and wishlist_to_canvas_rate), counted from the export.
+    """
+    table = read_events(
+        ['action_type'], since, until,
+        (pc.field('item_id') == product_id) & pc.field('action_type').isin(list(ACTION_COUNTERS)), export_dir
+    )
+    totals = dict.fromkeys(COUNTERS, 0)
+    if table.num_rows:
+        counts = table.group_by('action_type').aggregate([('action_type', 'count')])
+        for action, n in zip(counts['action_type'].to_pylist(), counts['action_type_count'].to_pylist()):
+            totals[ACTION_COUNTERS[action]] += n
+    favorites = totals['favorite_count']
+    totals['wishlist_to_canvas_rate'] = totals['canvas_add_count'] / favorites if favorites else 0.0
+    return totals
+
+
+def product_daily_metrics(
+    product_id: str,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    export_dir: str = EXPORT_DIR
+) -> List[Dict[str, Any]]:
+    """Per-day event counts and distinct users for one product."""
+    table = read_events(
+        ['day', 'action_type', 'user_id'], since, until,
+        pc.field('item_id') == product_id, export_dir
+    )
+    if table.num_rows == 0:
+        return []
+    counts = table.group_by(['day', 'action_type']).aggregate([('user_id', 'count')])
+    users = table.group_by('day').aggregate([('user_id', 'count_distinct')])
+
+    days: Dict[str, Dict[str, Any]] = {
+        day: {'day': day, 'unique_users': n, 'actions': {}}
+        for day, n in zip(users['day'].to_pylist(), users['user_id_count_distinct'].to_pylist())
+    }
+    for day, action, n in zip(
+        counts['day'].to_pylist(), counts['action_type'].to_pylist(), counts['user_id_count'].to_pylist()
+    ):
+        days[day]['actions'][action] = n
+    return [days[day] for day in sorted(days)]
+
+
+DEFAULT_FUNNEL = ('view_product', 'favorite_product', 'canvas_add', 'click_to_retailer')
+
+
+def funnel(
+    steps: Iterable[str] = DEFAULT_FUNNEL,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    product_id: Optional[str] = None,
+    export_dir: str = EXPORT_DIR
+) -> List[Dict[str, Any]]:
+    """Distinct users reaching each step, having also done every earlier step in the window."""
+    steps = list(steps)
+    expression = pc.field('action_type').isin(steps)
+    if product_id is not None:
+        expression = expression & (pc.field('item_id') == product_id)
+    table = read_events(['user_id', 'action_type'], since, until, expression, export_dir)
+    pairs = table.group_by(['user_id', 'action_type']).aggregate([])
+
+    users_by_step: Dict[str, set] = {step: set() for step in steps}
+    for user_id, action in zip(pairs['user_id'].to_pylist(), pairs['action_type'].to_pylist()):
+        users_by_step[action].add(user_id)
+
+    result = []
+    reached: Optional[set] = None
+    for step in steps:
+        reached = users_by_step[step] if reached is None else reached & users_by_step[step]
+        first = result[0]['users'] if result else len(reached)
+        result.append({
+            'step': step,
+            'users': len(reached),
+            'conversion': round(len(reached) / first, 4) if first else 0.0,
+        })
+    return result
+
+
+def export_status(export_dir: str = EXPORT_DIR) -> Dict[str, Any]:
+    state = _read_state(export_dir)
+    days = sorted(d[len('day='):] for d in os.listdir(export_dir) if d.startswith('day=')) if os.path.isdir(export_dir) else []
+    size = sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(export_dir) for name in names if name.endswith('.parquet')
+    ) if os.path.isdir(export_dir) else 0
+    return {
+        'last_id': state['last_id'],
+        'rows': state.get('rows', 0),
+        'exported_at': state.get('exported_at'),
+        'days': len(days),
+        'first_day': days[0] if days else None,
+        'last_day': days[-1] if days else None,
+        'bytes': size,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export user_interactions to day-partitioned Parquet")
+    parser.add_argument("--status", action="store_true", help="Show the export watermark and partitions")
+    parser.add_argument("--from-archive", action="store_true", help="Also backfill archived months")
+    parser.add_argument("--export-dir", default=EXPORT_DIR)
+    args = parser.parse_args()
+
+    if args.status:
+        for key, value in export_status(args.export_dir).items():
+            print(f"{key}: {value}")
+        raise SystemExit(0)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        export_interactions(db, args.export_dir)
+        if args.from_archive:
+            export_archive(args.export_dir)
+    finally:
+        db.close()
@@ -0,0 +1,291 @@
+# interaction_ingest.py
+# Write-behind buffer for batched interaction tracking
+#
+# /ai/track-interactions/batch hands its events to the process's IngestBuffer and
+# answers straight away with their sequence numbers. A background flusher drains
+# the buffer every INGEST_FLUSH_EVENTS events or INGEST_FLUSH_MS milliseconds,
+# whichever comes first: one bulk INSERT for the interactions, the feature and
+# profile hooks folded once per user, and a single commit per flush.
+#
+# Durability: with INGEST_SPOOL set, every accepted batch is appended to that
+# JSONL file and fsynced before the endpoint answers. Each flush rotates the
+# spool aside and deletes the rotated file once its events are committed; spool
+# files left behind by a crash are replayed on start. Delivery is at-least-once:
+# a crash between the commit and the delete replays that flush.
+#
+# Sequence numbers are unique and increasing per process, seeded from the clock
+# in microseconds (or the highest replayed sequence) so they keep increasing
+# across restarts.
+
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from interaction_models import UserInteraction
+
+
+INGEST_FLUSH_EVENTS = int(os.getenv("INGEST_FLUSH_EVENTS", "500"))
+INGEST_FLUSH_MS = int(os.getenv("INGEST_FLUSH_MS", "250"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "50000"))  # Beyond this, batches are refused
+INGEST_SPOOL = os.getenv("INGEST_SPOOL", "")                         # Empty = memory only
+
+_COLUMNS = ('user_id', 'action_type', 'item_id', 'item_type', 'interaction_metadata', 'weight', 'source', 'created_at')
+
+
+class IngestBufferFull(Exception):
+    """Raised when the flusher has fallen too far behind to accept more events."""
+
+
+class IngestBuffer:
+    """
+    Pending interaction rows (dicts of UserInteraction columns plus 'sequence'),
+    an optional append-only spool, and the flush that writes them in bulk.
+    """
+
+    def __init__(
+        self,
+        flush_events: int = INGEST_FLUSH_EVENTS,
+        flush_ms: int = INGEST_FLUSH_MS,
+        max_pending: int = INGEST_MAX_PENDING,
+        spool_path: Optional[str] = INGEST_SPOOL or None
+    ):
+        self.flush_events = flush_events
+        self.flush_ms = flush_ms
+        self.max_pending = max_pending
+        self.spool_path = spool_path
+
+        self._pending: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()     # One flush at a time
+        self._sequence = time.time_ns() // 1000
+        self._spool = None
+        self._spooled = 0                       # Rows in the current spool file
+        self._unacked_files: List[str] = []     # Rotated spool files not yet committed
+
+        self.accepted = 0
+        self.flushed = 0
+        self.failed_flushes = 0
+
+    @property
+    def durable(self) -> bool:
+        return self.spool_path is not None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """Queue rows (spooled first, if durable); returns their sequence numbers in order."""
+        with self._cond:
+            if len(self._pending) + len(rows) > self.max_pending:
+                raise IngestBufferFull(f"{len(self._pending)} events already pending")
+
+            sequences = []
+            for row in rows:
+                self._sequence += 1
+                row['sequence'] = self._sequence
+                sequences.append(self._sequence)
+
+            if self._spool is not None:
+                self._spool.write(''.join(json.dumps(_encode(row)) + '\n' for row in rows))
+                self._spool.flush()
+                os.fsync(self._spool.fileno())
+                self._spooled += len(rows)
+
+            self._pending.extend(rows)
+            self.accepted += len(rows)
+            if len(self._pending) >= self.flush_events:
+                self._cond.notify()
+        return sequences
+
+    def flush(self, session_factory=None) -> int:
+        """Write everything pending in one transaction; returns rows written."""
+        if session_factory is None:
+            from database import SessionLocal as session_factory
+
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+                self._rotate_spool()
+            if not batch:
+                return 0
+
+            db = session_factory()
+            try:
+                write_interactions(db, batch)
+                db.commit()
+            except Exception:
+                db.rollback()
+                with self._cond:
+                    self._pending[:0] = batch  # Retried ahead of anything newer
+                self.failed_flushes += 1
+                raise
+            finally:
+                db.close()
+
+            # In-memory counters only once the rows are in: a failed flush is retried
+            record_product_events(batch)
+
+            for path in self._unacked_files:
+                os.remove(path)
+            self._unacked_files = []
+            self.flushed += len(batch)
+            return len(batch)
+
+    # ---------- spool ----------
+
+    def open_spool(self) -> int:
+        """Replay spool files left by a previous process, then start a fresh spool; returns rows replayed."""
+        if not self.spool_path:
+            return 0
+        os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+
+        replayed = []
+        paths = sorted(glob.glob(self.spool_path + ".*"), key=_spool_order)
+        if os.path.exists(self.spool_path):
+            paths.append(self.spool_path)
+        for path in paths:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        replayed.append(_decode(json.loads(line)))
+                    except (ValueError, KeyError):
+                        continue  # Torn last line from a crash mid-write
+
+        with self._cond:
+            if replayed:
+                self._pending[:0] = replayed
+                self._sequence = max(self._sequence, max(row['sequence'] for row in replayed))
+            if os.path.exists(self.spool_path):
+                if os.path.getsize(self.spool_path):
+                    # Its events are pending now; park it with the other unacked files
+                    parked = f"{self.spool_path}.{self._sequence}"
+                    os.replace(self.spool_path, parked)
+                    paths[-1] = parked
+                else:
+                    os.remove(self.spool_path)
+                    paths.pop()
+            self._unacked_files.extend(paths)
+            self._spool = open(self.spool_path, 'a')
+        return len(replayed)
+
+    def _rotate_spool(self):
+        """Move the current spool aside, named by its last sequence (caller holds the lock)."""
+        if self._spool is None or not self._spooled:
+            return
+        self._spool.close()
+        rotated = f"{self.spool_path}.{self._sequence}"
+        os.replace(self.spool_path, rotated)
+        self._unacked_files.append(rotated)
+        self._spool = open(self.spool_path, 'a')
+        self._spooled = 0
+
+    # ---------- background flusher ----------
+
+    def wait_for_work(self):
+        """Block until a flush is due: enough events, or the interval passed with some pending."""
+        deadline = time.monotonic() + self.flush_ms / 1000.0
+        with self._cond:
+            while len(self._pending) < self.flush_events:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if self._pending:
+                        return
+                    deadline = time.monotonic() + self.flush_ms / 1000.0
+                    remaining = self.flush_ms / 1000.0
+                self._cond.wait(remaining)
+
+
+def _encode(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {**row, 'created_at': row['created_at'].isoformat()}
+
+
+def _decode(data: Dict[str, Any]) -> Dict[str, Any]:
+    row = {column: data.get(column) for column in _COLUMNS}
+    row['created_at'] = datetime.fromisoformat(data['created_at'])
+    row['sequence'] = int(data['sequence'])
+    return row
+
+
+def _spool_order(path: str):
+    suffix = path.rsplit('.', 1)[-1]
+    return int(suffix) if suffix.isdigit() else 0
+
+
+# ============================================
+# FLUSH
+# ============================================
+
+def write_interactions(db: Session, rows: List[Dict[str, Any]]):
+    """
+    Bulk-insert buffered rows and run the per-event hooks the single-event
+    endpoint runs, grouped so each user's vector and profile are touched once.
+    Caller commits, then calls record_product_events.
+    """
+    from user_features import apply_interactions
+    from profile_builder import apply_profile_interactions
+    from item_exclusions import record_exclusion_event
+
+    db.bulk_insert_mappings(UserInteraction, [{column: row[column] for column in _COLUMNS} for row in rows])
+
+    by_user: Dict[int, List[UserInteraction]] = {}
+    for row in rows:
+        interaction = UserInteraction(**{column: row[column] for column in _COLUMNS})
+        by_user.setdefault(interaction.user_id, []).append(interaction)
+        record_exclusion_event(db, interaction.user_id, interaction.item_id, interaction.action_type)
+
+    for user_id, interactions in by_user.items():
+        apply_interactions(db, user_id, interactions)
+        apply_profile_interactions(db, user_id, interactions)
+
+
+def record_product_events(rows: List[Dict[str, Any]]):
+    """Count committed product rows into the ProductAnalytics deltas (after the commit, exactly once)."""
+    from analytics_counters import record_product_event
+
+    for row in rows:
+        if row['item_type'] == 'product' and row['item_id']:
+            record_product_event(row['item_id'], row['action_type'])
+
+
+_buffer: Optional[IngestBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def _flush_loop(buffer: IngestBuffer):
+    while True:
+        buffer.wait_for_work()
+        try:
+            buffer.flush()
+        except Exception as e:
+            print(f"Interaction flush failed ({len(buffer)} pending): {e}")
+            time.sleep(1)
+
+
+def _flush_at_exit(buffer: IngestBuffer):
+    try:
+        buffer.flush()
+    except Exception as e:
+        print(f"Final interaction flush failed: {e}")
+
+
+def get_ingest_buffer() -> IngestBuffer:
+    """Process-wide buffer: replays any spool on first use, then flushes in the background."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                buffer = IngestBuffer()
+                replayed = buffer.open_spool()
+                if replayed:
+                    print(f"Replaying {replayed} spooled interactions from {buffer.spool_path}")
+                threading.Thread(target=_flush_loop, args=(buffer,), daemon=True).start()
+                atexit.register(_flush_at_exit, buffer)
+                _buffer = buffer
+    return _buffer
@@ -37,6 +37,7 @@ class UserInteraction(Base):
     # Add indexes for common queries
     __table_args__ = (
         Index('idx_user_action_time', 'user_id', 'action_type', 'created_at'),
+        Index('idx_user_time_id', 'user_id', 'created_at', 'id'),  # Keyset pagination of /interactions/me
         Index('idx_item_type', 'item_type', 'item_id'),
     )
 
@@ -0,0 +1,561 @@
+# interaction_rollups.py
+# Hourly and daily per-item rollups of user_interactions, maintained by a background roller
+#
+# Usage:
+#   python interaction_rollups.py            # roll everything up to the last complete hour
+#   python interaction_rollups.py --status   # show watermarks and row counts
+#
+# The roller processes complete hours (minus ROLLUP_LAG for in-flight writes)
+# past its time watermark. It also keeps the highest interaction id it has
+# covered: rows committed after that with an older created_at (spool replays,
+# late batch submissions) are rolled on the next run and merged into the hourly
+# buckets they belong to, and into daily rows for days already rolled. Daily
+# rows are merged from hourly rows once a day is complete. Readers combine
+# daily rows, hourly rows and the raw tail after the hourly watermark (see
+# trending_totals).
+#
+# All times are UTC, the clock of the created_at server default and of the
+# ingest path. On SQLite created_at is compared as stored text against
+# second-precision bounds: rows written by CURRENT_TIMESTAMP ("... 12:00:00")
+# and by Python ("... 12:00:00.000000") then fall on the same side of an hour
+# boundary, the side their bucket is on.
+
+from typing import List, Dict, Any, Optional, Tuple
+from array import array
+from datetime import datetime, timedelta
+import argparse
+import math
+import threading
+import time
+
+from sqlalchemy import String, func, type_coerce
+from sqlalchemy.orm import Session
+
+from interaction_models import UserInteraction
+from recommendation_models import InteractionRollupHourly, InteractionRollupDaily, RollupWatermark
+
+
+ROLLUP_LAG = timedelta(minutes=5)  # Don't roll an hour until its writes have landed
+ROLLUP_CHUNK = timedelta(days=1)   # Raw rows processed (and committed) per step
+ROLLUP_INTERVAL = 300              # Seconds between background runs
+
+
+# ============================================
+# UNIQUE USERS (HYPERLOGLOG)
+# ============================================
+
+HLL_PRECISION = 12                   # 4096 registers, ~1.6% standard error
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_SPARSE_LIMIT = 1024              # Exact user ids up to the registers' size in bytes
+
+
+def _hash64(user_id: int) -> int:
+    """splitmix64 finalizer - stable across processes and cheap."""
+    z = (user_id + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return z ^ (z >> 31)
+
+
+class UniqueUsers:
+    """
+    Mergeable distinct-user counter. Stays an exact user-id set while small (most
+    item-hours), switches to HyperLogLog registers once it passes HLL_SPARSE_LIMIT.
+    """
+
+    __slots__ = ('users', 'registers')
+
+    def __init__(self):
+        self.users: Optional[set] = set()
+        self.registers: Optional[bytearray] = None
+
+    def add(self, user_id: int):
+        if self.users is not None:
+            self.users.add(user_id)
+            if len(self.users) > HLL_SPARSE_LIMIT:
+                self._densify()
+        else:
+            self._add_hashed(user_id)
+
+    def merge(self, other: "UniqueUsers") -> "UniqueUsers":
+        if other.users is not None:
+            for user_id in other.users:
+                self.add(user_id)
+        else:
+            if self.users is not None:
+                self._densify()
+            self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        if self.users is not None:
+            return len(self.users)
+
+        m = HLL_REGISTERS
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # Linear counting for small cardinalities
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        if self.users is not None:
+            return b'\x00' + array('I', sorted(self.users)).tobytes()
+        return b'\x01' + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "UniqueUsers":
+        unique = cls()
+        if data[:1] == b'\x01':
+            unique.users = None
+            unique.registers = bytearray(data[1:])
+        else:
+            unique.users = set(array('I', data[1:]))
+        return unique
+
+    def _densify(self):
+        users, self.users = self.users, None
+        self.registers = bytearray(HLL_REGISTERS)
+        for user_id in users:
+            self._add_hashed(user_id)
+
+    def _add_hashed(self, user_id: int):
+        h = _hash64(user_id)
+        index = h >> (64 - HLL_PRECISION)
+        rest = h & ((1 << (64 - HLL_PRECISION)) - 1)
+        rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+
+# ============================================
+# ROLLER
+# ============================================
+
+def _floor_hour(dt: datetime) -> datetime:
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def _floor_day(dt: datetime) -> datetime:
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _created_between(db: Session, query, start: Optional[datetime], end: Optional[datetime]):
+    """Filter raw interactions to [start, end) consistently with _floor_hour bucketing."""
+    if db.get_bind().dialect.name == 'sqlite':
+        column = type_coerce(UserInteraction.created_at, String)
+        start = start.strftime('%Y-%m-%d %H:%M:%S') if start is not None else None
+        end = end.strftime('%Y-%m-%d %H:%M:%S') if end is not None else None
+    else:
+        column = UserInteraction.created_at
+    if start is not None:
+        query = query.filter(column >= start)
+    if end is not None:
+        query = query.filter(column < end)
+    return query
+
+
+def _get_watermark(db: Session, name: str) -> Optional[datetime]:
+    row = db.query(RollupWatermark).filter(RollupWatermark.name == name).first()
+    return row.watermark if row else None
+
+
+def _get_rolled_id(db: Session) -> Optional[int]:
+    """Highest user_interactions.id the hourly rollups cover (None before the first run)."""
+    return db.query(RollupWatermark.last_id).filter(RollupWatermark.name == 'hourly').scalar()
+
+
+def _set_watermark(db: Session, name: str, watermark: datetime, last_id: Optional[int] = None):
+    row = db.query(RollupWatermark).filter(RollupWatermark.name == name).first()
+    if row is None:
+        row = RollupWatermark(name=name, watermark=watermark)
+        db.add(row)
+    row.watermark = watermark
+    if last_id is not None:
+        row.last_id = last_id
+    row.updated_at = datetime.utcnow()
+
+
+def _aggregate(rows) -> Dict[Tuple[datetime, str], Dict[str, Any]]:
+    """(bucket_start, item_id) -> count / weight / unique users, for raw (user, item, weight, created_at) rows."""
+    buckets: Dict[Tuple[datetime, str], Dict[str, Any]] = {}
+    for user_id, item_id, weight, created_at in rows:
+        key = (_floor_hour(created_at), item_id)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = {'count': 0, 'weight': 0.0, 'users': UniqueUsers()}
+        bucket['count'] += 1
+        bucket['weight'] += weight or 0.0
+        bucket['users'].add(user_id)
+    return buckets
+
+
+def _write_buckets(
+    db: Session,
+    model,
+    buckets: Dict[Tuple[datetime, str], Dict[str, Any]],
+    start: datetime,
+    end: datetime
+) -> int:
+    """
+    Insert rollup rows for buckets starting in [start, end]. Buckets that
+    already have a row (late rows, or a chunk that ran before bucketing and
+    filtering agreed) are merged into it rather than inserted twice.
+    """
+    updates = []
+    if buckets:
+        existing = db.query(
+            model.id, model.bucket_start, model.item_id,
+            model.interaction_count, model.weight_sum, model.unique_users
+        ).filter(
+            model.bucket_start >= start,
+            model.bucket_start <= end
+        ).all()
+        for row in existing:
+            bucket = buckets.pop((row.bucket_start, row.item_id), None)
+            if bucket is not None:
+                updates.append({
+                    'id': row.id,
+                    'interaction_count': row.interaction_count + bucket['count'],
+                    'weight_sum': row.weight_sum + bucket['weight'],
+                    'unique_users': bucket['users'].merge(UniqueUsers.from_bytes(row.unique_users)).to_bytes(),
+                })
+
+    db.bulk_insert_mappings(model, [
+        {
+            'bucket_start': bucket_start,
+            'item_id': item_id,
+            'interaction_count': bucket['count'],
+            'weight_sum': bucket['weight'],
+            'unique_users': bucket['users'].to_bytes(),
+        }
+        for (bucket_start, item_id), bucket in buckets.items()
+    ])
+    db.bulk_update_mappings(model, updates)
+    return len(buckets) + len(updates)
+
+
+def _raw_rows(db: Session):
+    return db.query(
+        UserInteraction.user_id,
+        UserInteraction.item_id,
+        UserInteraction.weight,
+        UserInteraction.created_at
+    ).filter(
+        UserInteraction.item_id.isnot(None)
+    )
+
+
+def _roll_late(db: Session, watermark: datetime, rolled_id: int, snapshot_id: int) -> int:
+    """
+    Roll rows committed since the last run with created_at below the hourly
+    watermark into their hourly buckets, and into the daily rows of days
+    already rolled. Returns rows written.
+    """
+    rows = _created_between(db, _raw_rows(db).filter(
+        UserInteraction.id > rolled_id,
+        UserInteraction.id <= snapshot_id
+    ), None, watermark).yield_per(10000)
+    hourly = _aggregate(rows)
+    if not hourly:
+        return 0
+
+    daily_watermark = _get_watermark(db, 'daily')
+    daily: Dict[Tuple[datetime, str], Dict[str, Any]] = {}
+    if daily_watermark is not None:
+        for (bucket_start, item_id), bucket in hourly.items():
+            day_start = _floor_day(bucket_start)
+            if day_start >= daily_watermark:
+                continue  # roll_daily picks it up from the hourly row
+            day = daily.get((day_start, item_id))
+            if day is None:
+                day = daily[(day_start, item_id)] = {'count': 0, 'weight': 0.0, 'users': UniqueUsers()}
+            day['count'] += bucket['count']
+            day['weight'] += bucket['weight']
+            day['users'].merge(bucket['users'])
+
+    # Merge day by day, so only the touched days' existing rows are read
+    hourly_by_day: Dict[datetime, Dict[Tuple[datetime, str], Dict[str, Any]]] = {}
+    for key, bucket in hourly.items():
+        hourly_by_day.setdefault(_floor_day(key[0]), {})[key] = bucket
+    late = sum(bucket['count'] for bucket in hourly.values())
+
+    written = 0
+    for day_start, buckets in hourly_by_day.items():
+        day_end = day_start + timedelta(days=1)
+        written += _write_buckets(db, InteractionRollupHourly, buckets, day_start, day_end - timedelta(hours=1))
+        day_rows = {key: bucket for key, bucket in daily.items() if key[0] == day_start}
+        if day_rows:
+            written += _write_buckets(db, InteractionRollupDaily, day_rows, day_start, day_start)
+    print(f"Rolled up {late} late interactions")
+    return written
+
+
+def roll_hourly(db: Session, now: Optional[datetime] = None) -> int:
+    """Roll late rows, then complete hours past the hourly watermark; returns rollup rows written."""
+    cutoff = _floor_hour((now or datetime.utcnow()) - ROLLUP_LAG)
+    watermark = _get_watermark(db, 'hourly')
+    rolled_id = _get_rolled_id(db)
+    # Rows up to here are rolled by this run (or are past the time watermark)
+    snapshot_id = db.query(func.max(UserInteraction.id)).scalar() or 0
+
+    written = 0
+    if watermark is None:
+        first = db.query(func.min(UserInteraction.created_at)).scalar()
+        if first is None:
+            return 0
+        watermark = _floor_hour(first)
+    elif rolled_id is not None:
+        written += _roll_late(db, watermark, rolled_id, snapshot_id)
+    # (rolled_id None with a watermark: rolled before ids were kept; rows below it count as rolled)
+    _set_watermark(db, 'hourly', watermark, last_id=snapshot_id)
+    db.commit()
+
+    while watermark < cutoff:
+        chunk_end = min(watermark + ROLLUP_CHUNK, cutoff)
+        rows = _created_between(db, _raw_rows(db).filter(
+            UserInteraction.id <= snapshot_id  # Newer ids are late rows for the next run
+        ), watermark, chunk_end).yield_per(10000)
+
+        written += _write_buckets(db, InteractionRollupHourly, _aggregate(rows), watermark, chunk_end)
+        _set_watermark(db, 'hourly', chunk_end)
+        db.commit()  # Rows and watermark together, so a crash never double-counts
+
+        watermark = chunk_end
+
+    return written
+
+
+def roll_daily(db: Session) -> int:
+    """Merge hourly rows into daily rows for every complete day below the hourly watermark."""
+    hourly_watermark = _get_watermark(db, 'hourly')
+    if hourly_watermark is None:
+        return 0
+    cutoff = _floor_day(hourly_watermark)
+    watermark = _get_watermark(db, 'daily')
+    if watermark is None:
+        first = db.query(func.min(InteractionRollupHourly.bucket_start)).scalar()
+        if first is None:
+            return 0
+        watermark = _floor_day(first)
+
+    written = 0
+    while watermark < cutoff:
+        day_end = watermark + timedelta(days=1)
+        merged: Dict[str, Dict[str, Any]] = {}
+        rows = db.query(
+            InteractionRollupHourly.item_id,
+            InteractionRollupHourly.interaction_count,
+            InteractionRollupHourly.weight_sum,
+            InteractionRollupHourly.unique_users
+        ).filter(
+            InteractionRollupHourly.bucket_start >= watermark,
+            InteractionRollupHourly.bucket_start < day_end
+        ).yield_per(10000)
+
+        for item_id, count, weight, unique_users in rows:
+            day = merged.get(item_id)
+            if day is None:
+                day = merged[item_id] = {'count': 0, 'weight': 0.0, 'users': UniqueUsers()}
+            day['count'] += count
+            day['weight'] += weight
+            day['users'].merge(UniqueUsers.from_bytes(unique_users))
+
+        db.bulk_insert_mappings(InteractionRollupDaily, [
+            {
+                'bucket_start': watermark,
+                'item_id': item_id,
+                'interaction_count': day['count'],
+                'weight_sum': day['weight'],
+                'unique_users': day['users'].to_bytes(),
+            }
+            for item_id, day in merged.items()
+        ])
+        _set_watermark(db, 'daily', day_end)
+        db.commit()
+
+        written += len(merged)
+        watermark = day_end
+
+    return written
+
+
+def run_rollups(db: Session) -> Dict[str, Any]:
+    started = time.perf_counter()
+    hourly = roll_hourly(db)
+    daily = roll_daily(db)
+    result = {
+        'hourly_rows': hourly,
+        'daily_rows': daily,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    if hourly or daily:
+        print(f"Rolled up interactions: {hourly} hourly rows, {daily} daily rows in {result['seconds']}s")
+    return result
+
+
+_roller_started = False
+_roller_lock = threading.Lock()
+
+
+def _roller_loop(session_factory, interval: int):
+    while True:
+        db = session_factory()
+        try:
+            run_rollups(db)
+        except Exception as e:
+            print(f"Interaction rollup failed: {e}")
+            db.rollback()
+        finally:
+            db.close()
+        time.sleep(interval)
+
+
+def start_rollup_worker(session_factory=None, interval: int = ROLLUP_INTERVAL):
+    """Start the background roller once per process."""
+    global _roller_started
+    with _roller_lock:
+        if _roller_started:
+            return
+        if session_factory is None:
+            from database import SessionLocal as session_factory
+        threading.Thread(target=_roller_loop, args=(session_factory, interval), daemon=True).start()
+        _roller_started = True
+
+
+# ============================================
+# READ PATH
+# ============================================
+
+def _ceil(dt: datetime, floor, step: timedelta) -> datetime:
+    floored = floor(dt)
+    return floored if floored == dt else floored + step
+
+
+def _segments(db: Session, since: Optional[datetime]) -> List[Tuple[Any, Optional[datetime], Optional[datetime]]]:
+    """
+    Split [since, now) into (source, start, end) pieces: daily rollups for whole
+    days, hourly rollups for whole hours, raw user_interactions for the edges
+    and for everything past the hourly watermark.
+    """
+    hourly_wm = _get_watermark(db, 'hourly')
+    daily_wm = _get_watermark(db, 'daily')
+    if hourly_wm is None:
+        return [(UserInteraction, since, None)]
+
+    segments = []
+    if since is None:
+        hours_from = daily_wm
+        if daily_wm is not None:
+            segments.append((InteractionRollupDaily, None, daily_wm))
+    else:
+        first_hour = _ceil(since, _floor_hour, timedelta(hours=1))
+        if first_hour >= hourly_wm:
+            return [(UserInteraction, since, None)]
+        if since < first_hour:
+            segments.append((UserInteraction, since, first_hour))
+
+        hours_from = first_hour
+        first_day = _ceil(first_hour, _floor_day, timedelta(days=1))
+        if daily_wm is not None and first_day < daily_wm:
+            if first_hour < first_day:
+                segments.append((InteractionRollupHourly, first_hour, first_day))
+            segments.append((InteractionRollupDaily, first_day, daily_wm))
+            hours_from = daily_wm
+
+    if hours_from is None or hours_from < hourly_wm:
+        segments.append((InteractionRollupHourly, hours_from, hourly_wm))
+    segments.append((UserInteraction, hourly_wm, None))
+    return segments
+
+
+def _segment_query(db: Session, source, start: Optional[datetime], end: Optional[datetime], *columns):
+    query = db.query(*columns)
+    if source is UserInteraction:
+        return _created_between(db, query, start, end)
+    if start is not None:
+        query = query.filter(source.bucket_start >= start)
+    if end is not None:
+        query = query.filter(source.bucket_start < end)
+    return query
+
+
+def trending_totals(
+    db: Session,
+    since: Optional[datetime],
+    limit: int
+) -> List[Tuple[str, int, float, int]]:
+    """
+    Top items by summed weight since `since` (None = all time) as
+    (item_id, interaction_count, total_weight, unique_users).
+    """
+    segments = _segments(db, since)
+    totals: Dict[str, List[float]] = {}
+    raw_users: Dict[str, set] = {}
+
+    for source, start, end in segments:
+        if source is UserInteraction:
+            # Raw edges are short, so aggregate them here. A SQL GROUP BY item_id
+            # makes SQLite walk the item_id index over the whole table instead of
+            # range-scanning created_at.
+            rows = _segment_query(
+                db, source, start, end, UserInteraction.item_id, UserInteraction.user_id, UserInteraction.weight
+            ).yield_per(10000)
+            for item_id, user_id, weight in rows:
+                if item_id is None:
+                    continue
+                entry = totals.setdefault(item_id, [0, 0.0])
+                entry[0] += 1
+                entry[1] += weight or 0.0
+                raw_users.setdefault(item_id, set()).add(user_id)
+        else:
+            query = _segment_query(
+                db, source, start, end,
+                source.item_id, func.sum(source.interaction_count), func.sum(source.weight_sum)
+            ).group_by(source.item_id)
+            for item_id, count, weight in query.all():
+                entry = totals.setdefault(item_id, [0, 0.0])
+                entry[0] += count or 0
+                entry[1] += weight or 0.0
+
+    top = sorted(totals.items(), key=lambda entry: (-entry[1][1], entry[0]))[:limit]
+    unique = {item_id: UniqueUsers() for item_id, _ in top}
+
+    # Distinct users only for the winners
+    for item_id, users in unique.items():
+        for user_id in raw_users.get(item_id, ()):
+            users.add(user_id)
+    if unique:
+        for source, start, end in segments:
+            if source is UserInteraction:
+                continue
+            query = _segment_query(
+                db, source, start, end, source.item_id, source.unique_users
+            ).filter(source.item_id.in_(unique))
+            for item_id, blob in query.yield_per(10000):
+                unique[item_id].merge(UniqueUsers.from_bytes(blob))
+
+    return [
+        (item_id, int(count), float(weight), unique[item_id].count())
+        for item_id, (count, weight) in top
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Roll user_interactions up into hourly/daily tables")
+    parser.add_argument("--status", action="store_true", help="Show watermarks and row counts")
+    args = parser.parse_args()
+
+    from database import SessionLocal, init_db
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.status:
+            for name in ('hourly', 'daily'):
+                print(f"{name}: watermark {_get_watermark(db, name)}")
+            print(f"hourly rows: {db.query(func.count(InteractionRollupHourly.id)).scalar()}")
+            print(f"daily rows: {db.query(func.count(InteractionRollupDaily.id)).scalar()}")
+        else:
+            run_rollups(db)
+    finally:
+        db.close()
@@ -0,0 +1,317 @@
+# item_exclusions.py
+# Per-user seen / purchased / disliked item sets as compact bitsets
+#
+# Item IDs are interned to dense integers (`interned_items`). Each user's
+# exclusions are held in roaring-style bitsets: ids are split into 16-bit
+# chunks, sparse chunks are sorted uint16 arrays, dense chunks are 8 KB bitmaps.
+# Strategies filter candidates in memory instead of pushing huge
+# `item_id NOT IN (...)` parameter lists into SQL.
+#
+# A loaded user is kept current by this process's events and re-hydrated after
+# EXCLUSION_CACHE_TTL seconds, which is how events handled by other workers
+# reach it. Events recorded while a user is being hydrated are replayed onto
+# the fresh sets.
+
+from typing import Dict, Iterable, List, Optional, Tuple
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import upsert_insert
+from interaction_models import UserInteraction
+from recommendation_models import InternedItem
+
+
+ARRAY_CONTAINER_LIMIT = 4096  # Above this a chunk switches to a bitmap
+MAX_CACHED_USERS = 10000
+EXCLUSION_CACHE_TTL = int(os.getenv("EXCLUSION_CACHE_TTL", "300"))  # Seconds before a loaded user is re-read
+
+PURCHASE_ACTIONS = {'purchase_complete'}
+DISLIKE_ACTIONS = {'dislike_product'}
+
+
+# ============================================
+# ROARING-STYLE BITSET
+# ============================================
+
+class ItemBitset:
+    """Set of non-negative ints, compact for both sparse and dense id ranges."""
+
+    __slots__ = ('_containers', '_size')
+
+    def __init__(self, values: Iterable[int] = ()):
+        self._containers: Dict[int, object] = {}
+        self._size = 0
+        for value in values:
+            self.add(value)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int):
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+
+        if container is None:
+            self._containers[high] = array('H', [low])
+            self._size += 1
+        elif isinstance(container, array):
+            i = bisect_left(container, low)
+            if i < len(container) and container[i] == low:
+                return
+            insort(container, low)
+            self._size += 1
+            if len(container) > ARRAY_CONTAINER_LIMIT:
+                self._containers[high] = self._to_bitmap(container)
+        else:
+            byte, bit = low >> 3, 1 << (low & 7)
+            if not container[byte] & bit:
+                container[byte] |= bit
+                self._size += 1
+
+    def __contains__(self, value: int) -> bool:
+        container = self._containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, array):
+            i = bisect_left(container, low)
+            return i < len(container) and container[i] == low
+        return bool(container[low >> 3] & (1 << (low & 7)))
+
+    def contains_many(self, values: np.ndarray) -> np.ndarray:
+        """Vectorized membership for an int array (negative ids are never members)."""
+        values = np.asarray(values, dtype=np.int64)
+        result = np.zeros(len(values), dtype=bool)
+        valid = values >= 0
+        highs = np.where(valid, values >> 16, -1)
+        lows = (values & 0xFFFF).astype(np.int64)
+
+        for high in np.unique(highs[valid]):
+            container = self._containers.get(int(high))
+            if container is None:
+                continue
+            mask = highs == high
+            chunk = lows[mask]
+            if isinstance(container, array):
+                result[mask] = np.isin(chunk, np.frombuffer(container, dtype=np.uint16))
+            else:
+                bitmap = np.frombuffer(container, dtype=np.uint8)
+                result[mask] = (bitmap[chunk >> 3] >> (chunk & 7)) & 1 == 1
+        return result
+
+    def nbytes(self) -> int:
+        return sum(
+            c.itemsize * len(c) if isinstance(c, array) else len(c)
+            for c in self._containers.values()
+        )
+
+    @staticmethod
+    def _to_bitmap(container: array) -> bytearray:
+        bitmap = bytearray(8192)
+        for low in container:
+            bitmap[low >> 3] |= 1 << (low & 7)
+        return bitmap
+
+
+# ============================================
+# ITEM ID INTERNING
+# ============================================
+
+class ItemInterner:
+    """
+    Process cache of item_id -> dense int. Only ids some cached user has touched
+    are needed: a candidate that misses the cache can't be in any loaded bitset.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def register(self, item_id: str, interned_id: int):
+        self._ids[item_id] = interned_id
+
+    def lookup(self, item_id: str) -> int:
+        return self._ids.get(item_id, -1)
+
+    def lookup_many(self, item_ids: List[str]) -> np.ndarray:
+        return np.fromiter((self._ids.get(i, -1) for i in item_ids), dtype=np.int64, count=len(item_ids))
+
+    def intern(self, db: Session, item_id: str) -> int:
+        interned_id = self.lookup(item_id)
+        if interned_id >= 0:
+            return interned_id
+
+        row = db.query(InternedItem).filter(InternedItem.item_id == item_id).first()
+        if not row:
+            try:
+                with db.begin_nested():
+                    row = InternedItem(item_id=item_id)
+                    db.add(row)
+            except IntegrityError:
+                # Another process interned it first
+                row = db.query(InternedItem).filter(InternedItem.item_id == item_id).one()
+
+        with self._lock:
+            self.register(item_id, row.id)
+        return row.id
+
+
+_interner = ItemInterner()
+
+
+# ============================================
+# PER-USER EXCLUSIONS
+# ============================================
+
+class UserExclusions:
+    """Seen, purchased and disliked items for one user."""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.loaded_at = time.monotonic()
+        self.seen = ItemBitset()
+        self.purchased = ItemBitset()
+        self.disliked = ItemBitset()
+
+    def add(self, interned_id: int, action_type: str):
+        self.seen.add(interned_id)
+        if action_type in PURCHASE_ACTIONS:
+            self.purchased.add(interned_id)
+        if action_type in DISLIKE_ACTIONS:
+            self.disliked.add(interned_id)
+
+    def __contains__(self, item_id: str) -> bool:
+        """Supports `product_id in exclusions` wherever a seen-items set was used."""
+        interned_id = _interner.lookup(item_id)
+        return interned_id >= 0 and interned_id in self.seen
+
+    def __len__(self) -> int:
+        return len(self.seen)
+
+    def mask(self, item_ids: List[str]) -> np.ndarray:
+        """True for every candidate that should be filtered out."""
+        return self.seen.contains_many(_interner.lookup_many(item_ids))
+
+    def filter(self, item_ids: List[str]) -> List[str]:
+        excluded = self.mask(item_ids)
+        return [item_id for item_id, drop in zip(item_ids, excluded) if not drop]
+
+
+class ExclusionStore:
+    """
+    LRU of loaded users; each is hydrated with one join, then kept current by
+    events and re-hydrated once older than `ttl` seconds.
+    """
+
+    def __init__(self, max_users: int = MAX_CACHED_USERS, ttl: float = EXCLUSION_CACHE_TTL):
+        self._users: "OrderedDict[int, UserExclusions]" = OrderedDict()
+        self._max_users = max_users
+        self._ttl = ttl
+        # user_id -> one event list per hydration in flight
+        self._hydrating: Dict[int, List[List[Tuple[int, str]]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: int) -> UserExclusions:
+        with self._lock:
+            exclusions = self._users.get(user_id)
+            if exclusions is not None and time.monotonic() - exclusions.loaded_at < self._ttl:
+                self._users.move_to_end(user_id)
+                return exclusions
+            missed: List[Tuple[int, str]] = []
+            self._hydrating.setdefault(user_id, []).append(missed)
+
+        try:
+            exclusions = self._hydrate(db, user_id)
+        finally:
+            with self._lock:
+                pending = self._hydrating[user_id]
+                pending.remove(missed)
+                if not pending:
+                    del self._hydrating[user_id]
+
+        with self._lock:
+            # Events recorded while hydrating may not be in what it read
+            for interned_id, action_type in missed:
+                exclusions.add(interned_id, action_type)
+            self._users[user_id] = exclusions
+            self._users.move_to_end(user_id)
+            while len(self._users) > self._max_users:
+                self._users.popitem(last=False)
+        return exclusions
+
+    def record(self, db: Session, user_id: int, item_id: Optional[str], action_type: str):
+        """Called for every tracked event; unloaded users pick it up from the DB on first load."""
+        if not item_id:
+            return
+        interned_id = _interner.intern(db, item_id)
+        with self._lock:
+            exclusions = self._users.get(user_id)
+            if exclusions is not None:
+                exclusions.add(interned_id, action_type)
+            for missed in self._hydrating.get(user_id, ()):
+                missed.append((interned_id, action_type))
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def _hydrate(self, db: Session, user_id: int) -> UserExclusions:
+        if not db.info.get('read_only'):
+            backfill_interned_items(db, user_id)
+
+        rows = db.execute(text("""
+            SELECT DISTINCT ii.id, ii.item_id, ui.action_type FROM user_interactions ui
+            JOIN interned_items ii ON ii.item_id = ui.item_id
+            WHERE ui.user_id = :user_id
+        """), {"user_id": user_id}).all()
+
+        exclusions = UserExclusions(user_id)
+        for interned_id, item_id, action_type in rows:
+            _interner.register(item_id, interned_id)
+            exclusions.add(interned_id, action_type)
+        return exclusions
+
+
+_store = ExclusionStore()
+
+
+def backfill_interned_items(db: Session, user_id: Optional[int] = None):
+    """
+    Intern the item ids of interactions recorded before interning existed (one
+    user's, or everyone's with user_id=None). Runs in its own session and
+    commits there, so the caller's session is left alone; ids another process
+    interns concurrently are skipped (ON CONFLICT DO NOTHING). Hydration
+    skips it for sessions flagged info['read_only'] (precompute workers),
+    whose parent backfills everyone first.
+    """
+    missing = select(UserInteraction.item_id).distinct().outerjoin(
+        InternedItem, InternedItem.item_id == UserInteraction.item_id
+    ).where(UserInteraction.item_id.isnot(None), InternedItem.id.is_(None))
+    if user_id is not None:
+        missing = missing.where(UserInteraction.user_id == user_id)
+
+    with Session(bind=db.get_bind()) as own:
+        insert = upsert_insert(own)
+        own.execute(insert(InternedItem.__table__).from_select(['item_id'], missing).on_conflict_do_nothing(
+            index_elements=['item_id']
+        ))
+        own.commit()
+
+
+def get_user_exclusions(db: Session, user_id: int) -> UserExclusions:
+    """Seen/purchased/disliked bitsets for a user (loaded on first use)."""
+    return _store.get(db, user_id)
+
+
+def record_exclusion_event(db: Session, user_id: int, item_id: Optional[str], action_type: str):
+    """Keep loaded exclusion sets current; call on every tracked event."""
+    _store.record(db, user_id, item_id, action_type)
@@ -0,0 +1,40 @@
+# json_responses.py
+# orjson-backed JSON responses
+#
+# Usage:
+#   app = FastAPI(default_response_class=ORJSONResponse)
+#
+#   @app.get("/things")
+#   def list_things(db: Session = Depends(get_db)):
+#       rows = db.query(Thing.id, Thing.tags).limit(50).all()
+#       return ORJSONResponse({"things": [{"id": r.id, "tags": raw_json(r.tags, [])} for r in rows]})
+#
+# As the app default, every route's payload is rendered by orjson instead of the
+# stdlib encoder. Large list endpoints go further and return an ORJSONResponse
+# themselves: FastAPI then skips jsonable_encoder (a Python-level walk over
+# every value) and orjson encodes datetimes natively. JSON stored as text in a
+# column is embedded as-is through raw_json rather than json.loads'd into
+# Python objects only to be dumped again.
+
+from typing import Any, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson (datetimes, numpy values and raw_json fragments included)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def raw_json(text: Optional[str], default: Any = None) -> Any:
+    """
+    JSON text read from the database, spliced into an ORJSONResponse without
+    parsing; `default` when the column is NULL or empty. Only for columns the
+    app itself wrote with json.dumps - the text is not validated.
+    """
+    if not text:
+        return default
+    return orjson.Fragment(text)
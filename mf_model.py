@@ -0,0 +1,327 @@
+# mf_model.py
+# Implicit-feedback matrix factorization (ALS, Hu/Koren/Volinsky 2008) trained offline
+#
+# Usage:
+#   python mf_model.py train --factors 32 --iterations 15
+#   python mf_model.py recommend --user-id 1 --limit 20
+#
+# Training reads product interactions, turns them into preference/confidence
+# pairs (ACTION_WEIGHTS for positives, dislike_product feedback as confident
+# negatives) and exports user/item factor matrices to ALS_MODEL_DIR. Serving is
+# one matrix-vector product plus an argpartition top-k.
+
+from typing import List, Dict, Any, Optional, Set, Tuple
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from interaction_models import UserInteraction, ACTION_WEIGHTS
+
+
+ALS_MODEL_DIR = os.getenv("ALS_MODEL_DIR", "models/als")
+
+# Negative feedback action and its confidence weight (recommendation_endpoints records it)
+DISLIKE_ACTION = 'dislike_product'
+DISLIKE_WEIGHT = 15.0
+
+
+@dataclass
+class InteractionMatrix:
+    """Aggregated (user, item) preference/confidence triples plus the id maps."""
+    user_ids: np.ndarray
+    item_ids: np.ndarray
+    rows: np.ndarray        # user index per entry
+    cols: np.ndarray        # item index per entry
+    preference: np.ndarray  # 1.0 = liked, 0.0 = disliked
+    confidence: np.ndarray  # >= 1.0
+
+
+def load_interaction_matrix(
+    db: Session,
+    days: Optional[int] = 180,
+    alpha: float = 2.0
+) -> InteractionMatrix:
+    """
+    Net signal per (user, product) = sum of positive ACTION_WEIGHTS - dislike weight.
+    Preference is 1 if the net signal is positive, else 0; confidence = 1 + alpha * log1p(|net|).
+    """
+    query = db.query(
+        UserInteraction.user_id,
+        UserInteraction.item_id,
+        UserInteraction.action_type
+    ).filter(
+        UserInteraction.item_type == 'product',
+        UserInteraction.item_id.isnot(None)
+    )
+    if days:
+        query = query.filter(UserInteraction.created_at >= datetime.now() - timedelta(days=days))
+
+    signal: Dict[Tuple[int, str], float] = {}
+    for user_id, item_id, action_type in query.yield_per(10000):
+        if action_type == DISLIKE_ACTION:
+            weight = -DISLIKE_WEIGHT
+        else:
+            weight = float(ACTION_WEIGHTS.get(action_type, 1.0))
+        key = (user_id, item_id)
+        signal[key] = signal.get(key, 0.0) + weight
+
+    user_index: Dict[int, int] = {}
+    item_index: Dict[str, int] = {}
+    rows = np.empty(len(signal), dtype=np.int32)
+    cols = np.empty(len(signal), dtype=np.int32)
+    net = np.empty(len(signal), dtype=np.float32)
+    for n, ((user_id, item_id), value) in enumerate(signal.items()):
+        rows[n] = user_index.setdefault(user_id, len(user_index))
+        cols[n] = item_index.setdefault(item_id, len(item_index))
+        net[n] = value
+
+    return InteractionMatrix(
+        user_ids=np.array(list(user_index), dtype=np.int64),
+        item_ids=np.array(list(item_index), dtype=object),
+        rows=rows,
+        cols=cols,
+        preference=(net > 0).astype(np.float32),
+        confidence=(1.0 + alpha * np.log1p(np.abs(net))).astype(np.float32)
+    )
+
+
+def _group(keys: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """CSR-style grouping: (order, indptr) so entries for key i are order[indptr[i]:indptr[i+1]]."""
+    order = np.argsort(keys, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=indptr[1:])
+    return order, indptr
+
+
+def _als_half_step(
+    fixed: np.ndarray,
+    order: np.ndarray,
+    indptr: np.ndarray,
+    other_index: np.ndarray,
+    preference: np.ndarray,
+    confidence: np.ndarray,
+    regularization: float
+) -> np.ndarray:
+    """Solve (Y'Y + Y'(C-I)Y + lambda I) x = Y'Cp for every row given the fixed side Y."""
+    k = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(k, dtype=np.float64)
+    solved = np.zeros((len(indptr) - 1, k), dtype=np.float32)
+
+    for i in range(len(indptr) - 1):
+        start, end = indptr[i], indptr[i + 1]
+        if start == end:
+            continue
+        entries = order[start:end]
+        Y = fixed[other_index[entries]].astype(np.float64)
+        c = confidence[entries].astype(np.float64)
+        p = preference[entries].astype(np.float64)
+        A = gram + (Y.T * (c - 1.0)) @ Y
+        b = Y.T @ (c * p)
+        solved[i] = np.linalg.solve(A, b)
+
+    return solved
+
+
+def train_als(
+    matrix: InteractionMatrix,
+    factors: int = 32,
+    regularization: float = 0.1,
+    iterations: int = 15,
+    seed: int = 42
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Alternating least squares; returns (user_factors, item_factors) as float32."""
+    rnd = np.random.default_rng(seed)
+    n_users, n_items = len(matrix.user_ids), len(matrix.item_ids)
+    user_factors = (rnd.standard_normal((n_users, factors)) * 0.01).astype(np.float32)
+    item_factors = (rnd.standard_normal((n_items, factors)) * 0.01).astype(np.float32)
+
+    by_user = _group(matrix.rows, n_users)
+    by_item = _group(matrix.cols, n_items)
+
+    for _ in range(iterations):
+        user_factors = _als_half_step(
+            item_factors, *by_user, matrix.cols, matrix.preference, matrix.confidence, regularization
+        )
+        item_factors = _als_half_step(
+            user_factors, *by_item, matrix.rows, matrix.preference, matrix.confidence, regularization
+        )
+
+    return user_factors, item_factors
+
+
+def export_model(
+    path: str,
+    matrix: InteractionMatrix,
+    user_factors: np.ndarray,
+    item_factors: np.ndarray,
+    meta: Dict[str, Any]
+):
+    """Write factors.npz + meta.json, swapping them in atomically."""
+    os.makedirs(path, exist_ok=True)
+    tmp = os.path.join(path, "factors.tmp.npz")
+    np.savez(
+        tmp,
+        user_factors=user_factors,
+        item_factors=item_factors,
+        user_ids=matrix.user_ids,
+        item_ids=matrix.item_ids.astype(str)
+    )
+    os.replace(tmp, os.path.join(path, "factors.npz"))
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def train_and_export(
+    db: Session,
+    path: str = ALS_MODEL_DIR,
+    factors: int = 32,
+    regularization: float = 0.1,
+    iterations: int = 15,
+    alpha: float = 2.0,
+    days: Optional[int] = 180
+) -> Dict[str, Any]:
+    """Full offline run; prints and returns wall time per phase."""
+    started = time.perf_counter()
+    matrix = load_interaction_matrix(db, days=days, alpha=alpha)
+    loaded = time.perf_counter()
+
+    if len(matrix.rows) == 0:
+        print("No product interactions to train on")
+        return {"users": 0, "items": 0}
+
+    user_factors, item_factors = train_als(matrix, factors, regularization, iterations)
+    trained = time.perf_counter()
+
+    meta = {
+        "trained_at": datetime.now().isoformat(),
+        "users": len(matrix.user_ids),
+        "items": len(matrix.item_ids),
+        "entries": int(len(matrix.rows)),
+        "factors": factors,
+        "regularization": regularization,
+        "iterations": iterations,
+        "alpha": alpha,
+        "days": days,
+        "load_seconds": round(loaded - started, 3),
+        "train_seconds": round(trained - loaded, 3),
+    }
+    export_model(path, matrix, user_factors, item_factors, meta)
+    meta["total_seconds"] = round(time.perf_counter() - started, 3)
+
+    print(f"Trained ALS on {meta['users']} users x {meta['items']} items ({meta['entries']} entries): "
+          f"load {meta['load_seconds']}s, train {meta['train_seconds']}s, total {meta['total_seconds']}s -> {path}")
+    return meta
+
+
+# ============================================
+# SERVING
+# ============================================
+
+class ALSModel:
+    """Loaded factor matrices; scoring is one dot product + argpartition."""
+
+    def __init__(self, path: str):
+        data = np.load(os.path.join(path, "factors.npz"), allow_pickle=False)
+        self.user_factors = data["user_factors"]
+        self.item_factors = data["item_factors"]
+        self.item_ids = data["item_ids"]
+        self.user_index = {int(u): i for i, u in enumerate(data["user_ids"])}
+        self.item_index = {str(item): i for i, item in enumerate(self.item_ids)}
+        self.mtime = os.path.getmtime(os.path.join(path, "factors.npz"))
+        self.last_latency_ms = 0.0
+
+    def has_user(self, user_id: int) -> bool:
+        return user_id in self.user_index
+
+    def recommend(
+        self,
+        user_id: int,
+        limit: int = 20,
+        exclude: Optional[Set[str]] = None
+    ) -> List[Tuple[str, float]]:
+        started = time.perf_counter()
+        row = self.user_index.get(user_id)
+        if row is None:
+            self.last_latency_ms = (time.perf_counter() - started) * 1000.0
+            return []
+
+        scores = self.item_factors @ self.user_factors[row]
+        if exclude:
+            excluded = [self.item_index[i] for i in exclude if i in self.item_index]
+            scores[excluded] = -np.inf
+
+        k = min(limit, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = [(str(self.item_ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+        self.last_latency_ms = (time.perf_counter() - started) * 1000.0
+        return results
+
+
+_models: Dict[str, ALSModel] = {}
+_models_lock = threading.Lock()
+
+
+def get_als_model(path: str = ALS_MODEL_DIR) -> Optional[ALSModel]:
+    """Cached model; reloaded when a new export lands. None if never trained."""
+    factors_path = os.path.join(path, "factors.npz")
+    if not os.path.exists(factors_path):
+        return None
+
+    model = _models.get(path)
+    if model is None or model.mtime != os.path.getmtime(factors_path):
+        with _models_lock:
+            model = _models.get(path)
+            if model is None or model.mtime != os.path.getmtime(factors_path):
+                model = ALSModel(path)
+                _models[path] = model
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Implicit ALS recommendation model")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train = sub.add_parser("train", help="Train on user_interactions and export factors")
+    train.add_argument("--factors", type=int, default=32)
+    train.add_argument("--regularization", type=float, default=0.1)
+    train.add_argument("--iterations", type=int, default=15)
+    train.add_argument("--alpha", type=float, default=2.0)
+    train.add_argument("--days", type=int, default=180, help="0 = all history")
+    train.add_argument("--out", default=ALS_MODEL_DIR)
+
+    rec = sub.add_parser("recommend", help="Score one user from the exported model")
+    rec.add_argument("--user-id", type=int, required=True)
+    rec.add_argument("--limit", type=int, default=20)
+    rec.add_argument("--model", default=ALS_MODEL_DIR)
+
+    args = parser.parse_args()
+
+    if args.command == "train":
+        from database import SessionLocal
+        db = SessionLocal()
+        try:
+            train_and_export(
+                db, args.out, args.factors, args.regularization,
+                args.iterations, args.alpha, args.days or None
+            )
+        finally:
+            db.close()
+    else:
+        model = get_als_model(args.model)
+        if model is None:
+            print(f"No model at {args.model} - run `python mf_model.py train` first")
+        else:
+            for item_id, score in model.recommend(args.user_id, args.limit):
+                print(f"{item_id}\t{score:.4f}")
+            print(f"Latency: {model.last_latency_ms:.3f} ms")
@@ -0,0 +1,106 @@
+# pagination.py
+# Keyset (cursor) pagination on (created_at, id), newest first
+#
+# Usage:
+#   items, next_cursor = paginate(
+#       db.query(WardrobeItem).filter(WardrobeItem.user_id == user.id),
+#       WardrobeItem, cursor=cursor, limit=limit
+#   )
+#   return {"items": [...], "next_cursor": next_cursor}
+#
+# or, without building ORM objects, a projection that includes the id column:
+#   rows, next_cursor = paginate(
+#       db.query(WardrobeItem.id, WardrobeItem.category).filter(...),
+#       WardrobeItem, cursor=cursor, limit=limit
+#   )
+#
+# Each page continues strictly after the last row of the previous one
+# (created_at < last, or equal with a lower id), so a page costs one index range
+# scan however deep the client is, and rows inserted meanwhile never shift
+# later pages the way OFFSET does. List endpoints need an index on
+# (owner, created_at, id) for this to stay a range scan.
+#
+# Cursors are opaque to clients: urlsafe base64 of [created_at, id]. On SQLite
+# created_at is compared as the stored text, because rows written by the
+# CURRENT_TIMESTAMP server default ("... 12:00:03") and by Python
+# ("... 12:00:03.000000") store equal times as different strings.
+
+from typing import Any, List, Optional, Tuple
+from datetime import datetime
+import base64
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import String, and_, or_, type_coerce
+from sqlalchemy.orm import Query
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def clamp_page_size(limit: Optional[int], default: int = DEFAULT_PAGE_SIZE) -> int:
+    if not limit or limit < 1:
+        return default
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(created_at: Any, row_id: Any) -> str:
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps([created_at, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    """(created_at, id) from a cursor; 400 if it was not made by encode_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        if not isinstance(created_at, str) or not isinstance(row_id, (int, str)):
+            raise ValueError(cursor)
+        return created_at, row_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(
+    query: Query,
+    model,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = DEFAULT_PAGE_SIZE,
+    max_limit: int = MAX_PAGE_SIZE
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    One page of `query`, newest first. Returns the rows and the cursor for the
+    next page (None on the last page). `query` is either for `model` objects or
+    for a projection of `model` columns including `id` (rows come back as
+    named tuples, without ORM objects to build).
+    """
+    limit = min(clamp_page_size(limit), max_limit)
+    entities = query.column_descriptions[0]['expr'] is model
+    sqlite = query.session.get_bind().dialect.name == 'sqlite'
+    created = type_coerce(model.created_at, String) if sqlite else model.created_at
+
+    if cursor:
+        last_created, last_id = decode_cursor(cursor)
+        if not sqlite:
+            try:
+                last_created = datetime.fromisoformat(last_created)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(or_(
+            created < last_created,
+            and_(created == last_created, model.id < last_id)
+        ))
+
+    rows = query.add_columns(created.label('_cursor_created')).order_by(
+        model.created_at.desc(), model.id.desc()
+    ).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last._cursor_created, last[0].id if entities else last.id)
+    return [row[0] for row in rows] if entities else rows, next_cursor
@@ -0,0 +1,204 @@
+# price_history.py
+# Product price time series: append-only writes, downsampled reads
+#
+# Usage:
+#   python price_history.py --migrate             # move Favorite.price_history JSON into product_price_points
+#   python price_history.py --product asos-123 --points 50
+#
+# Price points live in product_price_points, indexed on (product_id, ts) and
+# shared by everyone who favorited the product. A price check appends one row
+# per product; nothing is read back or rewritten. Reads pull the requested
+# window off the index and downsample it to at most `points` points, so a
+# series that has been checked for years still returns a chart-sized payload:
+#
+#   lttb    Largest-Triangle-Three-Buckets: keeps the points that carry the
+#           visual shape (drops, spikes) - the default
+#   minmax  Min and max of each bucket: never hides an extreme price
+
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
+import argparse
+import json
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from database import Favorite
+from catalog_models import ProductPricePoint
+
+
+DEFAULT_POINTS = 200
+MAX_POINTS = 2000
+DOWNSAMPLERS = ("lttb", "minmax")
+MIGRATE_BATCH = 1000
+
+
+# ============================================
+# WRITES
+# ============================================
+
+def record_price_point(db: Session, product_id: str, price: float, ts: Optional[datetime] = None):
+    """Append one observed price (caller commits)."""
+    db.add(ProductPricePoint(product_id=product_id, price=price, ts=ts or datetime.utcnow()))
+
+
+# ============================================
+# DOWNSAMPLING
+# ============================================
+
+def lttb(xs: np.ndarray, ys: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the Largest-Triangle-Three-Buckets sample (first and last always kept)."""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = xs[next_start:next_end].mean(), ys[next_start:next_end].mean()
+
+        # Twice the area of the triangle (a, candidate, next bucket's average)
+        area = np.abs((xs[a] - avg_x) * (ys[start:end] - ys[a]) - (xs[a] - xs[start:end]) * (avg_y - ys[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_buckets(ys: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of each bucket's min and max, in time order (at most `threshold` points)."""
+    n = len(ys)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, threshold // 2 + 1).astype(np.int64)
+    selected = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            bucket = ys[start:end]
+            selected.extend(sorted({start + int(bucket.argmin()), start + int(bucket.argmax())}))
+    return np.asarray(selected, dtype=np.int64)
+
+
+def downsample(points: List[Tuple[datetime, float]], threshold: int, method: str = "lttb") -> List[Tuple[datetime, float]]:
+    if len(points) <= threshold:
+        return points
+    ys = np.fromiter((p for _, p in points), dtype=np.float64, count=len(points))
+    if method == "minmax":
+        indices = minmax_buckets(ys, threshold)
+    elif method == "lttb":
+        xs = np.fromiter((ts.timestamp() for ts, _ in points), dtype=np.float64, count=len(points))
+        indices = lttb(xs, ys, threshold)
+    else:
+        raise ValueError(f"Unknown downsampling method {method!r} (expected one of {DOWNSAMPLERS})")
+    return [points[i] for i in indices]
+
+
+# ============================================
+# READS
+# ============================================
+
+def price_series(
+    db: Session,
+    product_id: str,
+    points: int = DEFAULT_POINTS,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    method: str = "lttb"
+) -> Dict[str, Any]:
+    """A product's price points in [since, until], downsampled to at most `points`."""
+    query = db.query(ProductPricePoint.ts, ProductPricePoint.price).filter(
+        ProductPricePoint.product_id == product_id
+    )
+    if since is not None:
+        query = query.filter(ProductPricePoint.ts >= since)
+    if until is not None:
+        query = query.filter(ProductPricePoint.ts <= until)
+    raw = [(ts, price) for ts, price in query.order_by(ProductPricePoint.ts).all()]
+
+    sampled = downsample(raw, min(points, MAX_POINTS), method)
+    return {
+        "total_points": len(raw),
+        "returned_points": len(sampled),
+        "method": method if len(sampled) < len(raw) else None,
+        "points": [{"date": ts.isoformat(), "price": price} for ts, price in sampled],
+    }
+
+
+# ============================================
+# MIGRATION FROM Favorite.price_history
+# ============================================
+
+def migrate_favorite_history(db: Session, batch_size: int = MIGRATE_BATCH) -> Dict[str, int]:
+    """
+    Copy every Favorite.price_history JSON blob into product_price_points, then
+    clear the blob. Favorites of the same product share one series, so points
+    with the same (product, timestamp) are written once. Safe to re-run.
+    """
+    favorites = written = skipped = 0
+    last_id = 0
+    while True:
+        batch = db.query(Favorite).filter(
+            Favorite.id > last_id,
+            Favorite.price_history.isnot(None)
+        ).order_by(Favorite.id).limit(batch_size).all()
+        if not batch:
+            break
+
+        pending: Dict[Tuple[str, datetime], float] = {}
+        for fav in batch:
+            try:
+                history = json.loads(fav.price_history) if fav.price_history else []
+            except ValueError:
+                history = []
+            for entry in history:
+                try:
+                    ts, price = datetime.fromisoformat(entry["date"]), float(entry["price"])
+                except (KeyError, TypeError, ValueError):
+                    skipped += 1
+                    continue
+                pending.setdefault((fav.product_id, ts), price)
+            fav.price_history = None
+            favorites += 1
+
+        existing = {
+            (product_id, ts) for product_id, ts in db.query(ProductPricePoint.product_id, ProductPricePoint.ts).filter(
+                ProductPricePoint.product_id.in_({product_id for product_id, _ in pending})
+            )
+        } if pending else set()
+        rows = [
+            {"product_id": product_id, "ts": ts, "price": price}
+            for (product_id, ts), price in pending.items() if (product_id, ts) not in existing
+        ]
+        db.bulk_insert_mappings(ProductPricePoint, rows)
+        db.commit()
+
+        written += len(rows)
+        last_id = batch[-1].id
+
+    print(f"Migrated price history of {favorites} favorites: {written} points written, {skipped} malformed skipped")
+    return {"favorites": favorites, "points": written, "skipped": skipped}
+
+
+if __name__ == "__main__":
+    from database import init_db, SessionLocal
+
+    parser = argparse.ArgumentParser(description="Product price history: migrate the JSON blobs or print a series")
+    parser.add_argument("--migrate", action="store_true", help="Move Favorite.price_history into product_price_points")
+    parser.add_argument("--product", help="Print this product's downsampled series")
+    parser.add_argument("--points", type=int, default=DEFAULT_POINTS)
+    parser.add_argument("--method", choices=DOWNSAMPLERS, default="lttb")
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.migrate:
+            migrate_favorite_history(db)
+        if args.product:
+            print(json.dumps(price_series(db, args.product, args.points, method=args.method), indent=2))
+    finally:
+        db.close()
@@ -0,0 +1,350 @@
+# product_catalog.py
+# Read-optimized, in-memory columnar view of the product_catalog table
+#
+# Usage:
+#   python product_catalog.py --backfill        # seed from post tags + interaction metadata
+#   python product_catalog.py --import f.jsonl  # upsert one product dict per line
+#   python product_catalog.py --status
+#
+# Every column is held as one array, with categoricals (category, brand, color,
+# style, retailer) interned to int32 codes (-1 = unknown). Recommendation paths
+# gather attributes and prices for thousands of candidates with one positions
+# lookup and a fancy index, never a per-product query. The cache is loaded at
+# startup (warm_product_catalog) and refreshed incrementally: a refresh only
+# reads rows whose updated_at is at or past the last one it saw.
+
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from catalog_models import ProductCatalog
+from user_features import FEATURE_KINDS, get_feature_space, extract_attributes, _normalize_value
+
+
+CATALOG_REFRESH_INTERVAL = 60  # Seconds between incremental refreshes on read
+CATALOG_CATEGORICALS = ('category', 'brand', 'color', 'style', 'retailer')
+CATALOG_FIELDS = ('name', 'price', 'image_url', 'embedding_row') + CATALOG_CATEGORICALS
+
+
+def parse_price(value: Any, default: Optional[float] = None) -> Optional[float]:
+    """Prices arrive as floats or free-form strings ("$49.99", "1,299.00")"""
+    if value is None:
+        return default
+    try:
+        return float(str(value).replace('$', '').replace(',', '').strip())
+    except (TypeError, ValueError):
+        return default
+
+
+# ============================================
+# COLUMNAR CACHE
+# ============================================
+
+class Categorical:
+    """Interned values of one string column: code <-> value."""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def intern(self, value: Any) -> int:
+        value = _normalize_value(value)
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def value(self, code: int) -> Optional[str]:
+        return self.values[code] if 0 <= code < len(self.values) else None
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class ProductCatalogCache:
+    """
+    Column arrays for every catalog product, row i = product_ids[i].
+    Refreshes build new arrays and swap them in, so readers never see a half-applied refresh.
+    """
+
+    def __init__(self):
+        self.product_ids = np.array([], dtype=object)
+        self.positions: Dict[str, int] = {}
+        self.categoricals = {name: Categorical() for name in CATALOG_CATEGORICALS}
+        self.codes = {name: np.empty(0, dtype=np.int32) for name in CATALOG_CATEGORICALS}
+        self.prices = np.empty(0, dtype=np.float64)           # NaN = unknown
+        self.embedding_rows = np.empty(0, dtype=np.int32)     # -1 = no embedding
+        self.names = np.array([], dtype=object)
+        self.image_urls = np.array([], dtype=object)
+        self.watermark: Optional[datetime] = None
+        self.refreshed_at = 0.0
+        self._feature_maps: Dict[str, tuple] = {}  # kind -> (values, space size, code -> FeatureSpace id)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def is_stale(self) -> bool:
+        return time.time() - self.refreshed_at > CATALOG_REFRESH_INTERVAL
+
+    def refresh(self, db: Session) -> int:
+        """Apply rows changed since the last refresh; returns how many were read."""
+        with self._lock:
+            query = db.query(
+                ProductCatalog.product_id, ProductCatalog.updated_at,
+                *[getattr(ProductCatalog, name) for name in CATALOG_FIELDS]
+            )
+            if self.watermark is not None:
+                query = query.filter(ProductCatalog.updated_at >= self.watermark)
+            rows = query.order_by(ProductCatalog.updated_at).all()
+            self.refreshed_at = time.time()
+            if rows:
+                self._apply(rows)
+                stamps = [r.updated_at for r in rows if r.updated_at]
+                if stamps:
+                    self.watermark = max(stamps)
+            return len(rows)
+
+    def _apply(self, rows):
+        positions = dict(self.positions)
+        for row in rows:
+            if row.product_id not in positions:
+                positions[row.product_id] = len(positions)
+
+        n = len(positions)
+        grow = n - len(self.product_ids)
+
+        def grown(array: np.ndarray, fill) -> np.ndarray:
+            return np.concatenate([array, np.full(grow, fill, dtype=array.dtype)])
+
+        product_ids = grown(self.product_ids, None)
+        codes = {name: grown(values, -1) for name, values in self.codes.items()}
+        prices = grown(self.prices, np.nan)
+        embedding_rows = grown(self.embedding_rows, -1)
+        names = grown(self.names, None)
+        image_urls = grown(self.image_urls, None)
+
+        for row in rows:
+            i = positions[row.product_id]
+            product_ids[i] = row.product_id
+            for name in CATALOG_CATEGORICALS:
+                codes[name][i] = self.categoricals[name].intern(getattr(row, name))
+            prices[i] = row.price if row.price is not None else np.nan
+            embedding_rows[i] = row.embedding_row if row.embedding_row is not None else -1
+            names[i] = row.name
+            image_urls[i] = row.image_url
+
+        self.product_ids, self.codes, self.prices = product_ids, codes, prices
+        self.embedding_rows, self.names, self.image_urls = embedding_rows, names, image_urls
+        self.positions = positions
+
+    # ---------- reads ----------
+
+    def positions_for(self, product_ids: List[str]) -> np.ndarray:
+        """Row of each product (-1 if not in the catalog)."""
+        positions = self.positions
+        return np.array([positions.get(pid, -1) for pid in product_ids], dtype=np.int64)
+
+    def _gather(self, column: np.ndarray, rows: np.ndarray, fill) -> np.ndarray:
+        out = np.full(len(rows), fill, dtype=column.dtype)
+        known = rows >= 0
+        out[known] = column[rows[known]]
+        return out
+
+    def codes_for(self, name: str, product_ids: List[str]) -> np.ndarray:
+        """Interned codes of one categorical column (-1 unknown)."""
+        return self._gather(self.codes[name], self.positions_for(product_ids), -1)
+
+    def prices_for(self, product_ids: List[str]) -> np.ndarray:
+        return self._gather(self.prices, self.positions_for(product_ids), np.nan)
+
+    def attributes_for(self, db: Session, product_ids: List[str]) -> np.ndarray:
+        """
+        (n_products, len(FEATURE_KINDS)) int32 matrix of FeatureSpace ids, -1 = unknown,
+        the same layout as the taste index so the two can be combined directly.
+        """
+        rows = self.positions_for(product_ids)
+        matrix = np.full((len(product_ids), len(FEATURE_KINDS)), -1, dtype=np.int32)
+        space = get_feature_space(db)
+        for column, kind in enumerate(FEATURE_KINDS):
+            feature_ids = self._feature_map(space, kind)
+            codes = self._gather(self.codes[kind], rows, -1)
+            known = codes >= 0
+            matrix[known, column] = feature_ids[codes[known]]
+        return matrix
+
+    def _feature_map(self, space, kind: str) -> np.ndarray:
+        """code -> FeatureSpace id; rebuilt when either vocabulary has grown."""
+        categorical = self.categoricals[kind]
+        cached = self._feature_maps.get(kind)
+        if cached and cached[0] == len(categorical) and cached[1] == space.size:
+            return cached[2]
+        mapping = np.array([space.lookup(kind, value) for value in categorical.values], dtype=np.int32)
+        self._feature_maps[kind] = (len(categorical), space.size, mapping)
+        return mapping
+
+    def info(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """One product as a dict (unknown fields are None)."""
+        i = self.positions.get(product_id)
+        if i is None:
+            return None
+        product = {
+            'product_id': product_id,
+            'name': self.names[i],
+            'price': None if np.isnan(self.prices[i]) else float(self.prices[i]),
+            'image_url': self.image_urls[i],
+            'embedding_row': int(self.embedding_rows[i]) if self.embedding_rows[i] >= 0 else None,
+        }
+        for name in CATALOG_CATEGORICALS:
+            product[name] = self.categoricals[name].value(int(self.codes[name][i]))
+        return product
+
+
+_catalogs: Dict[str, ProductCatalogCache] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_product_catalog(db: Session) -> ProductCatalogCache:
+    """Per-database catalog cache, refreshed incrementally at most every CATALOG_REFRESH_INTERVAL."""
+    key = str(db.get_bind().url)
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.setdefault(key, ProductCatalogCache())
+    if catalog.is_stale():
+        catalog.refresh(db)
+    return catalog
+
+
+def warm_product_catalog(session_factory=None):
+    """Load the catalog at startup so the first request doesn't pay for it."""
+    if session_factory is None:
+        from database import SessionLocal as session_factory
+    db = session_factory()
+    try:
+        catalog = get_product_catalog(db)
+        print(f"Product catalog loaded: {len(catalog)} products")
+    except Exception as e:
+        print(f"Could not load product catalog: {e}")
+    finally:
+        db.close()
+
+
+# ============================================
+# WRITES
+# ============================================
+
+def upsert_products(db: Session, products: List[Dict[str, Any]]) -> int:
+    """
+    Insert or update catalog rows by product_id (bulk, no per-row round trips).
+    Only the fields present in each dict are written.
+    """
+    products = [p for p in products if p.get('product_id')]
+    if not products:
+        return 0
+
+    existing = dict(db.query(ProductCatalog.product_id, ProductCatalog.id).filter(
+        ProductCatalog.product_id.in_([p['product_id'] for p in products])
+    ).all())
+
+    now = datetime.utcnow()
+    inserts, updates = {}, {}
+    for product in products:
+        row = {field: product[field] for field in CATALOG_FIELDS if field in product}
+        if 'price' in row:
+            row['price'] = parse_price(row['price'])
+        row['updated_at'] = now
+        if product['product_id'] in existing:
+            updates.setdefault(product['product_id'], {'id': existing[product['product_id']]}).update(row)
+        else:
+            inserts.setdefault(product['product_id'], {'product_id': product['product_id'], 'created_at': now}).update(row)
+
+    if inserts:
+        db.bulk_insert_mappings(ProductCatalog, list(inserts.values()))
+    if updates:
+        db.bulk_update_mappings(ProductCatalog, list(updates.values()))
+    db.commit()
+    return len(inserts) + len(updates)
+
+
+def backfill_catalog(db: Session, batch_size: int = 1000) -> int:
+    """
+    Seed the catalog for products it doesn't know yet: names, brands, prices and
+    images from creator post tags, attributes from the latest interaction metadata.
+    """
+    from creator_models import PostProduct
+    from interaction_models import UserInteraction
+
+    known = {pid for (pid,) in db.query(ProductCatalog.product_id)}
+    products: Dict[str, Dict[str, Any]] = {}
+
+    for tag in db.query(PostProduct).filter(PostProduct.product_id.isnot(None)).yield_per(batch_size):
+        if tag.product_id in known or tag.product_id in products:
+            continue
+        products[tag.product_id] = {
+            'product_id': tag.product_id,
+            'name': tag.product_name,
+            'brand': tag.product_brand,
+            'price': parse_price(tag.product_price),
+            'image_url': tag.product_image,
+        }
+
+    rows = db.query(UserInteraction.item_id, UserInteraction.interaction_metadata).filter(
+        UserInteraction.item_type == 'product',
+        UserInteraction.item_id.isnot(None),
+        UserInteraction.interaction_metadata.isnot(None)
+    ).order_by(UserInteraction.created_at.desc()).yield_per(5000)
+
+    for item_id, metadata in rows:
+        if item_id in known:
+            continue
+        product = products.setdefault(item_id, {'product_id': item_id})
+        values = dict(extract_attributes(metadata))
+        if isinstance(metadata, dict):
+            values['price'] = parse_price(metadata.get('price'))
+            values['retailer'] = _normalize_value(metadata.get('retailer'))
+        for field, value in values.items():
+            if value is not None and product.get(field) is None:  # Latest value wins
+                product[field] = value
+
+    pending = list(products.values())
+    for start in range(0, len(pending), batch_size):
+        upsert_products(db, pending[start:start + batch_size])
+    return len(pending)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the product catalog")
+    parser.add_argument("--backfill", action="store_true", help="Seed from post tags and interaction metadata")
+    parser.add_argument("--import", dest="import_path", help="JSONL file, one product dict per line")
+    parser.add_argument("--status", action="store_true", help="Show catalog size and cache load time")
+    args = parser.parse_args()
+
+    from database import SessionLocal, init_db
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.backfill:
+            print(f"Backfilled {backfill_catalog(db)} products")
+        if args.import_path:
+            with open(args.import_path) as f:
+                batch = [json.loads(line) for line in f if line.strip()]
+            print(f"Upserted {upsert_products(db, batch)} products")
+        if args.status or not (args.backfill or args.import_path):
+            started = time.perf_counter()
+            catalog = ProductCatalogCache()
+            catalog.refresh(db)
+            print(f"{len(catalog)} products loaded in {(time.perf_counter() - started) * 1000:.1f} ms")
+            for name in CATALOG_CATEGORICALS:
+                print(f"  {name}: {len(catalog.categoricals[name])} distinct values")
+    finally:
+        db.close()
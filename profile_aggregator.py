@@ -0,0 +1,262 @@
+# profile_aggregator.py
+# Single-pass, columnar profile aggregation for bulk rebuilds
+#
+# One walk over the interaction rows extracts every field the profile needs
+# into typed arrays (user, time, action, weight) plus exploded (row, facet,
+# value) and (row, kind, value) event columns. Every aggregate is then a
+# vectorized group-by: np.unique on a combined (user, facet, value) key and
+# np.bincount / ufunc.at for the sums, minima and maxima.
+#
+# The output matches profile_builder.compute_profile_fields +
+# user_features.raw_user_features for each user (see test_profile_aggregator.py),
+# so rebuild_all_profiles can use it for whole chunks of users at once.
+
+from typing import List, Dict, Any, Tuple
+from datetime import datetime
+
+import numpy as np
+
+from profile_builder import (
+    ProfileAccumulator, FACETS, COLOR_ACTIONS, BRAND_ACTIONS, PRICE_ACTIONS, ENGAGED_ACTIONS,
+    STYLE_KEYWORDS, _HALF_LIFE_SECONDS, _interaction_time
+)
+from user_features import (
+    UserFeatures, ACTION_PREFERENCE_WEIGHTS, FEATURE_KINDS, PREFERENCE_WINDOW_DAYS, extract_attributes
+)
+
+_FACET_CODES = {facet: code for code, facet in enumerate(FACETS)}
+F_COLORS, F_BRANDS, F_CATEGORIES, F_KEYWORDS, F_CREATOR_STYLES, F_SIZES, F_SEARCHED_CATEGORIES, \
+    F_ENGAGED_CATEGORIES, F_ACTIONS = (_FACET_CODES[facet] for facet in (
+        'colors', 'brands', 'categories', 'keywords', 'creator_styles', 'sizes',
+        'searched_categories', 'engaged_categories', 'actions'
+    ))
+KIND_CODES = {kind: code for code, kind in enumerate(FEATURE_KINDS)}
+_WEIGHTED_FACETS = np.array([facet in ('colors', 'categories', 'brands') for facet in FACETS])  # Scaled by interaction weight
+
+
+class _Events:
+    """
+    Exploded (row, code) columns, appended during the single pass. Each distinct
+    (group, value) pair is interned to an integer code as it is seen, so the
+    group-bys work on int64 keys instead of sorting strings.
+    """
+
+    def __init__(self, n_groups: int):
+        self.rows: List[int] = []
+        self.codes: List[int] = []
+        self.interned: List[Dict[str, int]] = [{} for _ in range(n_groups)]
+        self.groups: List[int] = []     # Group of each code
+        self.values: List[str] = []     # Value of each code
+
+    def code(self, group: int, value: str) -> int:
+        code = self.interned[group].get(value)
+        if code is None:
+            code = self.interned[group][value] = len(self.values)
+            self.groups.append(group)
+            self.values.append(value)
+        return code
+
+    def adder(self):
+        """Fast local add(row, group, value) for the hot loop."""
+        append_row, append_code, interned, code_for = self.rows.append, self.codes.append, self.interned, self.code
+
+        def add(row: int, group: int, value: Any):
+            if value is None or isinstance(value, (dict, list)):
+                return
+            value = str(value)
+            code = interned[group].get(value)
+            append_row(row)
+            append_code(code_for(group, value) if code is None else code)
+        return add
+
+
+def _float(value: Any):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _group_sums(users: np.ndarray, events: _Events, amounts: np.ndarray) -> List[Tuple[int, int, str, float]]:
+    """Sum amounts per (user, code); returns (user index, group, value, total) tuples."""
+    if not events.rows:
+        return []
+    n_codes = len(events.values)
+    keys = users[np.array(events.rows, dtype=np.int64)] * n_codes + np.array(events.codes, dtype=np.int64)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse, weights=amounts, minlength=len(unique_keys))
+
+    codes = unique_keys % n_codes
+    groups, values = events.groups, events.values
+    return [
+        (user, groups[code], values[code], total)
+        for user, code, total in zip((unique_keys // n_codes).tolist(), codes.tolist(), totals.tolist())
+    ]
+
+
+def aggregate_profiles(rows: List[Any], now: datetime) -> List[Tuple[int, ProfileAccumulator, Dict[str, Any], UserFeatures]]:
+    """
+    Interactions for any number of users -> (user_id, aggregates, profile fields,
+    raw feature vector) per user, in first-appearance order. Rows need user_id,
+    action_type, interaction_metadata, weight and created_at.
+    """
+    n = len(rows)
+    if n == 0:
+        return []
+
+    # ============================================
+    # SINGLE PASS: typed columns + exploded events
+    # ============================================
+    user_index: Dict[int, int] = {}
+    users = np.empty(n, dtype=np.int64)
+    offsets = np.empty(n, dtype=np.float64)        # Seconds relative to now
+    weights = np.empty(n, dtype=np.float64)
+    preference = np.empty(n, dtype=np.float64)     # Action preference weight (feature vectors)
+    times: List[datetime] = []
+
+    facets = _Events(len(FACETS))
+    attributes = _Events(len(FEATURE_KINDS))
+    action_codes = np.empty(n, dtype=np.int64)
+    add_facet = facets.adder()
+    add_attribute = attributes.adder()
+    price_rows: List[int] = []
+    price_values: List[float] = []
+    feature_price_rows: List[int] = []
+    feature_price_values: List[float] = []
+
+    for i, interaction in enumerate(rows):
+        users[i] = user_index.setdefault(interaction.user_id, len(user_index))
+        at = interaction.created_at
+        at = _interaction_time(interaction) if at is None or at.tzinfo is not None else at
+        times.append(at)
+        offsets[i] = (at - now).total_seconds()
+        weights[i] = interaction.weight or 0.0
+        action = interaction.action_type
+        preference[i] = ACTION_PREFERENCE_WEIGHTS.get(action, 1.0)
+        raw = interaction.interaction_metadata
+        metadata = raw if isinstance(raw, dict) else {}
+
+        action_codes[i] = facets.code(F_ACTIONS, str(action))
+        if action in COLOR_ACTIONS:
+            add_facet(i, F_COLORS, metadata.get('color'))
+            colors = metadata.get('colors')
+            for color in colors if isinstance(colors, list) else []:
+                add_facet(i, F_COLORS, color)
+            add_facet(i, F_CATEGORIES, metadata.get('category'))
+        if action in BRAND_ACTIONS:
+            add_facet(i, F_BRANDS, metadata.get('brand'))
+        if action == 'search' and isinstance(metadata.get('query'), str):
+            for word in metadata['query'].lower().split():
+                if word in STYLE_KEYWORDS:
+                    add_facet(i, F_KEYWORDS, word)
+        tags = metadata.get('tags')
+        for tag in tags if isinstance(tags, list) else []:
+            add_facet(i, F_KEYWORDS, tag)
+        if action == 'follow_creator' and isinstance(metadata.get('creator_style'), list):
+            for style in metadata['creator_style']:
+                add_facet(i, F_KEYWORDS, style)
+                add_facet(i, F_CREATOR_STYLES, style)
+        if 'size' in metadata and 'category' in metadata:
+            add_facet(i, F_SIZES, f"{metadata['category']}/{metadata['size']}")
+        if 'category' in metadata:
+            if action == 'search':
+                add_facet(i, F_SEARCHED_CATEGORIES, metadata['category'])
+            if action in ENGAGED_ACTIONS:
+                add_facet(i, F_ENGAGED_CATEGORIES, metadata['category'])
+
+        price = _float(metadata['price']) if 'price' in metadata else None
+        if price is not None and action in PRICE_ACTIONS:
+            price_rows.append(i)
+            price_values.append(price)
+
+        # Feature vector inputs (every action with metadata)
+        if raw:
+            for kind, value in extract_attributes(raw).items():
+                add_attribute(i, KIND_CODES[kind], value)
+            if price is not None:
+                feature_price_rows.append(i)
+                feature_price_values.append(price)
+
+    n_users = len(user_index)
+    user_ids = list(user_index)
+
+    # ============================================
+    # VECTORIZED GROUP-BYS
+    # ============================================
+    decay = np.power(2.0, offsets / _HALF_LIFE_SECONDS)
+    total_weight = np.bincount(users, weights=weights * decay, minlength=n_users)
+
+    order = np.lexsort((offsets, users))
+    first_rows = order[np.searchsorted(users[order], np.arange(n_users))]
+
+    facets.rows.extend(range(n))                   # One action event per row
+    facets.codes.extend(action_codes.tolist())
+    facet_rows = np.array(facets.rows, dtype=np.int64)
+    weighted = _WEIGHTED_FACETS[np.array(facets.groups, dtype=np.int64)[np.array(facets.codes, dtype=np.int64)]]
+    facet_amounts = decay[facet_rows] * np.where(weighted, weights[facet_rows], 1.0)
+    facet_sums = _group_sums(users, facets, facet_amounts)
+
+    # Weighted price stats: sums of w, w*x, w*(x - mean)^2, plus extremes
+    price_rows_arr = np.array(price_rows, dtype=np.int64)
+    prices = np.array(price_values, dtype=np.float64)
+    price_users = users[price_rows_arr]
+    price_w = decay[price_rows_arr]
+    price_weight = np.bincount(price_users, weights=price_w, minlength=n_users)
+    price_sum = np.bincount(price_users, weights=price_w * prices, minlength=n_users)
+    price_mean = np.divide(price_sum, price_weight, out=np.zeros(n_users), where=price_weight > 0)
+    price_m2 = np.bincount(price_users, weights=price_w * (prices - price_mean[price_users]) ** 2, minlength=n_users)
+    price_min = np.full(n_users, np.inf)
+    price_max = np.full(n_users, -np.inf)
+    np.minimum.at(price_min, price_users, prices)
+    np.maximum.at(price_max, price_users, prices)
+
+    # Feature vector: action weight x recency (90-day linear, floor 0.3) x tracked weight
+    days_ago = np.floor(-offsets / 86400.0)
+    recency = np.maximum(0.3, 1.0 - days_ago / float(PREFERENCE_WINDOW_DAYS))
+    feature_weight = preference * recency * weights
+    attribute_rows = np.array(attributes.rows, dtype=np.int64)
+    attribute_sums = _group_sums(users, attributes, feature_weight[attribute_rows])
+
+    fp_rows = np.array(feature_price_rows, dtype=np.int64)
+    fp_values = np.array(feature_price_values, dtype=np.float64)
+    fp_weight = feature_weight[fp_rows]
+    positive = fp_weight > 0  # Negative feedback doesn't move the budget estimate
+    fp_users = users[fp_rows][positive]
+    fp_values, fp_weight = fp_values[positive], fp_weight[positive]
+    feature_price_weight = np.bincount(fp_users, weights=fp_weight, minlength=n_users)
+    feature_price_sum = np.bincount(fp_users, weights=fp_weight * fp_values, minlength=n_users)
+    feature_price_min = np.full(n_users, np.inf)
+    feature_price_max = np.full(n_users, -np.inf)
+    np.minimum.at(feature_price_min, fp_users, fp_values)
+    np.maximum.at(feature_price_max, fp_users, fp_values)
+
+    # ============================================
+    # PER-USER RESULTS (one small dict per distinct value)
+    # ============================================
+    accumulators = [ProfileAccumulator(now) for _ in range(n_users)]
+    for u, accumulator in enumerate(accumulators):
+        accumulator.total_weight = float(total_weight[u])
+        accumulator.first_seen_at = times[first_rows[u]]
+        if price_weight[u] > 0:
+            accumulator.price_weight = float(price_weight[u])
+            accumulator.price_mean = float(price_mean[u])
+            accumulator.price_m2 = float(price_m2[u])
+            accumulator.price_min = float(price_min[u])
+            accumulator.price_max = float(price_max[u])
+    for u, facet, value, total in facet_sums:
+        accumulators[u].counters[FACETS[facet]][value] = total
+
+    features = [UserFeatures(user_id=user_id) for user_id in user_ids]
+    for u, kind, value, total in attribute_sums:
+        features[u].weights[(FEATURE_KINDS[kind], value)] = total
+    for u, feature in enumerate(features):
+        if feature_price_weight[u] > 0:
+            feature.price_weight_sum = float(feature_price_weight[u])
+            feature.price_weighted_sum = float(feature_price_sum[u])
+            feature.price_min = float(feature_price_min[u])
+            feature.price_max = float(feature_price_max[u])
+
+    return [
+        (user_id, accumulators[u], accumulators[u].profile_fields(now), features[u])
+        for u, user_id in enumerate(user_ids)
+    ]
@@ -1,22 +1,294 @@
 # profile_builder.py
-# Background service to build user profiles from interactions
+# Build user style profiles from interactions
+#
+# Profiles are maintained incrementally: every tracked interaction is folded into
+# the user's UserProfileAggregate (decayed counters + running price stats) in O(1)
+# and the profile fields are re-derived from those small aggregates. A user with
+# no aggregates yet is seeded from their 90-day history on their first event.
+# A periodic compaction applies time decay and forgets faded values.
+# rebuild_user_profile, which re-reads 90 days of interactions, stays as a
+# repair tool.
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy.orm.attributes import flag_modified
 from datetime import datetime, timedelta
-from collections import Counter
-import json
+from typing import List, Dict, Any, Optional, Tuple, NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import argparse
+import math
+import os
+import threading
+import time
 
+import numpy as np
+
+from database import bulk_upsert, make_engine
 from interaction_models import UserInteraction, UserStyleProfile
+from recommendation_models import UserProfileAggregate, UserFeatureVector
+from user_features import (
+    refresh_user_features, intern_user_features, get_feature_space
+)
 
 
-def rebuild_user_profile(db: Session, user_id: int):
+# ============================================
+# INCREMENTAL AGGREGATES
+# ============================================
+
+PROFILE_HALF_LIFE_DAYS = 30          # A signal from 30 days ago counts half
+PROFILE_WINDOW_DAYS = 90             # Window re-read by a full (repair) rebuild
+COMPACTION_INTERVAL = timedelta(days=1)
+COMPACTION_BATCH = 500
+COMPACTOR_POLL = 3600                # Seconds between compaction passes
+PRUNE_BELOW = 0.05                   # Decayed weight under which a value is forgotten
+MAX_COUNTER_VALUES = 100             # Per facet, kept at compaction
+
+_HALF_LIFE_SECONDS = PROFILE_HALF_LIFE_DAYS * 86400.0
+
+COLOR_ACTIONS = {'favorite_product', 'wardrobe_upload', 'canvas_add'}
+BRAND_ACTIONS = {'favorite_product', 'click_to_retailer', 'purchase_complete'}
+PRICE_ACTIONS = {'favorite_product', 'click_to_retailer'}
+ENGAGED_ACTIONS = {'favorite_product', 'canvas_add'}
+
+# facet -> {value: decayed weight}; 'sizes' is keyed "category/size"
+FACETS = (
+    'colors', 'brands', 'categories', 'keywords', 'creator_styles', 'sizes',
+    'searched_categories', 'engaged_categories', 'actions'
+)
+
+
+class ProfileAccumulator:
     """
-    Analyze all user interactions and build a comprehensive style profile.
-    This should run nightly for all users via background job.
+    Decayed counters and weighted Welford price stats for one user.
+    Forward decay: an event at time t is added with weight 2^((t - landmark) / half-life),
+    so adding is O(1) and decay_to() rescales everything when the landmark moves.
     """
-    
-    # Get user's profile or create new one
+
+    def __init__(self, landmark: datetime):
+        self.landmark = landmark
+        self.counters: Dict[str, Dict[str, float]] = {facet: {} for facet in FACETS}
+        self.price_weight = 0.0
+        self.price_mean = 0.0
+        self.price_m2 = 0.0
+        self.price_min: Optional[float] = None
+        self.price_max: Optional[float] = None
+        self.total_weight = 0.0
+        self.first_seen_at: Optional[datetime] = None
+
+    def _scale(self, at: datetime) -> float:
+        return math.pow(2.0, (at - self.landmark).total_seconds() / _HALF_LIFE_SECONDS)
+
+    def _bump(self, facet: str, value: Any, amount: float):
+        if value is None or isinstance(value, (dict, list)):
+            return
+        counter = self.counters[facet]
+        key = str(value)
+        counter[key] = counter.get(key, 0.0) + amount
+
+    def add(self, action_type: str, metadata: Optional[Dict[str, Any]], weight: float, at: datetime):
+        """Fold one interaction in."""
+        metadata = metadata if isinstance(metadata, dict) else {}
+        weight = weight or 0.0
+        decay = self._scale(at)
+
+        self.total_weight += weight * decay
+        if self.first_seen_at is None or at < self.first_seen_at:
+            self.first_seen_at = at
+        self._bump('actions', action_type, decay)
+
+        # Colors and categories (weighted by interaction importance)
+        if action_type in COLOR_ACTIONS:
+            self._bump('colors', metadata.get('color'), weight * decay)
+            colors = metadata.get('colors')  # Multiple colors
+            for color in colors if isinstance(colors, list) else []:
+                self._bump('colors', color, weight * decay)
+            self._bump('categories', metadata.get('category'), weight * decay)
+
+        # Brands
+        if action_type in BRAND_ACTIONS:
+            self._bump('brands', metadata.get('brand'), weight * decay)
+
+        # Style keywords: search queries, tagged items, followed creators
+        if action_type == 'search' and isinstance(metadata.get('query'), str):
+            for word in metadata['query'].lower().split():
+                if word in STYLE_KEYWORDS:
+                    self._bump('keywords', word, decay)
+        tags = metadata.get('tags')
+        for tag in tags if isinstance(tags, list) else []:
+            self._bump('keywords', tag, decay)
+        if action_type == 'follow_creator' and isinstance(metadata.get('creator_style'), list):
+            for style in metadata['creator_style']:
+                self._bump('keywords', style, decay)
+                self._bump('creator_styles', style, decay)
+
+        # Sizes per category
+        if 'size' in metadata and 'category' in metadata:
+            self._bump('sizes', f"{metadata['category']}/{metadata['size']}", decay)
+
+        # Budget
+        if action_type in PRICE_ACTIONS and 'price' in metadata:
+            try:
+                self._add_price(float(metadata['price']), decay)
+            except (TypeError, ValueError):
+                pass
+
+        # Searched vs engaged categories (for avoided categories)
+        if 'category' in metadata:
+            if action_type == 'search':
+                self._bump('searched_categories', metadata['category'], decay)
+            if action_type in ENGAGED_ACTIONS:
+                self._bump('engaged_categories', metadata['category'], decay)
+
+    def _add_price(self, price: float, weight: float):
+        self.price_weight += weight
+        delta = price - self.price_mean
+        self.price_mean += delta * weight / self.price_weight
+        self.price_m2 += weight * delta * (price - self.price_mean)
+        self.price_min = price if self.price_min is None else min(self.price_min, price)
+        self.price_max = price if self.price_max is None else max(self.price_max, price)
+
+    def decay_to(self, now: datetime):
+        """Move the landmark to now: rescale, forget faded values, cap each facet."""
+        factor = 1.0 / self._scale(now)
+        for facet, counter in self.counters.items():
+            kept = [(value, weight * factor) for value, weight in counter.items()
+                    if abs(weight * factor) >= PRUNE_BELOW]
+            kept.sort(key=lambda entry: -entry[1])
+            self.counters[facet] = dict(kept[:MAX_COUNTER_VALUES])
+        self.price_weight *= factor
+        self.price_m2 *= factor
+        self.total_weight *= factor
+        self.landmark = now
+
+    def _top(self, facet: str, n: int) -> List[str]:
+        ranked = sorted(self.counters[facet].items(), key=lambda entry: (-entry[1], entry[0]))
+        return [value for value, weight in ranked[:n] if weight > 0]
+
+    def profile_fields(self, now: datetime) -> Dict[str, Any]:
+        """UserStyleProfile column values; facets with no data are left out."""
+        fields: Dict[str, Any] = {}
+        for column, facet, n in (
+            ('favorite_colors', 'colors', 10),
+            ('favorite_brands', 'brands', 10),
+            ('favorite_categories', 'categories', 10),
+            ('style_keywords', 'keywords', 15),
+            ('followed_creator_styles', 'creator_styles', 10),
+        ):
+            top = self._top(facet, n)
+            if top:
+                fields[column] = top
+
+        # Most common size per category
+        size_prefs: Dict[str, str] = {}
+        for key in self._top('sizes', len(self.counters['sizes'])):
+            category, _, size = key.rpartition('/')
+            size_prefs.setdefault(category, size)
+        fields['size_preferences'] = size_prefs
+
+        if self.price_weight > 0:
+            fields['avg_price_point'] = self.price_mean
+            fields['budget_min'] = self.price_min
+            fields['budget_max'] = self.price_max
+
+        # Average daily engagement; a decayed sum covers at most ~half-life/ln2 days
+        decay = 1.0 / self._scale(now)
+        if self.first_seen_at is not None:
+            days_active = max((now - self.first_seen_at).days, 1)
+            effective_days = min(days_active, PROFILE_HALF_LIFE_DAYS / math.log(2))
+            fields['engagement_score'] = self.total_weight * decay / effective_days
+
+        # Categories searched for but never favorited or added to a canvas
+        fields['avoided_categories'] = sorted(
+            set(self.counters['searched_categories']) - set(self.counters['engaged_categories'])
+        )
+
+        actions = self.counters['actions']
+        shopping = sum(actions.get(a, 0.0) for a in PRICE_ACTIONS) * decay
+        if shopping > 30:
+            fields['shopping_frequency'] = "high"
+        elif shopping > 10:
+            fields['shopping_frequency'] = "medium"
+        else:
+            fields['shopping_frequency'] = "low"
+        return fields
+
+    # ---------- storage ----------
+
+    @classmethod
+    def from_row(cls, row: UserProfileAggregate) -> "ProfileAccumulator":
+        accumulator = cls(row.landmark_at)
+        stored = row.counters or {}
+        accumulator.counters = {facet: dict(stored.get(facet, {})) for facet in FACETS}
+        accumulator.price_weight = row.price_weight or 0.0
+        accumulator.price_mean = row.price_mean or 0.0
+        accumulator.price_m2 = row.price_m2 or 0.0
+        accumulator.price_min = row.price_min
+        accumulator.price_max = row.price_max
+        accumulator.total_weight = row.total_weight or 0.0
+        accumulator.first_seen_at = row.first_seen_at
+        return accumulator
+
+    def row_values(self) -> Dict[str, Any]:
+        """UserProfileAggregate column values (everything but user_id)."""
+        return {
+            'counters': {facet: dict(counter) for facet, counter in self.counters.items()},
+            'price_weight': self.price_weight,
+            'price_mean': self.price_mean,
+            'price_m2': self.price_m2,
+            'price_min': self.price_min,
+            'price_max': self.price_max,
+            'total_weight': self.total_weight,
+            'first_seen_at': self.first_seen_at,
+            'landmark_at': self.landmark,
+            'updated_at': datetime.now(),
+        }
+
+    def to_row(self, row: UserProfileAggregate):
+        for column, value in self.row_values().items():
+            setattr(row, column, value)
+        flag_modified(row, 'counters')
+
+
+class InteractionRow(NamedTuple):
+    """The columns a profile rebuild reads, detached from any session."""
+    user_id: int
+    action_type: str
+    interaction_metadata: Optional[Dict[str, Any]]
+    weight: float
+    created_at: datetime
+
+
+def compute_profile_fields(rows: List[Any], now: datetime) -> Tuple[ProfileAccumulator, Dict[str, Any]]:
+    """
+    One user's interactions -> (aggregates, UserStyleProfile fields).
+    Pure: takes ORM rows or InteractionRows, touches no database.
+    """
+    accumulator = ProfileAccumulator(now)
+    for interaction in rows:
+        accumulator.add(
+            interaction.action_type,
+            interaction.interaction_metadata,
+            interaction.weight,
+            _interaction_time(interaction)
+        )
+    return accumulator, accumulator.profile_fields(now)
+
+
+def _interaction_time(interaction: UserInteraction) -> datetime:
+    created_at = interaction.created_at or datetime.now()
+    return created_at.replace(tzinfo=None)
+
+
+def _window_interactions(db: Session, user_id: int, now: datetime) -> List[UserInteraction]:
+    """The user's interactions from the last PROFILE_WINDOW_DAYS days."""
+    return db.query(UserInteraction).filter(
+        UserInteraction.user_id == user_id,
+        UserInteraction.created_at >= now - timedelta(days=PROFILE_WINDOW_DAYS)
+    ).all()
+
+
+def _materialize(db: Session, user_id: int, accumulator: ProfileAccumulator, now: datetime) -> UserStyleProfile:
+    """Write the derived fields onto the user's UserStyleProfile (caller commits)."""
     profile = db.query(UserStyleProfile).filter(
         UserStyleProfile.user_id == user_id
     ).first()
@@ -25,192 +297,140 @@ def rebuild_user_profile(db: Session, user_id: int):
         profile = UserStyleProfile(user_id=user_id)
         db.add(profile)
     
-    # Analyze interactions from last 90 days (recent behavior matters most)
-    cutoff_date = datetime.now() - timedelta(days=90)
-    interactions = db.query(UserInteraction).filter(
-        UserInteraction.user_id == user_id,
-        UserInteraction.created_at >= cutoff_date
-    ).all()
-    
-    if not interactions:
+    for column, value in accumulator.profile_fields(now).items():
+        setattr(profile, column, value)
+    profile.updated_at = now
+    return profile
+
+
+def apply_profile_interaction(db: Session, interaction: UserInteraction) -> UserStyleProfile:
+    """
+    Fold one just-tracked interaction into the user's aggregates and re-derive
+    their profile. O(1) in the user's history; caller commits.
+    """
+    return apply_profile_interactions(db, interaction.user_id, [interaction])
+
+
+def apply_profile_interactions(db: Session, user_id: int, interactions: List[UserInteraction]) -> UserStyleProfile:
+    """apply_profile_interaction for several of one user's interactions, deriving the profile once."""
+    now = datetime.now()
+    row = db.get(UserProfileAggregate, user_id)
+    if row is None:
+        # No aggregates yet (new user, or one from before they existed): seed from
+        # the 90-day history like a rebuild, so one event can't overwrite the
+        # whole profile. Callers add the interactions first, so once flushed
+        # they're part of that history and are not folded in again.
+        db.flush()
+        accumulator, _ = compute_profile_fields(_window_interactions(db, user_id, now), now)
+        row = UserProfileAggregate(user_id=user_id)
+        db.add(row)
+    else:
+        accumulator = ProfileAccumulator.from_row(row)
+        for interaction in interactions:
+            accumulator.add(
+                interaction.action_type,
+                interaction.interaction_metadata,
+                interaction.weight,
+                _interaction_time(interaction)
+            )
+    accumulator.to_row(row)
+    return _materialize(db, user_id, accumulator, now)
+
+
+def refresh_user_profile(db: Session, user_id: int) -> Optional[UserStyleProfile]:
+    """Re-derive a profile from its aggregates (None if the user has none yet)."""
+    row = db.get(UserProfileAggregate, user_id)
+    if row is None:
+        return None
+    now = datetime.now()
+    profile = _materialize(db, user_id, ProfileAccumulator.from_row(row), now)
+    db.commit()
+    db.refresh(profile)
+    return profile
+
+
+def compact_profiles(db: Session, now: Optional[datetime] = None, batch_size: int = COMPACTION_BATCH) -> int:
+    """
+    Apply time decay to every aggregate not compacted in COMPACTION_INTERVAL:
+    rescale to now, drop faded values and re-derive the profile.
+    """
+    now = now or datetime.now()
+    compacted = 0
+    while True:
+        rows = db.query(UserProfileAggregate).filter(
+            UserProfileAggregate.landmark_at < now - COMPACTION_INTERVAL
+        ).limit(batch_size).all()
+        if not rows:
+            break
+        for row in rows:
+            accumulator = ProfileAccumulator.from_row(row)
+            accumulator.decay_to(now)
+            accumulator.to_row(row)
+            _materialize(db, row.user_id, accumulator, now)
         db.commit()
-        return profile
-    
-    # ============================================
-    # EXTRACT FAVORITE COLORS
-    # ============================================
-    colors = []
-    for interaction in interactions:
-        if interaction.action_type in ['favorite_product', 'wardrobe_upload', 'canvas_add']:
-            metadata = interaction.metadata or {}
-            if 'color' in metadata:
-                # Weight by interaction importance
-                colors.extend([metadata['color']] * int(interaction.weight))
-            if 'colors' in metadata:  # Multiple colors
-                colors.extend(metadata['colors'] * int(interaction.weight))
-    
-    if colors:
-        color_counts = Counter(colors)
-        profile.favorite_colors = [color for color, _ in color_counts.most_common(10)]
-    
-    
-    # ============================================
-    # EXTRACT FAVORITE BRANDS
-    # ============================================
-    brands = []
-    for interaction in interactions:
-        if interaction.action_type in ['favorite_product', 'click_to_retailer', 'purchase_complete']:
-            metadata = interaction.metadata or {}
-            if 'brand' in metadata:
-                brands.extend([metadata['brand']] * int(interaction.weight))
-    
-    if brands:
-        brand_counts = Counter(brands)
-        profile.favorite_brands = [brand for brand, _ in brand_counts.most_common(10)]
-    
-    
-    # ============================================
-    # EXTRACT FAVORITE CATEGORIES
-    # ============================================
-    categories = []
-    for interaction in interactions:
-        if interaction.action_type in ['favorite_product', 'wardrobe_upload', 'canvas_add']:
-            metadata = interaction.metadata or {}
-            if 'category' in metadata:
-                categories.extend([metadata['category']] * int(interaction.weight))
-    
-    if categories:
-        category_counts = Counter(categories)
-        profile.favorite_categories = [cat for cat, _ in category_counts.most_common(10)]
-    
-    
-    # ============================================
-    # EXTRACT STYLE KEYWORDS
-    # ============================================
-    keywords = []
-    for interaction in interactions:
-        metadata = interaction.metadata or {}
-        
-        # From searches
-        if interaction.action_type == 'search' and 'query' in metadata:
-            # Extract style words from search queries
-            query_words = metadata['query'].lower().split()
-            style_words = [w for w in query_words if w in STYLE_KEYWORDS]
-            keywords.extend(style_words)
-        
-        # From tagged items
-        if 'tags' in metadata:
-            keywords.extend(metadata['tags'])
-        
-        # From followed creators
-        if interaction.action_type == 'follow_creator' and 'creator_style' in metadata:
-            keywords.extend(metadata['creator_style'])
-    
-    if keywords:
-        keyword_counts = Counter(keywords)
-        profile.style_keywords = [kw for kw, _ in keyword_counts.most_common(15)]
-    
-    
-    # ============================================
-    # EXTRACT SIZE PREFERENCES
-    # ============================================
-    sizes = {}
-    for interaction in interactions:
-        metadata = interaction.metadata or {}
-        if 'size' in metadata and 'category' in metadata:
-            category = metadata['category']
-            size = metadata['size']
-            if category not in sizes:
-                sizes[category] = []
-            sizes[category].append(size)
-    
-    # Most common size per category
-    size_prefs = {}
-    for category, size_list in sizes.items():
-        size_counts = Counter(size_list)
-        size_prefs[category] = size_counts.most_common(1)[0][0]
-    
-    profile.size_preferences = size_prefs
-    
-    
-    # ============================================
-    # CALCULATE BUDGET RANGE
-    # ============================================
-    prices = []
-    for interaction in interactions:
-        if interaction.action_type in ['favorite_product', 'click_to_retailer']:
-            metadata = interaction.metadata or {}
-            if 'price' in metadata:
-                try:
-                    price = float(metadata['price'])
-                    prices.append(price)
-                except:
-                    pass
-    
-    if prices:
-        profile.avg_price_point = sum(prices) / len(prices)
-        profile.budget_min = min(prices)
-        profile.budget_max = max(prices)
-    
-    
-    # ============================================
-    # CALCULATE ENGAGEMENT SCORE
-    # ============================================
-    total_weight = sum(i.weight for i in interactions)
-    days_active = (datetime.now() - min(i.created_at for i in interactions)).days or 1
-    profile.engagement_score = total_weight / days_active  # Average daily engagement
-    
-    
-    # ============================================
-    # EXTRACT FOLLOWED CREATOR STYLES
-    # ============================================
-    creator_styles = []
-    for interaction in interactions:
-        if interaction.action_type == 'follow_creator':
-            metadata = interaction.metadata or {}
-            if 'creator_style' in metadata:
-                creator_styles.extend(metadata['creator_style'])
-    
-    if creator_styles:
-        style_counts = Counter(creator_styles)
-        profile.followed_creator_styles = [style for style, _ in style_counts.most_common(10)]
-    
-    
-    # ============================================
-    # IDENTIFY AVOIDED ITEMS
-    # ============================================
-    # What categories/colors appear in searches but NEVER get favorited?
-    searched_items = set()
-    favorited_items = set()
-    
-    for interaction in interactions:
-        metadata = interaction.metadata or {}
-        
-        if interaction.action_type == 'search' and 'category' in metadata:
-            searched_items.add(metadata['category'])
-        
-        if interaction.action_type in ['favorite_product', 'canvas_add'] and 'category' in metadata:
-            favorited_items.add(metadata['category'])
+        compacted += len(rows)
+    return compacted
+
+
+_compactor_started = False
+_compactor_lock = threading.Lock()
+
+
+def _compactor_loop(session_factory, interval: int):
+    while True:
+        db = session_factory()
+        try:
+            compacted = compact_profiles(db)
+            if compacted:
+                print(f"Compacted {compacted} user profiles")
+        except Exception as e:
+            db.rollback()
+            print(f"Profile compaction failed: {e}")
+        finally:
+            db.close()
+        time.sleep(interval)
+
+
+def start_profile_compactor(session_factory=None, interval: int = COMPACTOR_POLL):
+    """Start the background compactor once per process."""
+    global _compactor_started
+    with _compactor_lock:
+        if _compactor_started:
+            return
+        if session_factory is None:
+            from database import SessionLocal as session_factory
+        threading.Thread(target=_compactor_loop, args=(session_factory, interval), daemon=True).start()
+        _compactor_started = True
+
+
+# ============================================
+# FULL REBUILD (repair tool)
+# ============================================
+
+def rebuild_user_profile(db: Session, user_id: int):
+    """
+    Re-read the last 90 days of interactions and rebuild the user's aggregates
+    and profile from scratch. Profiles are kept current incrementally
+    (apply_profile_interaction); use this to repair drift or after backfills.
+    """
+    now = datetime.now()
     
-    avoided = searched_items - favorited_items
-    profile.avoided_categories = list(avoided)
+    # Analyze interactions from last 90 days (recent behavior matters most)
+    interactions = _window_interactions(db, user_id, now)
     
+    # Refresh the numeric feature vector from the same rows (re-applies recency decay)
+    refresh_user_features(db, user_id, interactions)
     
-    # ============================================
-    # DETERMINE SHOPPING FREQUENCY
-    # ============================================
-    favorite_actions = [i for i in interactions if i.action_type in ['favorite_product', 'click_to_retailer']]
-    if len(favorite_actions) > 30:
-        profile.shopping_frequency = "high"
-    elif len(favorite_actions) > 10:
-        profile.shopping_frequency = "medium"
-    else:
-        profile.shopping_frequency = "low"
+    accumulator, _ = compute_profile_fields(interactions, now)
     
+    row = db.get(UserProfileAggregate, user_id)
+    if row is None:
+        row = UserProfileAggregate(user_id=user_id)
+        db.add(row)
+    accumulator.to_row(row)
     
-    # Update timestamp
-    profile.last_analyzed_at = datetime.now()
-    profile.updated_at = datetime.now()
+    profile = _materialize(db, user_id, accumulator, now)
+    profile.last_analyzed_at = now
     
     db.commit()
     db.refresh(profile)
@@ -257,51 +477,164 @@ STYLE_KEYWORDS = {
 
 
 # ============================================
-# BATCH PROFILE REBUILD (For Nightly Job)
+# BATCH PROFILE REBUILD (repair)
 # ============================================
 
-def rebuild_all_profiles(db: Session, batch_size: int = 100):
-    """
-    Rebuild profiles for all active users.
-    Run this as a nightly background job.
-    """
-    from database import User
-    
-    # Get users who have interacted in last 30 days
-    cutoff = datetime.now() - timedelta(days=30)
+def get_active_user_ids(db: Session, days: int = 30) -> List[int]:
+    """Users who have interacted in the last `days` days."""
+    cutoff = datetime.now() - timedelta(days=days)
     active_user_ids = db.query(UserInteraction.user_id).filter(
         UserInteraction.created_at >= cutoff
     ).distinct().all()
     
-    active_user_ids = [uid[0] for uid in active_user_ids]
+    return [uid[0] for uid in active_user_ids]
+
+
+def rebuild_all_profiles(db: Session, batch_size: int = 500, workers: Optional[int] = None, bulk: bool = True):
+    """
+    Rebuild profiles for all active users from raw interactions.
+    Not needed nightly any more (see compact_profiles); run it after backfills
+    or to repair aggregates.
+    
+    Bulk mode splits active users into ID-range chunks of batch_size. Each chunk
+    is one ordered query plus pure computation, spread over a process pool of
+    `workers` (default: one per core); this process writes every chunk back
+    with bulk upserts. bulk=False keeps the one-user-at-a-time path.
+    """
+    # Get users who have interacted in last 30 days
+    active_user_ids = sorted(get_active_user_ids(db))
+    total = len(active_user_ids)
+    started = time.perf_counter()
     
-    print(f"Rebuilding profiles for {len(active_user_ids)} active users...")
+    print(f"Rebuilding profiles for {total} active users...")
     
-    for i, user_id in enumerate(active_user_ids):
-        try:
-            rebuild_user_profile(db, user_id)
-            
-            if (i + 1) % batch_size == 0:
-                print(f"Processed {i + 1}/{len(active_user_ids)} users")
-                db.commit()  # Commit in batches
+    if not bulk:
+        for i, user_id in enumerate(active_user_ids):
+            try:
+                rebuild_user_profile(db, user_id)
                 
-        except Exception as e:
-            print(f"Error rebuilding profile for user {user_id}: {e}")
-            continue
-    
+                if (i + 1) % batch_size == 0:
+                    print(f"Processed {i + 1}/{total} users")
+                    
+            except Exception as e:
+                db.rollback()
+                print(f"Error rebuilding profile for user {user_id}: {e}")
+                continue
+        return _rebuild_report(total, started)
+    
+    now = datetime.now()
+    chunks = [active_user_ids[i:i + batch_size] for i in range(0, total, batch_size)]
+    workers = workers or os.cpu_count() or 1
+    
+    if workers > 1 and len(chunks) > 1:
+        database_url = db.get_bind().url.render_as_string(hide_password=False)
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(chunks)))
+        results = pool.map(_rebuild_chunk, repeat(database_url), chunks, repeat(now))
+    else:
+        pool = None
+        results = (_compute_chunk(db, chunk, now) for chunk in chunks)
+    
+    done = 0
+    try:
+        for chunk_results in results:
+            _write_chunk(db, chunk_results, now)
+            done += len(chunk_results)
+            elapsed = time.perf_counter() - started
+            print(f"Processed {done}/{total} users ({done / max(elapsed, 1e-9):.0f} users/sec)")
+    finally:
+        if pool:
+            pool.shutdown()
+    
+    return _rebuild_report(done, started)
+
+
+def _rebuild_report(users: int, started: float) -> Dict[str, Any]:
+    elapsed = time.perf_counter() - started
+    report = {"users": users, "seconds": round(elapsed, 2), "users_per_sec": round(users / max(elapsed, 1e-9), 1)}
+    print(f"Profile rebuild complete! {report['users']} users in {report['seconds']}s ({report['users_per_sec']} users/sec)")
+    return report
+
+
+def _compute_chunk(db: Session, user_ids: List[int], now: datetime) -> List[Tuple]:
+    """
+    One ordered query over a user ID range, aggregated column-wise in one pass;
+    (user_id, aggregates, fields, raw features) per active user.
+    """
+    wanted = set(user_ids)
+    rows = db.query(
+        UserInteraction.user_id, UserInteraction.action_type, UserInteraction.interaction_metadata,
+        UserInteraction.weight, UserInteraction.created_at
+    ).filter(
+        UserInteraction.user_id >= user_ids[0],
+        UserInteraction.user_id <= user_ids[-1],
+        UserInteraction.created_at >= now - timedelta(days=PROFILE_WINDOW_DAYS)
+    ).order_by(UserInteraction.user_id, UserInteraction.created_at).yield_per(5000)
+    
+    from profile_aggregator import aggregate_profiles
+    interactions = [InteractionRow(*r) for r in rows if r[0] in wanted]
+    return aggregate_profiles(interactions, now)
+
+
+def _rebuild_chunk(database_url: str, user_ids: List[int], now: datetime) -> List[Tuple]:
+    """Process-pool entry point: own engine, read-only."""
+    engine = make_engine(database_url)
+    db = Session(bind=engine)
+    try:
+        return _compute_chunk(db, user_ids, now)
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def _write_chunk(db: Session, chunk_results: List[Tuple], now: datetime):
+    """Bulk-upsert feature vectors, aggregates and profiles for one chunk, then commit."""
+    space = get_feature_space(db)
+    vectors, aggregates, profiles = [], [], []
+    for user_id, accumulator, fields, features in chunk_results:
+        features = intern_user_features(db, space, features)
+        vectors.append({
+            'user_id': user_id,
+            'indices': np.fromiter(features.weights.keys(), dtype=np.int32, count=len(features.weights)).tobytes(),
+            'weights': np.fromiter(features.weights.values(), dtype=np.float32, count=len(features.weights)).tobytes(),
+            'price_weight_sum': features.price_weight_sum,
+            'price_weighted_sum': features.price_weighted_sum,
+            'price_min': features.price_min,
+            'price_max': features.price_max,
+            'version': 1,
+            'updated_at': now,
+        })
+        aggregates.append({'user_id': user_id, **accumulator.row_values()})
+        profiles.append({'user_id': user_id, **fields, 'updated_at': now, 'last_analyzed_at': now})
+    
+    bulk_upsert(db, UserFeatureVector, vectors, ['user_id'], increment=['version'])
+    bulk_upsert(db, UserProfileAggregate, aggregates, ['user_id'])
+    bulk_upsert(db, UserStyleProfile, profiles, ['user_id'])
     db.commit()
-    print("Profile rebuild complete!")
 
 
 if __name__ == "__main__":
-    # For testing: rebuild a single user's profile
-    from database import SessionLocal
-    
+    parser = argparse.ArgumentParser(description="Maintain user style profiles")
+    parser.add_argument("--user", type=int, default=1, help="Rebuild one user's profile (default: test user 1)")
+    parser.add_argument("--all", action="store_true", help="Rebuild every active user's profile")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for --all (default: one per core)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Users per chunk for --all")
+    parser.add_argument("--one-by-one", action="store_true", help="--all without bulk mode")
+    parser.add_argument("--compact", action="store_true", help="Apply time decay to stale aggregates")
+    args = parser.parse_args()
+    
+    from database import SessionLocal, init_db
+    init_db()
     db = SessionLocal()
-    user_id = 1  # Test user
-    
-    profile = rebuild_user_profile(db, user_id)
-    print(f"Profile rebuilt for user {user_id}")
-    print(f"Favorite colors: {profile.favorite_colors}")
-    print(f"Favorite brands: {profile.favorite_brands}")
-    print(f"Style keywords: {profile.style_keywords}")
+    try:
+        if args.compact:
+            print(f"Compacted {compact_profiles(db)} user profiles")
+        elif args.all:
+            rebuild_all_profiles(db, batch_size=args.batch_size, workers=args.workers, bulk=not args.one_by_one)
+        else:
+            profile = rebuild_user_profile(db, args.user)
+            print(f"Profile rebuilt for user {args.user}")
+            print(f"Favorite colors: {profile.favorite_colors}")
+            print(f"Favorite brands: {profile.favorite_brands}")
+            print(f"Style keywords: {profile.style_keywords}")
+    finally:
+        db.close()
@@ -1,14 +1,23 @@
 # recommendation_endpoints.py
 # API endpoints for the recommendation system
 
-from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import func, desc
 from typing import Optional, List
 from pydantic import BaseModel
 
 from database import get_db
-from auth_service import get_current_user
+from auth_service import get_authenticated_user, AuthenticatedUser
 from recommendation_engine import get_recommendation_engine
+from recommendation_precompute import get_precomputed, PRECOMPUTE_STRATEGY
+from item_exclusions import record_exclusion_event, get_user_exclusions
+from user_features import apply_interaction
+from profile_builder import apply_profile_interaction
+from hot_items import get_hot_items_tracker
+from interaction_rollups import trending_totals
+from session_events import rerank_with_session
+from recommendation_sessions import SNAPSHOT_SIZE, create_session, get_session, decode_cursor
 
 router = APIRouter(prefix="/recommendations", tags=["Recommendations"])
 
@@ -25,8 +34,9 @@ class RecommendationResponse(BaseModel):
 @router.get("/for-me")
 def get_recommendations_for_me(
     limit: int = Query(20, ge=1, le=100),
-    strategy: str = Query("hybrid", regex="^(hybrid|content|collaborative|trending)$"),
-    authorization: str = Header(None),
+    strategy: str = Query("hybrid", regex="^(hybrid|content|collaborative|trending|als)$"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -37,33 +47,73 @@ def get_recommendations_for_me(
     - `content`: Based on your preferences and history
     - `collaborative`: Based on users with similar taste
     - `trending`: Currently popular items
+    - `als`: Learned taste model trained offline (`python mf_model.py train`)
+    
+    **Paging:**
+    The first call ranks up to 300 items once (or takes the precomputed list) and returns the first page plus
+    `next_cursor`. Pass it back as `cursor` for the next page; pages come from the
+    same snapshot, so they are cheap and never shift. Cursors expire after 30 minutes
+    (410 - start again without a cursor).
     
     **Returns:**
     - List of recommended product IDs with scores and reasons
+    - `source`: `precomputed` (nightly batch, see `computed_at`) or `live`
+    - `session`: how the live session re-ranker (session_events.py) adjusted the list
+    - `next_cursor`: token for the next page, or null at the end
     """
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    # Get recommendation engine
-    engine = get_recommendation_engine(db)
-    
-    # Get recommendations
-    recommendations = engine.get_recommendations(
-        user_id=user.id,
-        limit=limit,
-        strategy=strategy
-    )
+    if cursor:
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        session_id, offset = decoded
+        feed = get_session(session_id, user.id)
+        if not feed:
+            raise HTTPException(status_code=410, detail="Recommendation session expired")
+    else:
+        offset = 0
+        
+        # Serve the offline hybrid list when it's fresh and covers a whole snapshot
+        # (see recommendation_precompute.py); lists cut off shorter rank live.
+        computed_at = None
+        pipeline_stats = None
+        precomputed = get_precomputed(db, user.id, SNAPSHOT_SIZE) if strategy == PRECOMPUTE_STRATEGY else None
+        
+        if precomputed:
+            recommendations, computed_at = precomputed
+            source = "precomputed"
+        else:
+            # Cold or stale user - compute live
+            engine = get_recommendation_engine(db)
+            recommendations = engine.get_recommendations(
+                user_id=user.id,
+                limit=SNAPSHOT_SIZE,
+                strategy=strategy
+            )
+            source = "live"
+            pipeline_stats = engine.pipeline_stats
+        
+        # Blend in what the user is doing right now
+        recommendations, session_stats = rerank_with_session(db, user.id, recommendations)
+        
+        feed = create_session(
+            user.id, strategy, recommendations, source,
+            computed_at=computed_at, pipeline_stats=pipeline_stats, session_stats=session_stats
+        )
+    
+    recommendations, next_cursor = feed.page(offset, limit)
     
     return {
         "user_id": user.id,
-        "strategy": strategy,
+        "strategy": feed.strategy,
         "count": len(recommendations),
-        "recommendations": recommendations
+        "recommendations": recommendations,
+        "source": feed.source,
+        "computed_at": feed.computed_at.isoformat() if feed.computed_at else None,
+        "pipeline_stats": feed.pipeline_stats if offset == 0 else None,
+        "session": feed.session_stats,
+        "offset": offset,
+        "total": len(feed.items),
+        "next_cursor": next_cursor
     }
 
 
@@ -71,21 +121,13 @@ def get_recommendations_for_me(
 def get_similar_products(
     product_id: str,
     limit: int = Query(10, ge=1, le=50),
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """
     Get products similar to a specific product.
     Based on users who interacted with this product.
     """
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     # Get users who interacted with this product
     from interaction_models import UserInteraction
     
@@ -138,7 +180,7 @@ def get_similar_products(
 def get_trending_products(
     limit: int = Query(20, ge=1, le=100),
     timeframe: str = Query("week", regex="^(day|week|month|all)$"),
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -150,45 +192,20 @@ def get_trending_products(
     - `month`: Last 30 days
     - `all`: All time
     """
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     from datetime import datetime, timedelta
-    from interaction_models import UserInteraction
     
-    # Calculate timeframe
+    # Calculate timeframe (UTC, like the interaction timestamps and rollups)
     if timeframe == "day":
-        since = datetime.now() - timedelta(days=1)
+        since = datetime.utcnow() - timedelta(days=1)
     elif timeframe == "week":
-        since = datetime.now() - timedelta(days=7)
+        since = datetime.utcnow() - timedelta(days=7)
     elif timeframe == "month":
-        since = datetime.now() - timedelta(days=30)
+        since = datetime.utcnow() - timedelta(days=30)
     else:
         since = None
     
-    # Query trending items
-    query = db.query(
-        UserInteraction.item_id,
-        func.count(UserInteraction.id).label('interaction_count'),
-        func.sum(UserInteraction.weight).label('total_weight'),
-        func.count(func.distinct(UserInteraction.user_id)).label('unique_users')
-    ).filter(
-        UserInteraction.item_id.isnot(None)
-    )
-    
-    if since:
-        query = query.filter(UserInteraction.created_at >= since)
-    
-    trending = query.group_by(
-        UserInteraction.item_id
-    ).order_by(
-        desc('total_weight')
-    ).limit(limit).all()
+    # Sum hourly/daily rollups plus the raw tail the roller hasn't reached yet
+    trending = trending_totals(db, since, limit)
     
     recommendations = [
         {
@@ -212,21 +229,13 @@ def get_trending_products(
 def provide_recommendation_feedback(
     product_id: str,
     liked: bool,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """
     Provide feedback on a recommendation (like/dislike).
     This helps improve future recommendations.
     """
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     # Track this as an interaction
     from interaction_models import UserInteraction
     
@@ -243,6 +252,9 @@ def provide_recommendation_feedback(
     )
     
     db.add(interaction)
+    record_exclusion_event(db, user.id, product_id, action_type)
+    apply_interaction(db, interaction)
+    apply_profile_interaction(db, interaction)
     db.commit()
     
     return {
@@ -255,7 +267,7 @@ def provide_recommendation_feedback(
 @router.get("/from-creators")
 def get_creator_recommendations(
     limit: int = Query(20, ge=1, le=50),
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -267,14 +279,6 @@ def get_creator_recommendations(
     - ⚡ Trending from creator
     - ✨ New post (within 48h)
     """
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     engine = get_recommendation_engine(db)
     recommendations = engine._creator_based_recommendations(user.id, limit)
     
@@ -289,7 +293,7 @@ def get_creator_recommendations(
 @router.get("/similar-users-bought")
 def get_similar_user_recommendations(
     limit: int = Query(20, ge=1, le=50),
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -300,14 +304,6 @@ def get_similar_user_recommendations(
     - 🆕 Recently added by similar user
     - High-intent actions (canvas adds, purchases)
     """
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     engine = get_recommendation_engine(db)
     recommendations = engine._similar_user_purchases(user.id, limit)
     
@@ -322,63 +318,78 @@ def get_similar_user_recommendations(
 @router.get("/hot-items")
 def get_hot_items(
     limit: int = Query(10, ge=1, le=30),
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """
-    Get "hot" items - products that are:
-    - From creators you follow AND
-    - Being bought by similar users
+    Get "hot" items - products with the most activity right now
+    (last hour, falling back to the last 24h), read from the in-process
+    heavy-hitters sketch (see hot_items.py).
     
-    These are your highest-conversion recommendations!
+    Items you've already interacted with are skipped; items from creators
+    you follow are boosted.
     """
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    engine = get_recommendation_engine(db)
-    
-    # Get both types
-    creator_recs = engine._creator_based_recommendations(user.id, limit * 2)
-    similar_recs = engine._similar_user_purchases(user.id, limit * 2)
-    
-    # Find overlap - items in both lists
-    creator_items = {r['product_id']: r for r in creator_recs}
-    similar_items = {r['product_id']: r for r in similar_recs}
+    from interaction_models import UserInteraction
+    from creator_models import CreatorPost, PostProduct
+    
+    tracker = get_hot_items_tracker()
+    window = '1h'
+    candidates = tracker.top(limit * 5, window)
+    if not candidates:
+        window = '24h'
+        candidates = tracker.top(limit * 5, window)
+    
+    exclusions = get_user_exclusions(db, user.id)
+    candidates = [c for c in candidates if c['product_id'] not in exclusions]
+    
+    # Which of these were tagged by creators the user follows
+    followed = [
+        row[0] for row in db.query(UserInteraction.item_id).filter(
+            UserInteraction.user_id == user.id,
+            UserInteraction.action_type == 'follow_creator',
+            UserInteraction.item_id.isnot(None)
+        ).distinct().all()
+    ]
+    from_creators = {}
+    if followed and candidates:
+        from_creators = dict(
+            db.query(PostProduct.product_id, CreatorPost.creator_id).join(
+                CreatorPost, CreatorPost.id == PostProduct.post_id
+            ).filter(
+                CreatorPost.creator_id.in_(followed),
+                PostProduct.product_id.in_([c['product_id'] for c in candidates])
+            ).all()
+        )
     
     hot_items = []
-    for product_id in creator_items:
-        if product_id in similar_items:
-            # Combine the data
-            combined = {
-                "product_id": product_id,
-                "score": creator_items[product_id]['score'] + similar_items[product_id]['score'],
-                "reason": "🚨 HOT: From your creator + bought by similar users",
-                "creator_data": creator_items[product_id],
-                "similar_user_data": similar_items[product_id],
-                "urgency": "high"
-            }
-            
-            # Combine all signals
-            signals = []
-            if 'scarcity_signals' in creator_items[product_id]:
-                signals.extend(creator_items[product_id]['scarcity_signals'])
-            if 'social_proof_signals' in similar_items[product_id]:
-                signals.extend(similar_items[product_id]['social_proof_signals'])
-            
-            combined['all_signals'] = signals
-            hot_items.append(combined)
+    for candidate in candidates:
+        product_id = candidate['product_id']
+        creator_id = from_creators.get(product_id)
+        window_label = "in the last hour" if window == '1h' else "today"
+        
+        signals = [f"🔥 {candidate['count']} interactions {window_label}"]
+        score = candidate['weight']
+        if creator_id:
+            signals.append("⚡ From a creator you follow")
+            score *= 1.5
+        
+        hot_items.append({
+            "product_id": product_id,
+            "score": score,
+            "reason": "🚨 HOT: From your creator + trending right now" if creator_id else "🔥 HOT: Trending right now",
+            "creator_id": creator_id,
+            "interaction_count": candidate['count'],
+            "window": window,
+            "urgency": "high" if creator_id or window == '1h' else "medium",
+            "all_signals": signals
+        })
     
     # Sort by combined score
     hot_items.sort(key=lambda x: x['score'], reverse=True)
     
     return {
         "user_id": user.id,
-        "count": len(hot_items),
+        "count": len(hot_items[:limit]),
         "hot_items": hot_items[:limit],
         "message": "Your highest-conversion opportunities!" if hot_items else "Keep engaging to discover hot items!"
     }
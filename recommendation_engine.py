@@ -7,8 +7,29 @@ from collections import Counter, defaultdict
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, desc
 import json
+import time
+
+import numpy as np
 
 from interaction_models import UserInteraction, UserStyleProfile, ProductAnalytics, ACTION_WEIGHTS
+from user_features import (
+    get_user_features, get_feature_space,
+    attribute_affinity_scores, price_match_scores
+)
+from candidate_retrieval import CandidateRetriever, get_taste_index
+from mf_model import get_als_model
+from item_exclusions import get_user_exclusions
+from hot_items import get_hot_items_tracker
+from product_catalog import get_product_catalog
+from analytics_counters import pending_deltas
+
+
+# Hybrid lists are ordered by (priority, score), highest first
+PRIORITY_ORDER = {'urgent': 3, 'high': 2, 'medium': 1, 'low': 0}
+
+
+def priority_rank(rec: Dict[str, Any]) -> int:
+    return PRIORITY_ORDER.get(rec.get('priority', 'low'), 0)
 
 
 class RecommendationEngine:
@@ -29,6 +50,8 @@ class RecommendationEngine:
             'low_stock_signal': 20,  # 20+ favorites/canvas adds
             'trending_creator': 5  # 5+ interactions on creator post in 48h
         }
+        # Retrieval/scoring instrumentation from the last content-based run
+        self.pipeline_stats: Dict[str, Any] = {}
     
     def get_recommendations(
         self,
@@ -44,6 +67,7 @@ class RecommendationEngine:
         - "content": Based on user's preferences
         - "collaborative": Based on similar users
         - "trending": Popular items
+        - "als": Learned matrix factorization model (see mf_model.py)
         """
         
         if strategy == "content":
@@ -52,6 +76,8 @@ class RecommendationEngine:
             return self._collaborative_recommendations(user_id, limit)
         elif strategy == "trending":
             return self._trending_recommendations(user_id, limit)
+        elif strategy == "als":
+            return self._als_recommendations(user_id, limit)
         else:
             return self._hybrid_recommendations(user_id, limit)
     
@@ -72,14 +98,6 @@ class RecommendationEngine:
             UserStyleProfile.user_id == user_id
         ).first()
         
-        # Get user's recent interactions (last 90 days, weighted by recency)
-        recent_interactions = self.db.query(UserInteraction).filter(
-            and_(
-                UserInteraction.user_id == user_id,
-                UserInteraction.created_at >= datetime.now() - timedelta(days=90)
-            )
-        ).all()
-        
         # Get user's wardrobe items (owned items)
         wardrobe_items = self.db.query(UserInteraction).filter(
             and_(
@@ -88,76 +106,116 @@ class RecommendationEngine:
             )
         ).all()
         
-        # Extract multi-layer preferences
-        preferences = self._extract_preferences(recent_interactions)
+        # Extract multi-layer preferences (materialized feature vector, no Counters)
+        features = get_user_features(self.db, user_id)
         wardrobe_analysis = self._analyze_wardrobe_gaps(wardrobe_items)
         
-        # Get already interacted items
-        seen_items = {i.item_id for i in recent_interactions if i.item_id}
+        # Already interacted items (per-user bitsets, filtered in memory)
+        exclusions = get_user_exclusions(self.db, user_id)
+        
+        # STAGE 1: Budgeted candidate retrieval (taste, co-occurrence, creators, trending)
+        pool = CandidateRetriever(self.db).retrieve(user_id, features, exclude=exclusions)
+        
+        # STAGE 2: Vectorized scoring over the merged, de-duplicated pool
+        scoring_started = time.perf_counter()
+        candidate_ids = pool.product_ids
+        analytics = self._load_candidate_analytics(candidate_ids)
+        
+        # Multi-layer scoring, one array per layer
+        scores = {}
+        
+        # Layer 1: Visual similarity (if we have wardrobe data)
+        # Note: In production, you'd calculate CLIP embedding similarity
+        scores['visual'] = np.zeros(len(candidate_ids), dtype=np.float32)  # Placeholder - implement with actual CLIP embeddings
+        
+        # Layer 2: Behavioral signals (weighted by action type)
+        scores['behavioral'] = self._calculate_behavioral_scores(analytics)
+        
+        # Layer 3: Attribute matching (explicit features)
+        scores['attributes'] = self._calculate_attribute_scores(
+            candidate_ids, analytics['current_price'], features, profile
+        )
+        
+        # Layer 4: Wardrobe completion (fills gaps)
+        scores['wardrobe_gap'] = self._calculate_gap_filling_scores(
+            candidate_ids, wardrobe_analysis
+        )
+        
+        # Layer 5: Outfit completion potential
+        scores['outfit_potential'] = self._calculate_outfit_potentials(
+            analytics, wardrobe_items
+        )
+        
+        # Combined score with strategic weights
+        total_scores = (
+            scores['visual'] * 0.25 +           # 25% - Visual match to style
+            scores['behavioral'] * 0.35 +        # 35% - Past behavior (STRONGEST)
+            scores['attributes'] * 0.15 +        # 15% - Explicit preferences
+            scores['wardrobe_gap'] * 0.15 +      # 15% - Fills missing categories
+            scores['outfit_potential'] * 0.10    # 10% - Works with wardrobe
+        )
+        
+        # Top-k by score; only the winners get turned into dicts
+        ranked = [i for i in np.argsort(-total_scores, kind='stable') if total_scores[i] > 0][:limit]
         
-        # Score potential recommendations
         recommendations = []
+        for i in ranked:
+            breakdown = {layer: float(values[i]) for layer, values in scores.items()}
+            recommendations.append({
+                "product_id": candidate_ids[i],
+                "score": float(total_scores[i]),
+                "score_breakdown": breakdown,
+                "reason": self._generate_reason(breakdown),
+                "match_factors": self._get_match_factors(
+                    int(analytics['favorite_count'][i]), int(analytics['canvas_add_count'][i])
+                ),
+                "candidate_sources": pool.sources.get(candidate_ids[i], [])
+            })
         
-        # Get candidate products
-        matching_products = self.db.query(ProductAnalytics).filter(
-            ProductAnalytics.product_id.notin_(seen_items) if seen_items else True
-        ).order_by(
-            desc(ProductAnalytics.favorite_count)
-        ).limit(limit * 4).all()  # Get more for multi-layer filtering
+        self.pipeline_stats = {
+            'retrieval': pool.stats,
+            'scoring': {
+                'candidates': len(candidate_ids),
+                'scored_positive': int((total_scores > 0).sum()),
+                'returned': len(recommendations),
+                'time_ms': round((time.perf_counter() - scoring_started) * 1000.0, 2),
+            }
+        }
         
-        for product in matching_products:
-            # Skip if in recently purchased category (avoid duplicate coats, etc.)
-            # In production, you'd check product.category against recently_purchased_categories
-            
-            # Multi-layer scoring
-            scores = {}
-            
-            # Layer 1: Visual similarity (if we have wardrobe data)
-            # Note: In production, you'd calculate CLIP embedding similarity
-            # scores['visual'] = self._calculate_visual_similarity(product, wardrobe_items)
-            scores['visual'] = 0  # Placeholder - implement with actual CLIP embeddings
-            
-            # Layer 2: Behavioral signals (weighted by action type)
-            scores['behavioral'] = self._calculate_behavioral_score(
-                product, recent_interactions, preferences
-            )
-            
-            # Layer 3: Attribute matching (explicit features)
-            scores['attributes'] = self._calculate_attribute_score(
-                product, preferences, profile
-            )
-            
-            # Layer 4: Wardrobe completion (fills gaps)
-            scores['wardrobe_gap'] = self._calculate_gap_filling_score(
-                product, wardrobe_analysis
-            )
-            
-            # Layer 5: Outfit completion potential
-            scores['outfit_potential'] = self._calculate_outfit_potential(
-                product, wardrobe_items
-            )
-            
-            # Combined score with strategic weights
-            total_score = (
-                scores['visual'] * 0.25 +           # 25% - Visual match to style
-                scores['behavioral'] * 0.35 +        # 35% - Past behavior (STRONGEST)
-                scores['attributes'] * 0.15 +        # 15% - Explicit preferences
-                scores['wardrobe_gap'] * 0.15 +      # 15% - Fills missing categories
-                scores['outfit_potential'] * 0.10    # 10% - Works with wardrobe
-            )
-            
-            if total_score > 0:
-                recommendations.append({
-                    "product_id": product.product_id,
-                    "score": total_score,
-                    "score_breakdown": scores,
-                    "reason": self._generate_reason(scores),
-                    "match_factors": self._get_match_factors(product, preferences)
-                })
-        
-        # Sort by score and limit
-        recommendations.sort(key=lambda x: x['score'], reverse=True)
-        return recommendations[:limit]
+        return recommendations
+    
+    def _load_candidate_analytics(self, product_ids: List[str]) -> Dict[str, np.ndarray]:
+        """One query for the whole pool; products without analytics get zeros."""
+        columns = ['view_count', 'favorite_count', 'canvas_add_count', 'click_through_count', 'current_price']
+        arrays = {c: np.zeros(len(product_ids), dtype=np.float64) for c in columns}
+        arrays['current_price'][:] = np.nan
+        
+        if not product_ids:
+            return arrays
+        
+        position = {product_id: i for i, product_id in enumerate(product_ids)}
+        rows = self.db.query(
+            ProductAnalytics.product_id,
+            ProductAnalytics.view_count,
+            ProductAnalytics.favorite_count,
+            ProductAnalytics.canvas_add_count,
+            ProductAnalytics.click_through_count,
+            ProductAnalytics.current_price
+        ).filter(ProductAnalytics.product_id.in_(product_ids)).all()
+        
+        for product_id, *values in rows:
+            i = position[product_id]
+            for column, value in zip(columns, values):
+                if value is not None:
+                    arrays[column][i] = value
+        
+        # Counts tracked since the last analytics flush
+        for product_id, delta in pending_deltas(product_ids).items():
+            i = position[product_id]
+            for column, count in delta.items():
+                arrays[column][i] += count
+        
+        return arrays
     
     def _collaborative_recommendations(
         self,
@@ -206,16 +264,19 @@ class RecommendationEngine:
         # Get recommendations from similar users
         similar_users.sort(key=lambda x: x[1], reverse=True)
         recommendations = []
-        seen_items = user_items.copy()
+        exclusions = get_user_exclusions(self.db, user_id)
+        seen_items = set()
         
         for similar_user_id, similarity in similar_users[:10]:  # Top 10 similar users
-            similar_interactions = self.db.query(UserInteraction).filter(
-                and_(
-                    UserInteraction.user_id == similar_user_id,
-                    UserInteraction.item_id.isnot(None),
-                    UserInteraction.item_id.notin_(seen_items) if seen_items else True
-                )
-            ).order_by(desc(UserInteraction.weight)).limit(5).all()
+            similar_interactions = self._first_unseen(
+                self.db.query(UserInteraction).filter(
+                    and_(
+                        UserInteraction.user_id == similar_user_id,
+                        UserInteraction.item_id.isnot(None)
+                    )
+                ).order_by(desc(UserInteraction.weight)),
+                exclusions, seen_items, 5
+            )
             
             for interaction in similar_interactions:
                 if interaction.item_id not in seen_items:
@@ -240,21 +301,15 @@ class RecommendationEngine:
         Recommend trending/popular items.
         """
         # Get user's already interacted items
-        user_items = {
-            i.item_id for i in self.db.query(UserInteraction).filter(
-                and_(
-                    UserInteraction.user_id == user_id,
-                    UserInteraction.item_id.isnot(None)
-                )
-            ).all()
-        }
-        
-        # Get trending products (high engagement recently)
-        trending = self.db.query(ProductAnalytics).filter(
-            ProductAnalytics.product_id.notin_(user_items) if user_items else True
-        ).order_by(
-            desc(ProductAnalytics.favorite_count + ProductAnalytics.canvas_add_count)
-        ).limit(limit).all()
+        exclusions = get_user_exclusions(self.db, user_id)
+        
+        # Get trending products (high engagement recently), skipping seen ones as they stream in
+        trending = self._first_unseen(
+            self.db.query(ProductAnalytics).order_by(
+                desc(ProductAnalytics.favorite_count + ProductAnalytics.canvas_add_count)
+            ),
+            exclusions, set(), limit, key=lambda product: product.product_id
+        )
         
         recommendations = []
         for product in trending:
@@ -277,6 +332,35 @@ class RecommendationEngine:
         
         return recommendations
     
+    def _als_recommendations(
+        self,
+        user_id: int,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Recommend from the offline implicit-ALS model.
+        Users the model hasn't seen get trending items instead.
+        """
+        model = get_als_model()
+        if model is None or not model.has_user(user_id):
+            return self._trending_recommendations(user_id, limit)
+        
+        # Over-fetch (bounded) and drop already interacted items
+        exclusions = get_user_exclusions(self.db, user_id)
+        scored = model.recommend(user_id, min(limit + len(exclusions), limit * 5))
+        excluded = exclusions.mask([product_id for product_id, _ in scored])
+        scored = [entry for entry, drop in zip(scored, excluded) if not drop][:limit]
+        self.pipeline_stats = {'als': {'latency_ms': round(model.last_latency_ms, 3)}}
+        
+        return [
+            {
+                "product_id": product_id,
+                "score": score,
+                "reason": "Picked for you by your taste model"
+            }
+            for product_id, score in scored
+        ]
+    
     def _creator_based_recommendations(
         self,
         user_id: int,
@@ -314,20 +398,13 @@ class RecommendationEngine:
         ).all()
         
         # Get user's already seen items
-        user_items = {
-            i.item_id for i in self.db.query(UserInteraction).filter(
-                and_(
-                    UserInteraction.user_id == user_id,
-                    UserInteraction.item_id.isnot(None)
-                )
-            ).all()
-        }
+        exclusions = get_user_exclusions(self.db, user_id)
         
         # Score creator items
         item_scores = defaultdict(lambda: {'score': 0, 'interactions': [], 'creator_id': None})
         
         for interaction in creator_items:
-            if interaction.item_id in user_items:
+            if interaction.item_id in exclusions:
                 continue
             
             # Extract creator info from metadata
@@ -346,13 +423,17 @@ class RecommendationEngine:
                     item_scores[interaction.item_id]['score'] += 10
         
         # Build recommendations with scarcity signals
+        hot_items = get_hot_items_tracker()
         recommendations = []
         for item_id, data in item_scores.items():
-            # Calculate scarcity signals
-            recent_interactions_24h = len([
-                i for i in data['interactions']
-                if i.created_at >= datetime.now() - timedelta(days=1)
-            ])
+            # Calculate scarcity signals (live 24h sketch; loaded rows cover a cold tracker)
+            recent_interactions_24h = max(
+                int(hot_items.estimate(item_id, '24h')['count']),
+                len([
+                    i for i in data['interactions']
+                    if i.created_at >= datetime.now() - timedelta(days=1)
+                ])
+            )
             
             scarcity_signals = []
             urgency_score = 0
@@ -410,7 +491,6 @@ class RecommendationEngine:
             UserInteraction.user_id == user_id
         ).all()
         
-        user_items = {i.item_id for i in user_interactions if i.item_id}
         user_brands = Counter([
             i.interaction_metadata.get('brand')
             for i in user_interactions
@@ -462,23 +542,26 @@ class RecommendationEngine:
         # Get recent high-intent actions from similar users
         recent_cutoff = datetime.now() - timedelta(days=14)  # Last 2 weeks
         recommendations = []
-        seen_items = user_items.copy()
+        exclusions = get_user_exclusions(self.db, user_id)
+        seen_items = set()
         
         for similar_user_id, similarity in similar_users[:20]:  # Top 20 similar users
-            high_intent_actions = self.db.query(UserInteraction).filter(
-                and_(
-                    UserInteraction.user_id == similar_user_id,
-                    UserInteraction.action_type.in_([
-                        'canvas_add',
-                        'purchase_complete',
-                        'click_to_retailer',
-                        'favorite_product'
-                    ]),
-                    UserInteraction.created_at >= recent_cutoff,
-                    UserInteraction.item_id.isnot(None),
-                    UserInteraction.item_id.notin_(seen_items) if seen_items else True
-                )
-            ).order_by(desc(UserInteraction.created_at)).limit(3).all()
+            high_intent_actions = self._first_unseen(
+                self.db.query(UserInteraction).filter(
+                    and_(
+                        UserInteraction.user_id == similar_user_id,
+                        UserInteraction.action_type.in_([
+                            'canvas_add',
+                            'purchase_complete',
+                            'click_to_retailer',
+                            'favorite_product'
+                        ]),
+                        UserInteraction.created_at >= recent_cutoff,
+                        UserInteraction.item_id.isnot(None)
+                    )
+                ).order_by(desc(UserInteraction.created_at)),
+                exclusions, seen_items, 3
+            )
             
             for interaction in high_intent_actions:
                 if interaction.item_id not in seen_items:
@@ -528,6 +611,32 @@ class RecommendationEngine:
         recommendations.sort(key=lambda x: x['score'], reverse=True)
         return recommendations[:limit]
     
+    def _first_unseen(
+        self,
+        query,
+        exclusions,
+        taken: set,
+        n: int,
+        key=lambda interaction: interaction.item_id
+    ) -> list:
+        """
+        Stream an ordered query and keep the first n rows whose item isn't excluded
+        or already taken. Replaces `item_id NOT IN (<every seen item>)` in SQL.
+        """
+        rows = []
+        result = self.db.scalars(query.statement, execution_options={'yield_per': max(n * 4, 20)})
+        try:
+            for row in result:
+                item_id = key(row)
+                if item_id in taken or item_id in exclusions:
+                    continue
+                rows.append(row)
+                if len(rows) >= n:
+                    break
+        finally:
+            result.close()
+        return rows
+    
     def _hybrid_recommendations(
         self,
         user_id: int,
@@ -692,85 +801,14 @@ class RecommendationEngine:
                 rec['conversion_signals'].insert(0, "💥 Creator + Social proof: Trending!")
         
         # Sort by priority then score
-        priority_order = {'urgent': 3, 'high': 2, 'medium': 1, 'low': 0}
         recommendations = sorted(
             all_recs.values(),
-            key=lambda x: (priority_order.get(x.get('priority', 'low'), 0), x['score']),
+            key=lambda x: (priority_rank(x), x['score']),
             reverse=True
         )
         
         return recommendations[:limit]
     
-    def _extract_preferences(
-        self,
-        interactions: List[UserInteraction]
-    ) -> Dict[str, Any]:
-        """Extract user preferences from interactions with behavioral weighting."""
-        # Weight different actions differently
-        ACTION_PREFERENCE_WEIGHTS = {
-            'purchase_complete': 10.0,      # STRONGEST signal
-            'click_to_retailer': 8.0,       # High intent
-            'canvas_add': 7.0,              # High intent
-            'favorite_product': 5.0,        # Medium-high intent
-            'favorite_from_creator': 6.0,   # Medium-high + trust signal
-            'wardrobe_upload': 4.0,         # Own it but may not love it
-            'view_product': 2.0,            # Weak signal
-            'search': 17.0,                  # 🔍 VERY HIGH - Active, specific intent!
-        }
-        
-        weighted_brands = Counter()
-        weighted_colors = Counter()
-        weighted_categories = Counter()
-        price_points = []
-        keywords = []
-        
-        # Apply recency weighting - recent actions matter more
-        now = datetime.now()
-        
-        for interaction in interactions:
-            # Calculate recency multiplier (1.0 = recent, decays over 90 days)
-            days_ago = (now - interaction.created_at).days
-            recency_multiplier = max(0.3, 1.0 - (days_ago / 90.0))
-            
-            # Get action weight
-            action_weight = ACTION_PREFERENCE_WEIGHTS.get(interaction.action_type, 1.0)
-            
-            # Combined weight
-            total_weight = action_weight * recency_multiplier * interaction.weight
-            
-            if interaction.interaction_metadata:
-                metadata = interaction.interaction_metadata
-                
-                if 'brand' in metadata:
-                    weighted_brands[metadata['brand']] += total_weight
-                if 'color' in metadata:
-                    weighted_colors[metadata['color']] += total_weight
-                if 'category' in metadata:
-                    weighted_categories[metadata['category']] += total_weight
-                if 'price' in metadata:
-                    # Weight prices by action type - purchases matter most
-                    price_points.append((float(metadata['price']), total_weight))
-                if 'query' in metadata:
-                    keywords.extend(metadata['query'].lower().split())
-        
-        # Calculate weighted average price
-        if price_points:
-            weighted_avg_price = sum(p * w for p, w in price_points) / sum(w for _, w in price_points)
-        else:
-            weighted_avg_price = None
-        
-        return {
-            'brands': weighted_brands.most_common(10),
-            'colors': weighted_colors.most_common(10),
-            'categories': weighted_categories.most_common(10),
-            'avg_price': weighted_avg_price,
-            'price_range': {
-                'min': min(p for p, _ in price_points) if price_points else None,
-                'max': max(p for p, _ in price_points) if price_points else None,
-            },
-            'keywords': Counter(keywords).most_common(20)
-        }
-    
     def _analyze_wardrobe_gaps(
         self,
         wardrobe_items: List[UserInteraction]
@@ -781,13 +819,20 @@ class RecommendationEngine:
         """
         category_counts = Counter()
         color_counts = Counter()
+        catalog = get_product_catalog(self.db)
         
         for item in wardrobe_items:
-            if item.interaction_metadata:
-                if 'category' in item.interaction_metadata:
-                    category_counts[item.interaction_metadata['category']] += 1
-                if 'color' in item.interaction_metadata:
-                    color_counts[item.interaction_metadata['color']] += 1
+            metadata = item.interaction_metadata or {}
+            # Fall back to the catalog for items tracked without attributes
+            product = catalog.info(item.item_id) if item.item_id and not (
+                'category' in metadata and 'color' in metadata
+            ) else None
+            category = metadata.get('category') or (product and product['category'])
+            color = metadata.get('color') or (product and product['color'])
+            if category:
+                category_counts[category] += 1
+            if color:
+                color_counts[color] += 1
         
         # Define complete wardrobe targets
         IDEAL_WARDROBE = {
@@ -812,110 +857,107 @@ class RecommendationEngine:
             'color_distribution': color_counts.most_common(10)
         }
     
-    def _calculate_behavioral_score(
+    def _calculate_behavioral_scores(
         self,
-        product: ProductAnalytics,
-        interactions: List[UserInteraction],
-        preferences: Dict[str, Any]
-    ) -> float:
+        analytics: Dict[str, np.ndarray]
+    ) -> np.ndarray:
         """
         Score based on behavioral signals - what they actually do, not just view.
         Purchases >> Saves >> Clicks >> Views
         """
-        score = 0.0
-        
         # Base engagement score
-        score += product.favorite_count * 2
-        score += product.canvas_add_count * 3
-        score += product.click_through_count * 4
-        score += product.view_count * 0.5
+        scores = (
+            analytics['favorite_count'] * 2 +
+            analytics['canvas_add_count'] * 3 +
+            analytics['click_through_count'] * 4 +
+            analytics['view_count'] * 0.5
+        )
         
         # Boost if matches behavioral patterns
         # (In production, you'd check if product attributes match past interactions)
         
-        return min(score, 100.0)  # Cap at 100
+        return np.minimum(scores, 100.0)  # Cap at 100
     
-    def _calculate_attribute_score(
+    def _calculate_attribute_scores(
         self,
-        product: ProductAnalytics,
-        preferences: Dict[str, Any],
+        product_ids: List[str],
+        prices: np.ndarray,
+        features,
         profile: Optional[UserStyleProfile]
-    ) -> float:
+    ) -> np.ndarray:
         """
-        Score based on explicit attribute matching.
-        Colors, brands, categories, price range.
+        Score based on explicit attribute matching, for every candidate at once.
+        Colors, brands, categories and styles via the user's feature vector,
+        plus price range matching and a profile engagement boost.
         """
-        score = 0.0
+        if not product_ids:
+            return np.zeros(0, dtype=np.float32)
         
-        # In production, you'd have product metadata to compare
-        # For now, just use product analytics as proxy
+        space = get_feature_space(self.db)
         
-        # Price range matching
-        if preferences['avg_price'] and product.current_price:
-            price_diff_ratio = abs(product.current_price - preferences['avg_price']) / preferences['avg_price']
-            if price_diff_ratio < 0.3:  # Within 30%
-                score += 20
-            elif price_diff_ratio < 0.5:  # Within 50%
-                score += 10
+        # Attribute affinity: one gather + dot product over the candidate matrix
+        attribute_matrix = get_taste_index(self.db).attributes_for(product_ids)
+        scores = attribute_affinity_scores(features.dense(space), attribute_matrix)
+        
+        # Price range matching (catalog price where analytics has none)
+        prices = np.where(np.isnan(prices), get_product_catalog(self.db).prices_for(product_ids), prices)
+        scores = scores + price_match_scores(prices, features.avg_price)
         
         # Profile matching
         if profile:
             # Engagement boost
-            score += profile.engagement_score * 0.5
+            scores = scores + (profile.engagement_score or 0.0) * 0.5
         
-        return min(score, 100.0)
+        return np.minimum(scores, 100.0)
     
-    def _calculate_gap_filling_score(
+    def _calculate_gap_filling_scores(
         self,
-        product: ProductAnalytics,
+        product_ids: List[str],
         wardrobe_analysis: Dict[str, Any]
-    ) -> float:
+    ) -> np.ndarray:
         """
-        Score based on whether this product fills a gap in their wardrobe.
+        Score based on whether each product fills a gap in their wardrobe.
         Key insight: People need variety, not just more of what they have.
         """
-        score = 0.0
-        
-        # In production, check if product.category is in wardrobe_analysis['gaps']
-        # Boost score significantly for gap-filling items
+        catalog = get_product_catalog(self.db)
+        categories = catalog.categoricals['category']
+        
+        # Boost per interned category, then one gather over the candidates' category codes
+        boost = np.zeros(len(categories) + 1, dtype=np.float32)  # Last slot absorbs -1 (unknown)
+        for category, missing in wardrobe_analysis['gaps'].items():
+            code = categories.codes.get(category)
+            if code is None:
+                continue
+            # If they have no blazers and this is a blazer, huge boost
+            if category in wardrobe_analysis['missing_completely']:
+                boost[code] = 50.0
+            else:
+                boost[code] = 30.0 * missing
         
-        # Example: If they have no blazers and this is a blazer, huge boost
-        # if product.category in wardrobe_analysis['missing_completely']:
-        #     score += 50
-        # elif product.category in wardrobe_analysis['gaps']:
-        #     score += 30 * wardrobe_analysis['gaps'][product.category]
+        scores = boost[catalog.codes_for('category', product_ids)]
         
-        return min(score, 100.0)
+        return np.minimum(scores, 100.0)
     
-    def _calculate_outfit_potential(
+    def _calculate_outfit_potentials(
         self,
-        product: ProductAnalytics,
+        analytics: Dict[str, np.ndarray],
         wardrobe_items: List[UserInteraction]
-    ) -> float:
+    ) -> np.ndarray:
         """
-        Calculate "outfit completion score" - how many new outfits can this create?
+        Calculate "outfit completion score" - how many new outfits can each product create?
         
         Key insight: Items that work with EXISTING wardrobe = higher conversion.
         A black blazer that pairs with 10 items > neon jacket that pairs with 1.
         """
-        score = 0.0
-        
         # In production, you'd have:
         # - Fashion rules (blazers work with jeans, dresses, etc.)
         # - Visual similarity (CLIP embeddings)
         # - Color compatibility (complementary colors)
         
-        # potential_pairings = 0
-        # for wardrobe_item in wardrobe_items:
-        #     if can_be_styled_together(product, wardrobe_item):
-        #         potential_pairings += 1
-        # 
-        # score = potential_pairings * 5  # 5 points per pairing
-        
         # Placeholder: Use engagement as proxy
-        score = product.favorite_count * 2
+        scores = analytics['favorite_count'] * 2
         
-        return min(score, 100.0)
+        return np.minimum(scores, 100.0)
     
     def _generate_reason(self, scores: Dict[str, float]) -> str:
         """Generate human-readable reason based on score breakdown."""
@@ -960,16 +1002,16 @@ class RecommendationEngine:
     
     def _get_match_factors(
         self,
-        product: ProductAnalytics,
-        preferences: Dict[str, Any]
+        favorite_count: int,
+        canvas_add_count: int
     ) -> List[str]:
         """Get reasons why this product matches."""
         factors = []
         
-        if product.favorite_count > 10:
+        if favorite_count > 10:
             factors.append("Popular choice")
         
-        if product.canvas_add_count > 5:
+        if canvas_add_count > 5:
             factors.append("Frequently added to canvas")
         
         # Would add more specific matching based on product metadata
@@ -0,0 +1,145 @@
+# recommendation_models.py
+# Compact, precomputed stores that back the recommendation engine
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, LargeBinary, Text, JSON, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from database import Base
+
+
+class FeatureVocabulary(Base):
+    """
+    Interned attribute values (brand, color, category, style).
+    The row id is the column index of the value in every feature vector.
+    """
+    __tablename__ = "feature_vocabulary"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # 'brand', 'color', 'category', 'style'
+    value = Column(String, nullable=False)  # Normalized (stripped) attribute value
+
+    __table_args__ = (
+        UniqueConstraint('kind', 'value', name='uq_feature_kind_value'),
+    )
+
+
+class UserFeatureVector(Base):
+    """
+    Sparse per-user attribute weights, stored as packed numpy arrays.
+    Built from interactions so scoring never has to re-read raw rows.
+    """
+    __tablename__ = "user_feature_vectors"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), unique=True, nullable=False, index=True)
+
+    # Sparse vector: int32 vocabulary ids + float32 raw weights
+    indices = Column(LargeBinary, nullable=False, default=b'')
+    weights = Column(LargeBinary, nullable=False, default=b'')
+
+    # Running price stats (weighted, so they can be updated incrementally)
+    price_weight_sum = Column(Float, default=0.0)
+    price_weighted_sum = Column(Float, default=0.0)
+    price_min = Column(Float, nullable=True)
+    price_max = Column(Float, nullable=True)
+
+    version = Column(Integer, default=0)  # Bumped on every write, used as a cache key
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class PrecomputedRecommendation(Base):
+    """
+    Offline hybrid top-N per user, written by recommendation_precompute.py.
+    /recommendations/for-me serves from here while the row is fresh.
+    """
+    __tablename__ = "precomputed_recommendations"
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    strategy = Column(String, nullable=False, default="hybrid")
+    top_n = Column(Integer, nullable=False)  # How many were requested
+    item_count = Column(Integer, default=0)  # How many were found
+    payload = Column(Text, nullable=False)  # Compact JSON list of recommendation dicts
+    computed_at = Column(DateTime, nullable=False, index=True)
+
+
+class InternedItem(Base):
+    """
+    Dense integer ids for item IDs, so per-user exclusion sets can be bitsets.
+    Filled on every tracked event and backfilled per user on first load.
+    """
+    __tablename__ = "interned_items"
+
+    id = Column(Integer, primary_key=True)
+    item_id = Column(String, unique=True, nullable=False, index=True)
+
+
+class InteractionRollupHourly(Base):
+    """
+    Per-item interaction totals for one hour, written by interaction_rollups.py.
+    unique_users is a serialized HyperLogLog so buckets can be merged.
+    """
+    __tablename__ = "interaction_rollups_hourly"
+
+    id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime, nullable=False)
+    item_id = Column(String, nullable=False)
+    interaction_count = Column(Integer, default=0)
+    weight_sum = Column(Float, default=0.0)
+    unique_users = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('bucket_start', 'item_id', name='uq_rollup_hourly_bucket_item'),
+    )
+
+
+class InteractionRollupDaily(Base):
+    """Same as InteractionRollupHourly, merged per day."""
+    __tablename__ = "interaction_rollups_daily"
+
+    id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime, nullable=False)
+    item_id = Column(String, nullable=False)
+    interaction_count = Column(Integer, default=0)
+    weight_sum = Column(Float, default=0.0)
+    unique_users = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('bucket_start', 'item_id', name='uq_rollup_daily_bucket_item'),
+    )
+
+
+class RollupWatermark(Base):
+    """
+    Everything before `watermark` has been rolled into the named rollup table.
+    For 'hourly', only rows up to user_interactions.id `last_id`: rows committed
+    later with an older created_at are rolled as late rows on the next run.
+    """
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String, primary_key=True)  # 'hourly', 'daily'
+    watermark = Column(DateTime, nullable=False)
+    last_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class UserProfileAggregate(Base):
+    """
+    Running, time-decayed aggregates behind UserStyleProfile (see profile_builder.py).
+    Counters use forward decay: stored values are relative to landmark_at, so
+    folding in an event is O(1) and compaction rescales everything to now.
+    """
+    __tablename__ = "user_profile_aggregates"
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    counters = Column(JSON, nullable=False, default=dict)  # facet -> {value: decayed weight}
+
+    # Weighted Welford price stats
+    price_weight = Column(Float, default=0.0)
+    price_mean = Column(Float, default=0.0)
+    price_m2 = Column(Float, default=0.0)
+    price_min = Column(Float, nullable=True)
+    price_max = Column(Float, nullable=True)
+
+    total_weight = Column(Float, default=0.0)  # Decayed sum of interaction weights
+    first_seen_at = Column(DateTime, nullable=True)
+    landmark_at = Column(DateTime, nullable=False)  # Decay reference; moved forward by compaction
+    updated_at = Column(DateTime, nullable=True)
@@ -0,0 +1,211 @@
+# recommendation_precompute.py
+# Offline batch job: precompute hybrid top-N recommendations for all active users
+#
+# Usage:
+#   python recommendation_precompute.py --top-n 300 --workers 4
+#
+# Results land in `precomputed_recommendations` (one compact JSON row per user).
+# /recommendations/for-me serves from that table while a row is fresh and
+# falls back to live computation for cold or stale users.
+#
+# Workers only read: their connections are read-only (PRAGMA query_only on
+# SQLite, default_transaction_read_only on Postgres) and their sessions are
+# flagged info['read_only'] so lazy writers (exclusion backfill) skip. The
+# parent does the writing, which keeps SQLite to a single writer.
+
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+
+from database import make_engine
+from recommendation_models import PrecomputedRecommendation
+from recommendation_sessions import SNAPSHOT_SIZE
+
+
+PRECOMPUTE_TOP_N = SNAPSHOT_SIZE         # A stored list fills a whole /for-me session
+PRECOMPUTE_MAX_AGE = timedelta(hours=6)  # Older rows are treated as stale
+PRECOMPUTE_STRATEGY = "hybrid"
+
+# Per-process session factory for pool workers
+_worker_sessions = None
+
+
+def _read_only_engine(database_url: str):
+    if database_url.startswith("sqlite"):
+        engine = make_engine(database_url)
+
+        @event.listens_for(engine, "connect")
+        def _query_only(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA query_only = ON")
+            cursor.close()
+
+        return engine
+    return make_engine(database_url, connect_args={"options": "-c default_transaction_read_only=on"})
+
+
+def _init_worker(database_url: str):
+    """Each worker process opens its own read-only engine (connections can't cross forks)."""
+    global _worker_sessions
+    engine = _read_only_engine(database_url)
+    _worker_sessions = sessionmaker(autocommit=False, autoflush=False, bind=engine, info={"read_only": True})
+
+
+def _compute_chunk(args: Tuple[List[int], int]) -> List[Tuple[int, List[Dict[str, Any]]]]:
+    """Worker: run the live hybrid engine for a chunk of users."""
+    from recommendation_engine import RecommendationEngine
+
+    user_ids, top_n = args
+    db = _worker_sessions()
+    results = []
+    try:
+        engine = RecommendationEngine(db)
+        for user_id in user_ids:
+            try:
+                recs = engine.get_recommendations(user_id, limit=top_n, strategy=PRECOMPUTE_STRATEGY)
+                results.append((user_id, recs))
+            except Exception as e:
+                db.rollback()
+                print(f"Error precomputing recommendations for user {user_id}: {e}")
+    finally:
+        db.close()
+    return results
+
+
+def _serialize(recommendations: List[Dict[str, Any]]) -> str:
+    return json.dumps(recommendations, separators=(',', ':'), default=str)
+
+
+def save_precomputed(
+    db: Session,
+    results: List[Tuple[int, List[Dict[str, Any]]]],
+    top_n: int = PRECOMPUTE_TOP_N,
+    computed_at: Optional[datetime] = None
+):
+    """Replace the stored rows for these users in one batch (portable upsert)."""
+    if not results:
+        return
+
+    computed_at = computed_at or datetime.now()
+    user_ids = [user_id for user_id, _ in results]
+    db.query(PrecomputedRecommendation).filter(
+        PrecomputedRecommendation.user_id.in_(user_ids)
+    ).delete(synchronize_session=False)
+
+    db.bulk_insert_mappings(PrecomputedRecommendation, [
+        {
+            "user_id": user_id,
+            "strategy": PRECOMPUTE_STRATEGY,
+            "top_n": top_n,
+            "item_count": len(recs),
+            "payload": _serialize(recs),
+            "computed_at": computed_at,
+        }
+        for user_id, recs in results
+    ])
+    db.commit()
+
+
+def get_precomputed(
+    db: Session,
+    user_id: int,
+    limit: Optional[int] = None,
+    max_age: timedelta = PRECOMPUTE_MAX_AGE
+) -> Optional[Tuple[List[Dict[str, Any]], datetime]]:
+    """
+    Serve a user's precomputed list if it's fresh and long enough for `limit`
+    (None = take the whole stored list, however long it is).
+    Returns (recommendations, computed_at) or None for cold/stale users.
+    """
+    row = db.query(PrecomputedRecommendation).filter(
+        PrecomputedRecommendation.user_id == user_id
+    ).first()
+
+    if not row:
+        return None
+    if row.computed_at < datetime.now() - max_age:
+        return None
+    # A full list cut off below the requested limit can't satisfy the request
+    if limit is not None and limit > row.top_n and row.item_count >= row.top_n:
+        return None
+
+    return json.loads(row.payload)[:limit], row.computed_at
+
+
+def precompute_all(
+    database_url: Optional[str] = None,
+    top_n: int = PRECOMPUTE_TOP_N,
+    workers: Optional[int] = None,
+    chunk_size: int = 50,
+    active_days: int = 30
+) -> Dict[str, Any]:
+    """
+    Compute hybrid top-N for every active user across a process pool.
+    Workers compute on read-only connections, the parent writes (keeps SQLite
+    to a single writer).
+    """
+    from database import DATABASE_URL
+    from profile_builder import get_active_user_ids
+    from item_exclusions import backfill_interned_items
+
+    database_url = database_url or DATABASE_URL
+    workers = workers or os.cpu_count() or 1
+
+    engine = make_engine(database_url)
+    db = sessionmaker(bind=engine)()
+
+    started = time.perf_counter()
+    user_ids = get_active_user_ids(db, days=active_days)
+    # Workers can't intern the ids their exclusion sets need, so do it up front
+    backfill_interned_items(db)
+    chunks = [
+        (user_ids[i:i + chunk_size], top_n)
+        for i in range(0, len(user_ids), chunk_size)
+    ]
+
+    print(f"Precomputing top-{top_n} for {len(user_ids)} active users "
+          f"({len(chunks)} chunks, {workers} workers)...")
+
+    computed_at = datetime.now()
+    done = 0
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(database_url,)
+    ) as pool:
+        for results in pool.map(_compute_chunk, chunks):
+            save_precomputed(db, results, top_n, computed_at)
+            done += len(results)
+            print(f"Processed {done}/{len(user_ids)} users")
+
+    db.close()
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed > 0 else 0.0
+    print(f"Precompute complete: {done} users in {elapsed:.1f}s ({rate:.1f} users/sec)")
+
+    return {"users": done, "seconds": elapsed, "users_per_sec": rate}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute hybrid recommendations for active users")
+    parser.add_argument("--database-url", default=None, help="Defaults to database.DATABASE_URL")
+    parser.add_argument("--top-n", type=int, default=PRECOMPUTE_TOP_N)
+    parser.add_argument("--workers", type=int, default=None, help="Defaults to CPU count")
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--active-days", type=int, default=30)
+    args = parser.parse_args()
+
+    precompute_all(
+        database_url=args.database_url,
+        top_n=args.top_n,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        active_days=args.active_days
+    )
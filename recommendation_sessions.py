@@ -0,0 +1,122 @@
+"""
+Recommendation Sessions - Stable, cursor-paged snapshots of a user's ranked feed
+"""
+import base64
+import json
+import threading
+import uuid
+from typing import Dict, List, Any, Optional, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+SNAPSHOT_SIZE = 300               # Items ranked once per session
+SESSION_TTL = timedelta(minutes=30)
+MAX_SESSIONS_PER_USER = 3
+
+
+@dataclass
+class RecommendationSession:
+    session_id: str
+    user_id: int
+    strategy: str
+    items: List[Dict[str, Any]]
+    source: str
+    computed_at: Optional[datetime] = None
+    pipeline_stats: Optional[Dict[str, Any]] = None
+    session_stats: Optional[Dict[str, Any]] = None
+    created_at: datetime = field(default_factory=datetime.now)
+
+    @property
+    def expired(self) -> bool:
+        return datetime.now() - self.created_at > SESSION_TTL
+
+    def page(self, offset: int, limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Slice of the snapshot plus the cursor for the next slice (None at the end)."""
+        items = self.items[offset:offset + limit]
+        next_offset = offset + len(items)
+        next_cursor = encode_cursor(self.session_id, next_offset) if next_offset < len(self.items) else None
+        return items, next_cursor
+
+
+# In-memory session storage (replace with Redis for production).
+# Handlers run on FastAPI's threadpool, so every access holds _sessions_lock.
+_sessions: Dict[str, RecommendationSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def create_session(
+    user_id: int,
+    strategy: str,
+    items: List[Dict[str, Any]],
+    source: str,
+    computed_at: Optional[datetime] = None,
+    pipeline_stats: Optional[Dict[str, Any]] = None,
+    session_stats: Optional[Dict[str, Any]] = None
+) -> RecommendationSession:
+    """Snapshot a ranked list for paging"""
+    session = RecommendationSession(
+        session_id=str(uuid.uuid4()),
+        user_id=user_id,
+        strategy=strategy,
+        items=items[:SNAPSHOT_SIZE],
+        source=source,
+        computed_at=computed_at,
+        pipeline_stats=pipeline_stats,
+        session_stats=session_stats
+    )
+    with _sessions_lock:
+        _cleanup_expired()
+
+        # Bound memory per user: a new feed replaces the oldest ones
+        mine = sorted(
+            (s for s in _sessions.values() if s.user_id == user_id),
+            key=lambda s: s.created_at
+        )
+        for old in mine[:max(0, len(mine) - MAX_SESSIONS_PER_USER + 1)]:
+            _sessions.pop(old.session_id, None)
+
+        _sessions[session.session_id] = session
+    return session
+
+
+def get_session(session_id: str, user_id: int) -> Optional[RecommendationSession]:
+    """Get a live session by ID, verify ownership"""
+    with _sessions_lock:
+        session = _sessions.get(session_id)
+        if session and session.expired:
+            _sessions.pop(session_id, None)
+            return None
+    if session and session.user_id == user_id:
+        return session
+    return None
+
+
+def cleanup_old_sessions():
+    """Remove sessions past their TTL"""
+    with _sessions_lock:
+        _cleanup_expired()
+
+
+def _cleanup_expired():
+    old_keys = [k for k, v in _sessions.items() if v.expired]
+    for key in old_keys:
+        del _sessions[key]
+
+
+def encode_cursor(session_id: str, offset: int) -> str:
+    """Opaque page token"""
+    raw = json.dumps({"s": session_id, "o": offset}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    """(session_id, offset), or None if the cursor is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        offset = int(data["o"])
+        if offset < 0:
+            return None
+        return str(data["s"]), offset
+    except (ValueError, KeyError, TypeError):
+        return None
@@ -0,0 +1,183 @@
+# session_events.py
+# Live per-user session buffer and a lightweight session re-ranker
+#
+# Every tracked event (and canvas add) is appended to the user's in-memory ring
+# buffer. /recommendations/for-me blends those events into whatever list it
+# serves (precomputed or live): candidates sharing attributes with what the user
+# is looking at right now move up within their priority tier, items they just
+# acted on or disliked drop out.
+# Buffers hold the last SESSION_BUFFER_SIZE events, sessions idle for
+# SESSION_IDLE_TTL are evicted, and at most MAX_SESSIONS are kept.
+
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+import math
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from user_features import (
+    UserFeatures, ACTION_PREFERENCE_WEIGHTS, ATTRIBUTE_POINTS,
+    extract_attributes, get_feature_space, attribute_affinity_scores
+)
+from candidate_retrieval import get_taste_index
+from recommendation_engine import priority_rank
+
+
+SESSION_BUFFER_SIZE = 50
+SESSION_IDLE_TTL = 30 * 60      # seconds
+MAX_SESSIONS = 50000
+SESSION_HALF_LIFE = 10 * 60     # seconds; an event 10 minutes old counts half
+SESSION_BLEND = 0.5             # Max score multiplier added for a perfect session match
+
+SESSION_ACTION_WEIGHTS = {**ACTION_PREFERENCE_WEIGHTS, 'dislike_product': -5.0}
+SESSION_DROP_ACTIONS = {'dislike_product', 'purchase_complete', 'canvas_add'}
+
+
+@dataclass
+class SessionEvent:
+    ts: float
+    action_type: str
+    item_id: Optional[str]
+    attributes: Dict[str, str]  # kind -> value, from the event metadata when it had any
+
+
+class SessionStore:
+    """LRU of per-user ring buffers with idle eviction."""
+
+    def __init__(self, buffer_size: int = SESSION_BUFFER_SIZE, max_sessions: int = MAX_SESSIONS):
+        self.buffer_size = buffer_size
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[int, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        user_id: int,
+        action_type: str,
+        item_id: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        now: Optional[float] = None
+    ):
+        event = SessionEvent(now or time.time(), action_type, item_id, extract_attributes(metadata))
+        with self._lock:
+            buffer = self._sessions.get(user_id)
+            if buffer is None:
+                buffer = self._sessions[user_id] = deque(maxlen=self.buffer_size)
+            else:
+                self._sessions.move_to_end(user_id)
+            buffer.append(event)
+            self._evict(event.ts)
+
+    def events(self, user_id: int, now: Optional[float] = None) -> List[SessionEvent]:
+        """The user's live session, oldest first (empty if idle or unknown)."""
+        now = now or time.time()
+        with self._lock:
+            buffer = self._sessions.get(user_id)
+            if not buffer:
+                return []
+            if now - buffer[-1].ts > SESSION_IDLE_TTL:
+                del self._sessions[user_id]
+                return []
+            return list(buffer)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self, now: float):
+        """Drop least-recently-active sessions that are idle or over capacity."""
+        while self._sessions:
+            user_id, buffer = next(iter(self._sessions.items()))
+            if len(self._sessions) > self.max_sessions or now - buffer[-1].ts > SESSION_IDLE_TTL:
+                del self._sessions[user_id]
+            else:
+                break
+
+
+_store = SessionStore()
+
+
+def record_session_event(
+    user_id: int,
+    action_type: str,
+    item_id: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None
+):
+    """Append to the user's live session buffer; call from every tracking path."""
+    _store.record(user_id, action_type, item_id, metadata)
+
+
+def get_session_events(user_id: int) -> List[SessionEvent]:
+    return _store.events(user_id)
+
+
+# ============================================
+# RE-RANKER
+# ============================================
+
+def session_features(db: Session, user_id: int, events: List[SessionEvent], now: float) -> UserFeatures:
+    """Recency-decayed attribute weights from the session buffer."""
+    space = get_feature_space(db)
+    index = get_taste_index(db)
+    features = UserFeatures(user_id=user_id)
+
+    # Events without metadata (canvas adds, bare views) take the product's attributes from the taste index
+    bare = [e.item_id for e in events if not e.attributes and e.item_id]
+    indexed = dict(zip(bare, index.attributes_for(bare))) if bare else {}
+
+    for event in events:
+        weight = SESSION_ACTION_WEIGHTS.get(event.action_type, 1.0)
+        weight *= math.pow(0.5, max(now - event.ts, 0.0) / SESSION_HALF_LIFE)
+        if event.attributes:
+            feature_ids = [space.lookup(kind, value) for kind, value in event.attributes.items()]
+        else:
+            feature_ids = indexed.get(event.item_id, [])
+        for feature_id in feature_ids:
+            if feature_id >= 0:
+                features.add(int(feature_id), weight)
+    return features
+
+
+def rerank_with_session(
+    db: Session,
+    user_id: int,
+    recommendations: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Re-score a served list against the live session. Returns (recommendations, stats);
+    the list is returned untouched when there is no live session.
+    """
+    started = time.perf_counter()
+    now = time.time()
+    events = get_session_events(user_id)
+    if not events or not recommendations:
+        return recommendations, {"events": len(events), "applied": False}
+
+    dropped = {e.item_id for e in events if e.item_id and e.action_type in SESSION_DROP_ACTIONS}
+    kept = [r for r in recommendations if r.get('product_id') not in dropped]
+
+    features = session_features(db, user_id, events, now)
+    if features.weights and kept:
+        session_vector = features.dense(get_feature_space(db))
+        matrix = get_taste_index(db).attributes_for([r['product_id'] for r in kept])
+        affinity = attribute_affinity_scores(session_vector, matrix) / float(ATTRIBUTE_POINTS.sum())
+
+        reranked = []
+        for rec, match in zip(kept, affinity):
+            rec = dict(rec)
+            rec['session_boost'] = round(float(match) * SESSION_BLEND, 4)
+            rec['score'] = float(rec.get('score', 0.0)) * (1.0 + rec['session_boost'])
+            reranked.append(rec)
+        # Boosts reorder within a priority tier; the hybrid tiers stay as served
+        reranked.sort(key=lambda r: (priority_rank(r), r['score']), reverse=True)
+        kept = reranked
+
+    stats = {
+        "events": len(events),
+        "applied": True,
+        "dropped": len(recommendations) - len(kept),
+        "latency_ms": round((time.perf_counter() - started) * 1000.0, 3),
+    }
+    return kept, stats
@@ -2,41 +2,24 @@
 Styling / Dress Me Endpoints
 Quick outfit building interface
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, Header
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 
-from database import get_db, User
-from auth_service import get_current_user
+from async_database import get_async_db
+from auth_service import get_authenticated_user, AuthenticatedUser
 from style_builder import StyleBuilder
 
 router = APIRouter(prefix="/styling", tags=["styling"])
 
 
-# Helper function for authentication
-def get_user_from_token(
-    authorization: str = Header(None),
-    db: Session = Depends(get_db)
-) -> User:
-    """Extract and validate user from Bearer token"""
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    return user
-
-
 # ==================== DRESS ME INTERFACE ====================
 
 @router.get("/dress-me")
 async def get_dress_me_interface(
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db),
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db),
     new_item_id: Optional[str] = None,
     new_item_category: Optional[str] = None
 ):
@@ -55,12 +38,13 @@ async def get_dress_me_interface(
     - new_item_id: Feature a specific item (e.g. "style this new top")
     - new_item_category: Category of featured item
     """
-    builder = StyleBuilder(db)
-    
-    data = builder.build_dress_me_data(
-        user_id=current_user.id,
-        new_item_id=new_item_id,
-        new_item_category=new_item_category
+    # StyleBuilder is sync; run_sync hands it the session's sync facade
+    data = await db.run_sync(
+        lambda session: StyleBuilder(session).build_dress_me_data(
+            user_id=current_user.id,
+            new_item_id=new_item_id,
+            new_item_category=new_item_category
+        )
     )
     
     return data
@@ -68,7 +52,7 @@ async def get_dress_me_interface(
 
 @router.get("/templates")
 async def get_canvas_templates(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     occasion: Optional[str] = None
 ):
     """
@@ -231,8 +215,8 @@ async def get_canvas_templates(
 @router.post("/canvas-from-template/{template_id}")
 async def create_canvas_from_template(
     template_id: str,
-    current_user: User = Depends(get_user_from_token),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_authenticated_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new canvas from a template
@@ -249,8 +233,8 @@ async def create_canvas_from_template(
     )
     
     db.add(canvas)
-    db.commit()
-    db.refresh(canvas)
+    await db.commit()
+    await db.refresh(canvas)
     
     return {
         "canvas_id": canvas.id,
@@ -0,0 +1,216 @@
+# synthetic_data.py
+# Populate a scratch SQLite database with realistic recommendation traffic
+#
+# Usage:
+#   python synthetic_data.py --db bench.db --users 1000 --products 5000 --creators 50 --interactions 100000
+#
+# Action types come from ACTION_WEIGHTS, mixed the way the app actually sees them
+# (lots of views and scrolling, far fewer favorites, canvas adds and purchases).
+
+from typing import Dict, Any
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, User, make_engine
+from interaction_models import UserInteraction, ProductAnalytics, ACTION_WEIGHTS
+from creator_models import CreatorPost, PostProduct
+from catalog_models import ProductCatalog
+
+
+# Relative frequency of each tracked action (every key is in ACTION_WEIGHTS)
+ACTION_MIX = {
+    'view_post': 30,
+    'view_product': 28,
+    'search': 8,
+    'favorite_product': 8,
+    'click_to_retailer': 5,
+    'canvas_add': 4,
+    'favorite_from_creator': 4,
+    'share': 3,
+    'comment': 3,
+    'follow_creator': 2,
+    'wardrobe_upload': 2,
+    'outfit_create': 2,
+    'purchase_complete': 1,
+}
+
+BRANDS = ['Zara', 'COS', 'ASOS', 'Mango', 'H&M', 'Arket', 'Uniqlo', '& Other Stories', 'Reformation', 'Levi\'s']
+COLORS = ['black', 'white', 'navy', 'beige', 'grey', 'red', 'green', 'blue', 'brown', 'cream']
+CATEGORIES = ['tops', 'bottoms', 'dresses', 'outerwear', 'shoes', 'accessories']
+STYLES = ['minimalist', 'casual', 'streetwear', 'vintage', 'classic', 'bohemian', 'edgy', 'preppy']
+QUERY_WORDS = ['black dress', 'linen shirt', 'vintage denim', 'minimalist coat', 'white sneakers', 'boho skirt']
+
+SCALES = {
+    'small': {'users': 200, 'products': 1000, 'creators': 10, 'interactions': 10000},
+    'medium': {'users': 1000, 'products': 5000, 'creators': 50, 'interactions': 100000},
+    'large': {'users': 5000, 'products': 20000, 'creators': 200, 'interactions': 500000},
+}
+
+
+def _product_catalog(rnd: random.Random, products: int) -> Dict[str, Dict[str, Any]]:
+    """Fixed attributes per product, with a long-tail price distribution."""
+    catalog = {}
+    for i in range(products):
+        catalog[f"prod_{i}"] = {
+            'brand': rnd.choice(BRANDS),
+            'color': rnd.choice(COLORS),
+            'category': rnd.choice(CATEGORIES),
+            'style': rnd.choice(STYLES),
+            'price': round(min(rnd.lognormvariate(4.0, 0.6), 600.0), 2),
+        }
+    return catalog
+
+
+def generate(
+    path: str,
+    users: int = 200,
+    products: int = 1000,
+    creators: int = 10,
+    interactions: int = 10000,
+    days: int = 90,
+    seed: int = 42,
+    batch_size: int = 5000
+) -> Dict[str, Any]:
+    """Create (or overwrite) a scratch database at `path` and fill it."""
+    for stale in (path, path + "-wal", path + "-shm"):  # WAL side files must go with the database
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    engine = make_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    rnd = random.Random(seed)
+    started = time.perf_counter()
+    now = datetime.now()
+
+    # Users (the first `creators` users post content)
+    db.bulk_insert_mappings(User, [
+        {"id": u, "email": f"user{u}@bench.local", "password_hash": "x", "created_at": now - timedelta(days=days)}
+        for u in range(1, users + 1)
+    ])
+
+    catalog = _product_catalog(rnd, products)
+    product_ids = list(catalog)
+
+    # Skewed popularity: a few products get most of the traffic
+    popularity = [1.0 / (rank + 1) ** 0.8 for rank in range(products)]
+
+    # Creator posts tagging 2-6 products each
+    creator_ids = list(range(1, creators + 1))
+    posts, post_products = [], []
+    creator_products: Dict[int, list] = {}
+    for creator_id in creator_ids:
+        for p in range(rnd.randint(3, 10)):
+            post_id = f"post_{creator_id}_{p}"
+            tagged = rnd.sample(product_ids, k=min(products, rnd.randint(2, 6)))
+            creator_products.setdefault(creator_id, []).extend(tagged)
+            posts.append({
+                "id": post_id, "creator_id": str(creator_id), "image_url": "https://example.com/post.jpg",
+                "product_count": len(tagged), "created_at": now - timedelta(hours=rnd.randint(0, days * 24)),
+            })
+            for product_id in tagged:
+                meta = catalog[product_id]
+                post_products.append({
+                    "post_id": post_id, "product_id": product_id, "product_name": f"{meta['brand']} {meta['category']}",
+                    "product_brand": meta['brand'], "product_image": "https://example.com/product.jpg",
+                    "product_price": str(meta['price']), "affiliate_link": "https://example.com",
+                })
+    db.bulk_insert_mappings(CreatorPost, posts)
+    db.bulk_insert_mappings(PostProduct, post_products)
+
+    # Interactions
+    actions = list(ACTION_MIX)
+    action_freq = [ACTION_MIX[a] for a in actions]
+    counters: Dict[str, Dict[str, int]] = {}
+    rows = []
+    for _ in range(interactions):
+        user_id = rnd.randint(1, users)
+        action_type = rnd.choices(actions, weights=action_freq)[0]
+        created_at = now - timedelta(seconds=rnd.randint(0, days * 86400))
+        item_type, metadata = 'product', {}
+
+        if action_type == 'follow_creator' and creator_ids:
+            item_type, item_id = 'creator', str(rnd.choice(creator_ids))
+        elif action_type in ('favorite_from_creator', 'view_post') and creator_ids:
+            creator_id = rnd.choice(creator_ids)
+            item_id = rnd.choice(creator_products[creator_id])
+            metadata = {**catalog[item_id], 'creator_id': str(creator_id)}
+        elif action_type == 'search':
+            item_type, item_id = None, None
+            metadata = {'query': rnd.choice(QUERY_WORDS), 'category': rnd.choice(CATEGORIES)}
+        elif action_type == 'outfit_create':
+            item_type, item_id = 'outfit', f"outfit_{rnd.randint(1, users * 3)}"
+        else:
+            item_id = rnd.choices(product_ids, weights=popularity)[0]
+            metadata = dict(catalog[item_id])
+
+        if item_type == 'product' and item_id:
+            c = counters.setdefault(item_id, {'view_count': 0, 'favorite_count': 0, 'canvas_add_count': 0, 'click_through_count': 0})
+            if action_type == 'view_product':
+                c['view_count'] += 1
+            elif action_type in ('favorite_product', 'favorite_from_creator'):
+                c['favorite_count'] += 1
+            elif action_type == 'canvas_add':
+                c['canvas_add_count'] += 1
+            elif action_type == 'click_to_retailer':
+                c['click_through_count'] += 1
+
+        rows.append({
+            "user_id": user_id, "action_type": action_type, "item_id": item_id, "item_type": item_type,
+            "interaction_metadata": metadata, "weight": ACTION_WEIGHTS[action_type],
+            "source": "synthetic", "created_at": created_at,
+        })
+        if len(rows) >= batch_size:
+            db.bulk_insert_mappings(UserInteraction, rows)
+            rows = []
+    if rows:
+        db.bulk_insert_mappings(UserInteraction, rows)
+
+    # Product analytics consistent with the generated events
+    db.bulk_insert_mappings(ProductAnalytics, [
+        {
+            "product_id": product_id, **c,
+            "wishlist_to_canvas_rate": c['canvas_add_count'] / c['favorite_count'] if c['favorite_count'] else 0.0,
+            "current_price": catalog[product_id]['price'], "created_at": now, "updated_at": now,
+        }
+        for product_id, c in counters.items()
+    ])
+
+    # The catalog knows every product, interacted with or not
+    db.bulk_insert_mappings(ProductCatalog, [
+        {"product_id": product_id, "name": f"{attrs['brand']} {attrs['category']}", **attrs,
+         "created_at": now, "updated_at": now}
+        for product_id, attrs in catalog.items()
+    ])
+    db.commit()
+    db.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Generated {users} users, {products} products, {creators} creators, "
+          f"{interactions} interactions in {elapsed:.1f}s -> {path}")
+    return {"path": path, "users": users, "products": products, "creators": creators,
+            "interactions": interactions, "seconds": elapsed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic recommendation database")
+    parser.add_argument("--db", default="bench.db")
+    parser.add_argument("--scale", choices=sorted(SCALES), default=None, help="Preset sizes (overrides counts)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--creators", type=int, default=10)
+    parser.add_argument("--interactions", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = SCALES[args.scale] if args.scale else {
+        'users': args.users, 'products': args.products,
+        'creators': args.creators, 'interactions': args.interactions,
+    }
+    generate(args.db, days=args.days, seed=args.seed, **sizes)
@@ -9,13 +9,75 @@ Finds personalized product alternatives for creator's picks based on:
 5. Past purchase patterns
 """
 from sqlalchemy.orm import Session
+from sqlalchemy import desc
 from typing import List, Dict, Any, Optional
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 import math
+import threading
+
+import numpy as np
 
 from database import User
-from creator_models import CreatorPost, PostAlternative
+from creator_models import CreatorPost, PostProduct
 from interaction_models import UserInteraction, UserStyleProfile, ProductAnalytics
+from user_features import get_user_features, get_feature_space, FEATURE_KINDS
+from candidate_retrieval import get_taste_index
+from product_catalog import get_product_catalog, parse_price
+
+
+CANDIDATE_POOL_SIZE = 500          # Most-engaged products considered as alternatives
+CANDIDATE_POOL_TTL = timedelta(minutes=10)
+ALTERNATIVES_CACHE_TTL = timedelta(minutes=10)
+ALTERNATIVES_CACHE_SIZE = 2000
+
+# Colors that count as similar to the family's head color (and vice versa)
+COLOR_FAMILIES = {
+    'black': ['charcoal', 'grey', 'gray'],
+    'white': ['cream', 'ivory', 'beige'],
+    'blue': ['navy', 'denim', 'cobalt'],
+    'red': ['burgundy', 'maroon', 'wine'],
+    'green': ['olive', 'forest', 'sage']
+}
+
+
+@dataclass
+class CandidatePool:
+    """Alternative candidates as arrays: ids, attribute ids (-1 unknown), prices (NaN unknown)"""
+    product_ids: np.ndarray
+    attributes: np.ndarray
+    prices: np.ndarray
+    loaded_at: datetime
+
+
+_candidate_pools: Dict[str, CandidatePool] = {}
+_candidate_pool_lock = threading.Lock()
+
+# (database, post, user, feature-vector version) -> (cached_at, result)
+_alternatives_cache: Dict[tuple, tuple] = {}
+
+
+def get_candidate_pool(db: Session) -> CandidatePool:
+    """Shared candidate arrays, reloaded at most every CANDIDATE_POOL_TTL"""
+    key = str(db.get_bind().url)
+    pool = _candidate_pools.get(key)
+    if pool is None or datetime.now() - pool.loaded_at > CANDIDATE_POOL_TTL:
+        with _candidate_pool_lock:
+            pool = _candidate_pools.get(key)
+            if pool is None or datetime.now() - pool.loaded_at > CANDIDATE_POOL_TTL:
+                rows = db.query(ProductAnalytics.product_id, ProductAnalytics.current_price).order_by(
+                    desc(ProductAnalytics.favorite_count + ProductAnalytics.canvas_add_count)
+                ).limit(CANDIDATE_POOL_SIZE).all()
+                product_ids = np.array([r[0] for r in rows], dtype=object)
+                prices = np.array([r[1] if r[1] is not None else np.nan for r in rows], dtype=np.float64)
+                pool = CandidatePool(
+                    product_ids=product_ids,
+                    attributes=get_taste_index(db).attributes_for(list(product_ids)).astype(np.int64),
+                    prices=np.where(np.isnan(prices), get_product_catalog(db).prices_for(list(product_ids)), prices),
+                    loaded_at=datetime.now()
+                )
+                _candidate_pools[key] = pool
+    return pool
 
 
 class TailoredRecommendationEngine:
@@ -50,6 +112,13 @@ class TailoredRecommendationEngine:
             "match_quality": 0.85
         }
         """
+        # Results only change when the post or the user's feature vector does
+        features = get_user_features(self.db, user_id)
+        cache_key = (str(self.db.get_bind().url), str(post_id), user_id, features.version)
+        cached = _alternatives_cache.get(cache_key)
+        if cached and datetime.now() - cached[0] < ALTERNATIVES_CACHE_TTL:
+            return cached[1]
+        
         # Get the post
         post = self.db.query(CreatorPost).filter(CreatorPost.id == post_id).first()
         if not post:
@@ -58,26 +127,21 @@ class TailoredRecommendationEngine:
         # Get user profile
         user_profile = self._get_user_profile(user_id)
         
-        # Generate alternatives for each product
+        # Creator products, then every (creator product x candidate) pair in one pass
+        creator_products = self._get_post_products(post)
+        product_ids = [p['product_id'] for p in creator_products]
+        scored = self._score_alternatives(creator_products, user_profile, exclude_products=product_ids)
+        
         all_alternatives = {}
         total_creator_price = 0
         total_alternative_price = 0
         match_scores = []
         
-        for product_id in post.product_ids:
-            # Get product info (placeholder - in production, fetch from product DB)
-            creator_product = self._get_product_info(product_id)
+        for creator_product, alternatives in zip(creator_products, scored):
             total_creator_price += creator_product.get('price', 0)
             
-            # Find alternatives
-            alternatives = self._find_alternatives(
-                creator_product=creator_product,
-                user_profile=user_profile,
-                exclude_products=post.product_ids
-            )
-            
             if alternatives:
-                all_alternatives[product_id] = alternatives
+                all_alternatives[creator_product['product_id']] = alternatives
                 
                 # Track best alternative price
                 best_alt_price = alternatives[0]['price']
@@ -90,9 +154,9 @@ class TailoredRecommendationEngine:
         savings = total_creator_price - total_alternative_price
         avg_match_quality = sum(match_scores) / len(match_scores) if match_scores else 0
         
-        return {
+        result = {
             "post_id": post_id,
-            "creator_picks": post.product_ids,
+            "creator_picks": product_ids,
             "alternatives": all_alternatives,
             "total_savings": round(savings, 2),
             "match_quality": round(avg_match_quality, 2),
@@ -102,16 +166,22 @@ class TailoredRecommendationEngine:
                 avg_match_quality
             )
         }
+        
+        _alternatives_cache[cache_key] = (datetime.now(), result)
+        while len(_alternatives_cache) > ALTERNATIVES_CACHE_SIZE:
+            _alternatives_cache.pop(next(iter(_alternatives_cache)))
+        return result
     
     
-    def _find_alternatives(
+    def _score_alternatives(
         self,
-        creator_product: Dict[str, Any],
+        creator_products: List[Dict[str, Any]],
         user_profile: Dict[str, Any],
         exclude_products: List[str]
-    ) -> List[Dict[str, Any]]:
+    ) -> List[List[Dict[str, Any]]]:
         """
-        Find alternative products that match user's preferences
+        Find alternative products that match user's preferences, for every
+        creator product at once
         
         Scoring factors (PERSONALIZATION FIRST):
         - Category match (must match)
@@ -120,119 +190,65 @@ class TailoredRecommendationEngine:
         - Color match (20%) - Colors they wear
         - Visual similarity (15%) - placeholder for CLIP
         - Price match (5%) - Bonus if in their range (not required)
-        """
-        # Get candidate products from analytics
-        # Filter by category (must match) and exclude creator's picks
-        category = creator_product.get('category', 'unknown')
-        
-        # In production, query your product database
-        # For now, simulate with ProductAnalytics
-        candidates = self.db.query(ProductAnalytics).filter(
-            ProductAnalytics.product_id.notin_(exclude_products)
-        ).limit(100).all()
-        
-        scored_alternatives = []
-        
-        for candidate in candidates:
-            # Score this alternative
-            score_breakdown = self._calculate_match_score(
-                candidate=candidate,
-                creator_product=creator_product,
-                user_profile=user_profile
-            )
-            
-            total_score = sum(score_breakdown.values())
-            
-            # Only include if meets minimum threshold
-            if total_score >= self.MIN_MATCH_SCORE:
-                scored_alternatives.append({
-                    "product_id": candidate.product_id,
-                    "match_score": round(total_score, 2),
-                    "score_breakdown": score_breakdown,
-                    "match_reasons": self._generate_match_reasons(
-                        score_breakdown, 
-                        creator_product, 
-                        candidate
-                    ),
-                    # Placeholder data - replace with actual product data
-                    "name": f"Alternative {candidate.product_id}",
-                    "brand": "Budget Brand",
-                    "price": creator_product.get('price', 100) * 0.6,  # ~40% cheaper
-                    "image_url": "https://example.com/product.jpg",
-                    "available": True
-                })
         
-        # Sort by score and return top alternatives
-        scored_alternatives.sort(key=lambda x: x['match_score'], reverse=True)
-        return scored_alternatives[:self.MAX_ALTERNATIVES]
-    
-    
-    def _calculate_match_score(
-        self,
-        candidate: ProductAnalytics,
-        creator_product: Dict[str, Any],
-        user_profile: Dict[str, Any]
-    ) -> Dict[str, float]:
+        Candidates whose attributes we don't know inherit the creator product's.
+        Returns one sorted list of alternatives per creator product.
         """
-        Multi-factor scoring algorithm
-        Returns breakdown of scores for transparency
-        """
-        scores = {
-            'style': 0.0,
-            'color': 0.0,
-            'price': 0.0,
-            'brand': 0.0,
-            'visual': 0.0
-        }
+        if not creator_products:
+            return []
+        
+        pool = get_candidate_pool(self.db)
+        catalog = get_product_catalog(self.db)
+        space = get_feature_space(self.db)
+        keep = ~np.isin(pool.product_ids, exclude_products)
+        candidate_ids = pool.product_ids[keep]
+        candidate_attrs = pool.attributes[keep]          # (N, kinds) vocabulary ids, -1 unknown
+        candidate_prices = pool.prices[keep]              # (N,) NaN unknown
+        if len(candidate_ids) == 0:
+            return [[] for _ in creator_products]
+        
+        creator_attrs = np.array(
+            [[space.lookup(kind, p.get(kind)) if p.get(kind) else -1 for kind in FEATURE_KINDS]
+             for p in creator_products],
+            dtype=np.int64
+        )                                                 # (P, kinds)
+        creator_prices = np.array([p.get('price', 100) for p in creator_products], dtype=np.float64)
+        
+        # Effective attributes per (creator product, candidate) pair
+        attrs = np.where(candidate_attrs[None, :, :] >= 0, candidate_attrs[None, :, :], creator_attrs[:, None, :])
+        brand, color, category, style = (attrs[:, :, FEATURE_KINDS.index(k)] for k in ('brand', 'color', 'category', 'style'))
+        
+        def vocabulary_mask(kind: str, values: List[str]) -> np.ndarray:
+            mask = np.zeros(space.size + 1, dtype=bool)   # Last slot absorbs -1 (unknown)
+            for value in values:
+                feature_id = space.lookup(kind, value)
+                if feature_id >= 0:
+                    mask[feature_id] = True
+            return mask
         
         # 1. STYLE MATCH (35% weight) - HIGHEST PRIORITY
-        # In production, compare style tags
-        # For now, simulate
-        creator_style = creator_product.get('style', 'casual')
-        user_preferred_styles = user_profile.get('style_preferences', ['casual'])
-        
-        if creator_style in user_preferred_styles:
-            scores['style'] = 0.35
-        else:
-            scores['style'] = 0.18  # Partial credit for similar styles
+        style_mask = vocabulary_mask('style', user_profile.get('style_preferences', ['casual']))
+        style_score = np.where(style_mask[style], 0.35, 0.18)  # Partial credit for similar styles
         
         # 3. COLOR MATCH (20% weight)
-        # Check if color matches user's preferences
-        creator_color = creator_product.get('color', 'black')
-        user_favorite_colors = user_profile.get('favorite_colors', ['black', 'white'])
-        
-        if creator_color in user_favorite_colors:
-            scores['color'] = 0.20
-        elif self._are_colors_similar(creator_color, user_favorite_colors):
-            scores['color'] = 0.10
+        favorite_colors = user_profile.get('favorite_colors', ['black', 'white'])
+        color_mask = vocabulary_mask('color', favorite_colors)
+        similar_mask = vocabulary_mask('color', self._similar_colors(favorite_colors))
+        color_score = np.where(color_mask[color], 0.20, np.where(similar_mask[color], 0.10, 0.0))
         
         # 5. PRICE MATCH (5% weight) - BONUS ONLY
-        # Price is a nice-to-have, not a must-have
-        creator_price = creator_product.get('price', 100)
+        # Unknown candidate prices are simulated at a 40% discount on the creator's item
+        prices = np.where(np.isnan(candidate_prices)[None, :], creator_prices[:, None] * 0.6, candidate_prices[None, :])
         user_avg_price = user_profile.get('avg_purchase_price', 50)
-        user_max_price = user_profile.get('max_price_willing', 150)
-        
-        # Candidate should be cheaper than creator's item
-        candidate_price = creator_price * 0.6  # Simulated 40% discount
-        
-        # Small bonus if price is in their typical range
-        price_ratio = abs(candidate_price - user_avg_price) / max(user_avg_price, 1)
-        if price_ratio < 0.3:  # Within 30% of their usual
-            scores['price'] = 0.05
-        elif price_ratio < 0.5:  # Within 50%
-            scores['price'] = 0.03
-        # No points if outside their range, but still show it!
+        price_ratio = np.abs(prices - user_avg_price) / max(user_avg_price, 1)
+        price_score = np.where(price_ratio < 0.3, 0.05, np.where(price_ratio < 0.5, 0.03, 0.0))
         
         # 2. BRAND PREFERENCE (25% weight) - SECOND PRIORITY
-        # Show them brands they LOVE
-        candidate_brand = "Budget Brand"  # Simulated
         user_brands = user_profile.get('favorite_brands', [])
-        
-        if candidate_brand in user_brands:
-            scores['brand'] = 0.25
-        elif len(user_brands) == 0:
-            # No brand preference? Give partial credit
-            scores['brand'] = 0.10
+        if user_brands:
+            brand_score = np.where(vocabulary_mask('brand', user_brands)[brand], 0.25, 0.0)
+        else:
+            brand_score = np.full(brand.shape, 0.10)  # No brand preference? Give partial credit
         
         # 4. VISUAL SIMILARITY (15% weight) - CLIP EMBEDDINGS
         # This is WHERE THE MAGIC HAPPENS
@@ -240,33 +256,67 @@ class TailoredRecommendationEngine:
         # - Paint splatters, distressing, texture
         # - Exact shade of color (not just "blue" but "faded denim blue")
         # - Fit and silhouette (baggy vs fitted)
-        # - Details: buttons, zippers, pockets, patterns
-        # - Styling: tucked, rolled, layered
         # - Material appearance: leather texture, knit pattern, denim wash
         
-        # TODO: Implement CLIP similarity
-        # visual_sim = cosine_similarity(
-        #     creator_product_embedding,
-        #     candidate_product_embedding
-        # )
-        # scores['visual'] = visual_sim * 0.15
+        # TODO: Implement CLIP similarity as one (P, N) cosine matrix
+        # visual_sim = creator_embeddings @ candidate_embeddings.T
+        # visual_score = visual_sim * 0.15
         
         # For now, give partial credit (will be replaced with real CLIP)
-        scores['visual'] = 0.08
-        
-        # FUTURE: This score should be HIGHEST for items that:
-        # - Have the exact same vibe (minimalist, edgy, preppy)
-        # - Share subtle details (paint splats, distressing)
-        # - Match the exact aesthetic even if tags differ
+        visual_score = np.full(brand.shape, 0.08)
+        
+        total = style_score + color_score + price_score + brand_score + visual_score
+        
+        # Category must match when both sides know it
+        known = (category >= 0) & (creator_attrs[:, None, FEATURE_KINDS.index('category')] >= 0)
+        same_category = category == creator_attrs[:, None, FEATURE_KINDS.index('category')]
+        eligible = (total >= self.MIN_MATCH_SCORE) & (~known | same_category)
+        ranked = np.where(eligible, total, -np.inf)
+        
+        results = []
+        k = min(self.MAX_ALTERNATIVES, len(candidate_ids))
+        for row, creator_product in enumerate(creator_products):
+            top = np.argpartition(-ranked[row], k - 1)[:k]
+            top = top[np.argsort(-ranked[row][top], kind='stable')]
+            alternatives = []
+            for col in top:
+                if not np.isfinite(ranked[row, col]):
+                    continue
+                score_breakdown = {
+                    'style': float(style_score[row, col]),
+                    'color': float(color_score[row, col]),
+                    'price': float(price_score[row, col]),
+                    'brand': float(brand_score[row, col]),
+                    'visual': float(visual_score[row, col]),
+                }
+                described_brand = space.describe(int(candidate_attrs[col, FEATURE_KINDS.index('brand')]))
+                listing = catalog.info(candidate_ids[col]) or {}
+                alternatives.append({
+                    "product_id": candidate_ids[col],
+                    "match_score": round(float(total[row, col]), 2),
+                    "score_breakdown": score_breakdown,
+                    "match_reasons": self._generate_match_reasons(
+                        score_breakdown, 
+                        creator_product, 
+                        float(prices[row, col])
+                    ),
+                    # Catalog data, placeholders for products it doesn't know yet
+                    "name": listing.get('name') or f"Alternative {candidate_ids[col]}",
+                    "brand": listing.get('brand') or (described_brand[1] if described_brand else "Budget Brand"),
+                    "price": float(prices[row, col]),
+                    "image_url": listing.get('image_url') or "https://example.com/product.jpg",
+                    "available": True
+                })
+            results.append(alternatives)
         
-        return scores
+        return results
     
     
     def _generate_match_reasons(
         self,
         score_breakdown: Dict[str, float],
         creator_product: Dict[str, Any],
-        candidate: ProductAnalytics
+        candidate_price: float
     ) -> List[str]:
         """
         Generate human-readable reasons for why this is a good match
@@ -281,7 +331,6 @@ class TailoredRecommendationEngine:
         
         if score_breakdown['price'] >= 0.15:
             creator_price = creator_product.get('price', 0)
-            candidate_price = creator_price * 0.6
             if candidate_price < creator_price:
                 savings = creator_price - candidate_price
                 reasons.append(f"💰 ${candidate_price:.0f} (Save ${savings:.0f})")
@@ -343,42 +392,18 @@ class TailoredRecommendationEngine:
     
     def _get_user_profile(self, user_id: int) -> Dict[str, Any]:
         """
-        Build user's style and budget profile from interactions
+        Build user's style and budget profile from their feature vector
         """
-        # Get user's interaction history
-        recent_interactions = self.db.query(UserInteraction).filter(
-            UserInteraction.user_id == user_id
-        ).order_by(
-            UserInteraction.created_at.desc()
-        ).limit(100).all()
-        
-        # Extract preferences
-        prices = []
-        brands = []
-        colors = []
-        styles = []
-        
-        for interaction in recent_interactions:
-            if interaction.interaction_metadata:
-                meta = interaction.interaction_metadata
-                
-                if 'price' in meta:
-                    prices.append(float(meta['price']))
-                if 'brand' in meta:
-                    brands.append(meta['brand'])
-                if 'color' in meta:
-                    colors.append(meta['color'])
-                if 'style' in meta:
-                    styles.append(meta['style'])
+        features = get_user_features(self.db, user_id)
+        space = get_feature_space(self.db)
         
         # Calculate averages
-        avg_price = sum(prices) / len(prices) if prices else 50
-        max_price = max(prices) if prices else 100
+        avg_price = features.avg_price or 50
+        max_price = features.price_max or 100
         
-        from collections import Counter
-        favorite_brands = [b for b, _ in Counter(brands).most_common(5)]
-        favorite_colors = [c for c, _ in Counter(colors).most_common(5)]
-        style_preferences = [s for s, _ in Counter(styles).most_common(3)]
+        favorite_brands = [b for b, _ in features.top(space, 'brand', 5)]
+        favorite_colors = [c for c, _ in features.top(space, 'color', 5)]
+        style_preferences = [s for s, _ in features.top(space, 'style', 3)]
         
         return {
             'avg_purchase_price': avg_price,
@@ -389,44 +414,56 @@ class TailoredRecommendationEngine:
         }
     
     
-    def _get_product_info(self, product_id: str) -> Dict[str, Any]:
+    def _get_post_products(self, post: CreatorPost) -> List[Dict[str, Any]]:
         """
-        Get product information
-        In production, query actual product database
-        For now, return placeholder
+        Product information for everything tagged in a post, in one query
+        The product catalog wins; then the post's tags (name/brand/price) and the
+        taste index (category/style/color) fill what it doesn't know
         """
-        # Simulate product data
-        return {
-            'product_id': product_id,
-            'name': f'Product {product_id}',
-            'brand': 'Premium Brand',
-            'price': 150.00,
-            'category': 'tops',
-            'style': 'minimalist',
-            'color': 'black',
-            'image_url': 'https://example.com/product.jpg'
-        }
+        rows = self.db.query(PostProduct).filter(
+            PostProduct.post_id == post.id,
+            PostProduct.product_id.isnot(None)
+        ).all()
+        space = get_feature_space(self.db)
+        catalog = get_product_catalog(self.db)
+        attributes = get_taste_index(self.db).attributes_for([r.product_id for r in rows])
+        
+        products = []
+        for row, attrs in zip(rows, attributes):
+            product = {
+                'product_id': row.product_id,
+                'name': row.product_name or f'Product {row.product_id}',
+                'brand': row.product_brand or 'Premium Brand',
+                'price': parse_price(row.product_price, 150.00),
+                'category': 'tops',
+                'style': 'minimalist',
+                'color': 'black',
+                'image_url': row.product_image or 'https://example.com/product.jpg'
+            }
+            for kind, feature_id in zip(FEATURE_KINDS, attrs):
+                described = space.describe(int(feature_id)) if feature_id >= 0 else None
+                if described:
+                    product[kind] = described[1]
+            listing = catalog.info(row.product_id) or {}
+            product.update({field: value for field, value in listing.items()
+                            if field in product and value is not None})
+            products.append(product)
+        return products
     
     
     def _are_colors_similar(self, color1: str, color_list: List[str]) -> bool:
         """
         Check if colors are similar (e.g., navy and blue, grey and black)
         """
-        color_families = {
-            'black': ['charcoal', 'grey', 'gray'],
-            'white': ['cream', 'ivory', 'beige'],
-            'blue': ['navy', 'denim', 'cobalt'],
-            'red': ['burgundy', 'maroon', 'wine'],
-            'green': ['olive', 'forest', 'sage']
-        }
-        
+        return color1 in self._similar_colors(color_list)
+    
+    def _similar_colors(self, color_list: List[str]) -> set:
+        """Every color _are_colors_similar accepts for this list (a handful, not the vocabulary)"""
+        similar = set()
         for color in color_list:
-            if color in color_families.get(color1, []):
-                return True
-            if color1 in color_families.get(color, []):
-                return True
-        
-        return False
+            similar.update(COLOR_FAMILIES.get(color, []))
+            similar.update(head for head, members in COLOR_FAMILIES.items() if color in members)
+        return similar
 
 
 # Helper function for easy access
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Parity tests + benchmark for the columnar profile aggregator
+Checks profile_aggregator.aggregate_profiles against the per-user reference
+(profile_builder.compute_profile_fields + user_features.raw_user_features)
+on hand-written and randomized fixtures. No database needed.
+
+    python test_profile_aggregator.py                 # parity tests
+    python test_profile_aggregator.py --benchmark     # columnar vs per-user builder
+"""
+
+import argparse
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+import database  # noqa: F401  (registers every model before profile_builder imports them)
+from interaction_models import ACTION_WEIGHTS
+from profile_builder import InteractionRow, compute_profile_fields, STYLE_KEYWORDS
+from profile_aggregator import aggregate_profiles
+from user_features import raw_user_features
+
+NOW = datetime(2025, 11, 1, 12, 0, 0)
+
+
+def row(user_id, action_type, metadata, days_ago=0.0, weight=None):
+    return InteractionRow(
+        user_id=user_id,
+        action_type=action_type,
+        interaction_metadata=metadata,
+        weight=ACTION_WEIGHTS.get(action_type, 1.0) if weight is None else weight,
+        created_at=NOW - timedelta(days=days_ago) if days_ago is not None else None,
+    )
+
+
+def fixture_rows():
+    """Every branch of the profile rules, two users interleaved."""
+    return [
+        row(1, 'search', {'query': 'Black MINIMALIST vintage jacket', 'category': 'jackets'}, 3),
+        row(1, 'view_product', {'brand': 'Zara', 'price': 89.99, 'category': 'jackets'}, 2.5),
+        row(2, 'favorite_product', {'brand': 'COS', 'color': 'navy', 'price': '45.00'}, 1),
+        row(1, 'favorite_product', {
+            'brand': 'Zara', 'price': 89.99, 'category': 'jackets', 'color': 'black',
+            'tags': ['minimalist', 'casual']
+        }, 2),
+        row(1, 'wardrobe_upload', {
+            'category': 'jeans', 'color': 'black', 'colors': ['black', 'indigo'],
+            'brand': 'Levis', 'size': '28', 'tags': ['casual', 'denim']
+        }, 40),
+        row(1, 'click_to_retailer', {'brand': 'Zara', 'price': 'not a price', 'size': 'M', 'category': 'tops'}, 0.2),
+        row(2, 'follow_creator', {'creator_style': ['streetwear', 'y2k']}, 10),
+        row(2, 'search', {'query': 'streetwear', 'category': 'shoes'}, 80),
+        row(1, 'canvas_add', None, 0),
+        row(2, 'dislike_product', {'brand': 'COS', 'price': 120.0}, 0.5, weight=-2.0),
+        row(1, 'purchase_complete', {'brand': 'Arket', 'price': 60, 'category': 'tops'}, 70),
+        row(2, 'view_post', {}, None),
+        row(1, 'favorite_product', {'color': {'not': 'hashable'}, 'category': 'tops', 'size': 'S'}, 5),
+    ]
+
+
+def random_rows(users: int, events: int, seed: int = 7):
+    """Synthetic traffic shaped like synthetic_data.py's."""
+    rnd = random.Random(seed)
+    brands = ['Zara', 'COS', 'Arket', 'H&M', 'Levis', 'Uniqlo', 'Mango', 'ASOS']
+    colors = ['black', 'white', 'navy', 'beige', 'red', 'green', 'grey', 'cream']
+    categories = ['tops', 'bottoms', 'dresses', 'outerwear', 'shoes', 'accessories']
+    styles = ['minimalist', 'casual', 'streetwear', 'vintage', 'bohemian', 'classic']
+    actions = ['view_product', 'favorite_product', 'canvas_add', 'click_to_retailer',
+               'purchase_complete', 'wardrobe_upload', 'search', 'follow_creator', 'view_post']
+    keywords = sorted(STYLE_KEYWORDS)
+    rows = []
+    for _ in range(events):
+        action = rnd.choice(actions)
+        if action == 'search':
+            metadata = {'query': ' '.join(rnd.sample(keywords, 2) + ['jacket']), 'category': rnd.choice(categories)}
+        elif action == 'follow_creator':
+            metadata = {'creator_style': rnd.sample(styles, 2)}
+        elif action == 'view_post':
+            metadata = {}
+        else:
+            metadata = {
+                'brand': rnd.choice(brands), 'color': rnd.choice(colors), 'category': rnd.choice(categories),
+                'style': rnd.choice(styles), 'price': round(rnd.lognormvariate(4.0, 0.6), 2),
+            }
+            if rnd.random() < 0.2:
+                metadata['tags'] = rnd.sample(styles, 2)
+            if rnd.random() < 0.1:
+                metadata['size'] = rnd.choice(['XS', 'S', 'M', 'L'])
+        rows.append(row(rnd.randint(1, users), action, metadata, rnd.uniform(0, 90)))
+    return rows
+
+
+def reference(rows):
+    """The per-user builder: group rows by user, then compute_profile_fields + raw_user_features."""
+    by_user = {}
+    for r in rows:
+        by_user.setdefault(r.user_id, []).append(r)
+    results = []
+    for user_id, user_rows in by_user.items():
+        accumulator, fields = compute_profile_fields(user_rows, NOW)
+        results.append((user_id, accumulator, fields, raw_user_features(user_id, user_rows, NOW)))
+    return results
+
+
+def close(a, b, tolerance=1e-9):
+    if isinstance(a, float) or isinstance(b, float):
+        if a is None or b is None:
+            return a is b
+        return math.isclose(a, b, rel_tol=tolerance, abs_tol=tolerance)
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(close(a[k], b[k], tolerance) for k in a)
+    return a == b
+
+
+def assert_parity(rows):
+    expected = reference(rows)
+    actual = aggregate_profiles(rows, NOW)
+    assert [r[0] for r in actual] == [r[0] for r in expected], "user order differs"
+
+    for (user_id, acc_a, fields_a, feat_a), (_, acc_e, fields_e, feat_e) in zip(actual, expected):
+        assert close(fields_a, fields_e), f"user {user_id} fields:\n{fields_a}\n!=\n{fields_e}"
+        values_a, values_e = acc_a.row_values(), acc_e.row_values()
+        for column in ('updated_at',):
+            values_a.pop(column), values_e.pop(column)
+        assert close(values_a, values_e), f"user {user_id} aggregates:\n{values_a}\n!=\n{values_e}"
+        assert close(feat_a.weights, feat_e.weights), f"user {user_id} feature weights differ"
+        for column in ('price_weight_sum', 'price_weighted_sum', 'price_min', 'price_max'):
+            assert close(getattr(feat_a, column), getattr(feat_e, column)), f"user {user_id} {column} differs"
+    return len(actual)
+
+
+def test_fixture_parity():
+    assert assert_parity(fixture_rows()) == 2
+
+
+def test_fixture_fields():
+    fields = {user_id: f for user_id, _, f, _ in aggregate_profiles(fixture_rows(), NOW)}
+    assert fields[1]['favorite_colors'][0] == 'black'
+    assert fields[1]['favorite_brands'][0] == 'Zara'
+    assert fields[1]['style_keywords'][:2] == ['minimalist', 'casual']
+    assert fields[1]['size_preferences'] == {'jeans': '28', 'tops': 'M'}
+    assert fields[1]['avoided_categories'] == []
+    assert fields[2]['avoided_categories'] == ['shoes']
+    assert fields[2]['followed_creator_styles'] == ['streetwear', 'y2k']
+    assert fields[2]['avg_price_point'] == 45.0  # The dislike's price doesn't count
+
+
+def test_random_parity():
+    assert assert_parity(random_rows(users=50, events=5000)) == 50
+
+
+def test_empty():
+    assert aggregate_profiles([], NOW) == []
+
+
+def _best_of(repeats: int, fn, *args) -> float:
+    """Best CPU time of a few runs (wall clock is too noisy on shared boxes)."""
+    timings = []
+    for _ in range(repeats):
+        started = time.process_time()
+        fn(*args)
+        timings.append(time.process_time() - started)
+    return min(timings)
+
+
+def benchmark(users: int, events: int, repeats: int):
+    rows = random_rows(users, events)
+    print(f"{events} interactions across {users} users (best of {repeats})")
+
+    per_user = _best_of(repeats, reference, rows)
+    columnar = _best_of(repeats, aggregate_profiles, rows, NOW)
+
+    print(f"  per-user builder : {per_user * 1000:8.1f} ms ({users / per_user:,.0f} users/sec)")
+    print(f"  columnar         : {columnar * 1000:8.1f} ms ({users / columnar:,.0f} users/sec)")
+    print(f"  speedup          : {per_user / columnar:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile aggregator parity tests and benchmark")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.users, args.events, args.repeats)
+    else:
+        for name, test in list(globals().items()):
+            if name.startswith("test_") and callable(test):
+                test()
+                print(f"✅ {name}")
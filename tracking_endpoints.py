@@ -1,16 +1,26 @@
 # tracking_endpoints.py
 # Add these endpoints to your app.py
 
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import Text, cast
 from sqlalchemy.orm import Session
-from datetime import datetime
-from typing import Optional, Dict, Any
+from datetime import datetime, date, timedelta
+from typing import Optional, Dict, Any, List
 from pydantic import BaseModel
 import json
 
 from database import get_db
-from auth_service import get_current_user
+from auth_service import get_authenticated_user, AuthenticatedUser
 from interaction_models import UserInteraction, ACTION_WEIGHTS, UserStyleProfile, ProductAnalytics
+from user_features import apply_interaction
+from profile_builder import apply_profile_interaction
+from item_exclusions import record_exclusion_event
+from hot_items import get_hot_items_tracker
+from session_events import record_session_event
+from interaction_ingest import get_ingest_buffer, IngestBufferFull
+from analytics_counters import record_product_event, COUNTERS
+from pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from json_responses import ORJSONResponse, raw_json
 
 router = APIRouter(prefix="/ai", tags=["AI Tracking"])
 
@@ -30,7 +40,7 @@ class TrackInteractionRequest(BaseModel):
 @router.post("/track-interaction")
 def track_interaction(
     request: TrackInteractionRequest,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -42,17 +52,6 @@ def track_interaction(
     - User views creator post: action_type='view_post', item_id='post_456'
     - User adds to canvas: action_type='canvas_add', item_id='prod_123'
     """
-    print(f"DEBUG: authorization header = {authorization}")
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    print(f"DEBUG tracking: token={token[:20]}...")
-    user = get_current_user(db, token)
-    print(f"DEBUG tracking: user={user}")
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     # Get weight for this action type
     weight = ACTION_WEIGHTS.get(request.action_type, 1.0)
     
@@ -71,7 +70,14 @@ def track_interaction(
     
     # Update product analytics if this is a product interaction
     if request.item_type == 'product' and request.item_id:
-        update_product_analytics(db, request.item_id, request.action_type)
+        record_product_event(request.item_id, request.action_type)
+        get_hot_items_tracker().record(request.item_id, weight)
+    
+    # Keep the user's numeric feature vector and style profile current
+    apply_interaction(db, interaction)
+    apply_profile_interaction(db, interaction)
+    record_exclusion_event(db, user.id, request.item_id, request.action_type)
+    record_session_event(user.id, request.action_type, request.item_id, request.metadata)
     
     db.commit()
     
@@ -83,48 +89,102 @@ def track_interaction(
     }
 
 
+MAX_BATCH_EVENTS = 500
+
+
+class TrackInteractionsBatchRequest(BaseModel):
+    events: List[TrackInteractionRequest]
+
+
+@router.post("/track-interactions/batch")
+def track_interactions_batch(
+    request: TrackInteractionsBatchRequest,
+    user: AuthenticatedUser = Depends(get_authenticated_user)
+):
+    """
+    Track a batch of actions in one call (the mobile client's views, scrolls and clicks).
+    Events are buffered and written in bulk behind the response (see interaction_ingest.py);
+    the returned sequence numbers are in request order.
+    """
+    if len(request.events) > MAX_BATCH_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_EVENTS} events per batch")
+    
+    now = datetime.utcnow()  # Same clock as the created_at server default
+    rows = [
+        {
+            "user_id": user.id,
+            "action_type": event.action_type,
+            "item_id": event.item_id,
+            "item_type": event.item_type,
+            "interaction_metadata": event.metadata or {},
+            "weight": ACTION_WEIGHTS.get(event.action_type, 1.0),
+            "source": event.source,
+            "created_at": now,
+        }
+        for event in request.events
+    ]
+    
+    buffer = get_ingest_buffer()
+    try:
+        sequences = buffer.submit(rows)
+    except IngestBufferFull:
+        raise HTTPException(status_code=503, detail="Tracking is backed up, retry shortly")
+    
+    # In-memory signals don't wait for the flush
+    for event, row in zip(request.events, rows):
+        if event.item_type == 'product' and event.item_id:
+            get_hot_items_tracker().record(event.item_id, row["weight"])
+        record_session_event(user.id, event.action_type, event.item_id, event.metadata)
+    
+    return {
+        "success": True,
+        "accepted": len(sequences),
+        "sequences": sequences,
+        "durable": buffer.durable
+    }
+
+
 @router.get("/interactions/me")
 def get_my_interactions(
-    limit: int = 50,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     action_type: Optional[str] = None,
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """
-    Get user's recent interactions.
+    Get user's recent interactions, newest first.
     Useful for debugging or showing user their activity history.
+    Pass the returned next_cursor to get the following page.
     """
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    query = db.query(UserInteraction).filter(UserInteraction.user_id == user.id)
+    query = db.query(
+        UserInteraction.id, UserInteraction.action_type, UserInteraction.item_id, UserInteraction.item_type,
+        cast(UserInteraction.interaction_metadata, Text).label('metadata'),  # Passed through unparsed
+        UserInteraction.source, UserInteraction.weight, UserInteraction.created_at
+    ).filter(UserInteraction.user_id == user.id)
     
     if action_type:
         query = query.filter(UserInteraction.action_type == action_type)
     
-    interactions = query.order_by(UserInteraction.created_at.desc()).limit(limit).all()
+    interactions, next_cursor = paginate(query, UserInteraction, cursor=cursor, limit=limit)
     
-    return {
+    return ORJSONResponse({
         "interactions": [
             {
                 "id": i.id,
                 "action_type": i.action_type,
                 "item_id": i.item_id,
                 "item_type": i.item_type,
-                "metadata": i.interaction_metadata,
+                "metadata": raw_json(i.metadata),
                 "source": i.source,
                 "weight": i.weight,
-                "created_at": i.created_at.isoformat()
+                "created_at": i.created_at
             }
             for i in interactions
         ],
-        "total": len(interactions)
-    }
+        "total": len(interactions),
+        "next_cursor": next_cursor
+    })
 
 
 # ============================================
@@ -133,21 +193,13 @@ def get_my_interactions(
 
 @router.get("/profile/me")
 def get_my_style_profile(
-    authorization: str = Header(None),
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """
     Get user's AI-generated style profile.
     This is built from all their interactions.
     """
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
     profile = db.query(UserStyleProfile).filter(UserStyleProfile.user_id == user.id).first()
     
     if not profile:
@@ -180,24 +232,19 @@ def get_my_style_profile(
 
 @router.post("/profile/rebuild")
 def rebuild_my_profile(
-    authorization: str = Header(None),
+    full: bool = False,
+    user: AuthenticatedUser = Depends(get_authenticated_user),
     db: Session = Depends(get_db)
 ):
     """
-    Manually trigger profile rebuild from interactions.
-    Normally this runs nightly via background job.
+    Re-derive the profile from its incrementally maintained aggregates.
+    full=true re-reads 90 days of interactions instead (repair).
     """
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    token = authorization.split(' ')[1]
-    user = get_current_user(db, token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    # Rebuild profile from interactions
-    from profile_builder import rebuild_user_profile
-    profile = rebuild_user_profile(db, user.id)
+    from profile_builder import rebuild_user_profile, refresh_user_profile
+    profile = None if full else refresh_user_profile(db, user.id)
+    if profile is None:
+        # Repair requested, or no aggregates yet: rebuild from interactions
+        profile = rebuild_user_profile(db, user.id)
     
     return {
         "success": True,
@@ -206,41 +253,6 @@ def rebuild_my_profile(
     }
 
 
-# ============================================
-# HELPER FUNCTIONS
-# ============================================
-
-def update_product_analytics(db: Session, product_id: str, action_type: str):
-    """
-    Update product analytics in real-time.
-    This data is GOLD for retailers!
-    """
-    analytics = db.query(ProductAnalytics).filter(
-        ProductAnalytics.product_id == product_id
-    ).first()
-    
-    if not analytics:
-        analytics = ProductAnalytics(product_id=product_id)
-        db.add(analytics)
-    
-    # Increment counters based on action type
-    if action_type == 'view_product':
-        analytics.view_count = (analytics.view_count or 0) + 1
-    elif action_type in ['favorite_product', 'favorite_from_creator']:
-        analytics.favorite_count = (analytics.favorite_count or 0) + 1
-    elif action_type == 'canvas_add':
-        analytics.canvas_add_count = (analytics.canvas_add_count or 0) + 1
-    elif action_type == 'click_to_retailer':
-        analytics.click_through_count = (analytics.click_through_count or 0) + 1
-    
-    # Calculate conversion rate
-    if (analytics.favorite_count or 0) > 0:
-        analytics.wishlist_to_canvas_rate = analytics.canvas_add_count / analytics.favorite_count
-    
-    db.commit()
-
-
-
 # ============================================
 # ANALYTICS ENDPOINTS (For Retailers!)
 # ============================================
@@ -253,41 +265,85 @@ def get_product_analytics(
     """
     Get analytics for a specific product.
     This is what you'll sell to retailers!
+    Counts come from the Parquet export (interaction_export.py), so they are as
+    of the last export run; only the demographics are read from the database.
     """
-    analytics = db.query(ProductAnalytics).filter(
+    from interaction_export import product_totals, EXPORT_DIR, _read_state
+    
+    totals = product_totals(product_id)
+    demographics = db.query(ProductAnalytics.interested_demographics).filter(
         ProductAnalytics.product_id == product_id
-    ).first()
+    ).scalar()
     
-    if not analytics:
+    if not any(totals[c] for c in COUNTERS) and demographics is None:
         raise HTTPException(status_code=404, detail="No analytics found for this product")
     
     return {
         "product_id": product_id,
         "metrics": {
-            "views": analytics.view_count,
-            "favorites": analytics.favorite_count,
-            "canvas_adds": analytics.canvas_add_count,
-            "clicks": analytics.click_through_count,
-            "wishlist_to_canvas_rate": f"{analytics.wishlist_to_canvas_rate * 100:.1f}%",
-            "purchase_intent_score": calculate_purchase_intent(analytics)
+            "views": totals['view_count'],
+            "favorites": totals['favorite_count'],
+            "canvas_adds": totals['canvas_add_count'],
+            "clicks": totals['click_through_count'],
+            "wishlist_to_canvas_rate": f"{totals['wishlist_to_canvas_rate'] * 100:.1f}%",
+            "purchase_intent_score": calculate_purchase_intent(totals)
         },
-        "demographics": analytics.interested_demographics,
-        "updated_at": analytics.updated_at.isoformat()
+        "demographics": demographics,
+        "updated_at": _read_state(EXPORT_DIR).get('exported_at')  # Last export run
+    }
+
+
+@router.get("/analytics/product/{product_id}/daily")
+def get_product_daily_analytics(
+    product_id: str,
+    days: int = 30
+):
+    """
+    Day-by-day events and unique users for a product.
+    Reads the Parquet export (interaction_export.py), never the production tables.
+    """
+    from interaction_export import product_daily_metrics
+    
+    since = date.today() - timedelta(days=days)
+    return {
+        "product_id": product_id,
+        "since": since.isoformat(),
+        "days": product_daily_metrics(product_id, since=since)
+    }
+
+
+@router.get("/analytics/funnel")
+def get_funnel_analytics(
+    days: int = 30,
+    product_id: Optional[str] = None
+):
+    """
+    View -> favorite -> canvas -> click-through funnel (distinct users),
+    overall or for one product. Reads the Parquet export.
+    """
+    from interaction_export import funnel
+    
+    since = date.today() - timedelta(days=days)
+    return {
+        "product_id": product_id,
+        "since": since.isoformat(),
+        "steps": funnel(since=since, product_id=product_id)
     }
 
 
-def calculate_purchase_intent(analytics: ProductAnalytics) -> float:
+def calculate_purchase_intent(totals: Dict[str, Any]) -> float:
     """
     Calculate 0-100 score indicating how likely users will buy this product.
     High canvas_add_count + high click_through = strong intent!
+    Takes product counts as interaction_export.product_totals returns them.
     """
-    if analytics.view_count == 0:
+    if totals['view_count'] == 0:
         return 0.0
     
     # Weighted formula
-    view_to_favorite = (analytics.favorite_count / analytics.view_count) * 30
-    favorite_to_canvas = analytics.wishlist_to_canvas_rate * 40
-    click_rate = (analytics.click_through_count / max(analytics.favorite_count, 1)) * 30
+    view_to_favorite = (totals['favorite_count'] / totals['view_count']) * 30
+    favorite_to_canvas = totals['wishlist_to_canvas_rate'] * 40
+    click_rate = (totals['click_through_count'] / max(totals['favorite_count'], 1)) * 30
     
     score = min(view_to_favorite + favorite_to_canvas + click_rate, 100)
     return round(score, 2)
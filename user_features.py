@@ -0,0 +1,516 @@
+# user_features.py
+# Materialized numeric user-feature vectors for vectorized attribute scoring
+#
+# Every attribute value (brand, color, category, style) is interned once into
+# `feature_vocabulary`; its row id is its column in every vector. Users get a
+# sparse weight vector stored in `user_feature_vectors`, products get a small
+# (n_products, n_kinds) matrix of column ids. Attribute scoring for a whole
+# candidate set is then a single gather + dot product instead of Counters.
+
+from typing import List, Dict, Any, Optional, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import threading
+
+import numpy as np
+from sqlalchemy import event, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from interaction_models import UserInteraction
+from recommendation_models import FeatureVocabulary, UserFeatureVector
+
+
+# Weight different actions differently (purchases > clicks > saves > views)
+ACTION_PREFERENCE_WEIGHTS = {
+    'purchase_complete': 10.0,      # STRONGEST signal
+    'click_to_retailer': 8.0,       # High intent
+    'canvas_add': 7.0,              # High intent
+    'favorite_product': 5.0,        # Medium-high intent
+    'favorite_from_creator': 6.0,   # Medium-high + trust signal
+    'wardrobe_upload': 4.0,         # Own it but may not love it
+    'view_product': 2.0,            # Weak signal
+    'search': 17.0,                 # 🔍 VERY HIGH - Active, specific intent!
+}
+
+# Attribute kinds, in the column order of product attribute matrices
+FEATURE_KINDS = ('brand', 'color', 'category', 'style')
+
+# Max attribute-score points for a perfect match on each kind
+ATTRIBUTE_POINTS = np.array([25.0, 20.0, 15.0, 10.0], dtype=np.float32)
+
+PREFERENCE_WINDOW_DAYS = 90
+
+
+def _normalize_value(value: Any) -> Optional[str]:
+    """Attribute values are stored stripped; empty values are ignored."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def extract_attributes(metadata: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Pull the scored attributes out of an interaction's metadata."""
+    if not metadata:
+        return {}
+    attributes = {}
+    for kind in FEATURE_KINDS:
+        value = _normalize_value(metadata.get(kind))
+        if value:
+            attributes[kind] = value
+    return attributes
+
+
+def interaction_preference_weight(interaction: UserInteraction, now: datetime) -> float:
+    """Action weight x recency (decays over 90 days, floor 0.3) x tracked weight."""
+    days_ago = (now - interaction.created_at).days if interaction.created_at else 0
+    recency_multiplier = max(0.3, 1.0 - (days_ago / float(PREFERENCE_WINDOW_DAYS)))
+    action_weight = ACTION_PREFERENCE_WEIGHTS.get(interaction.action_type, 1.0)
+    return action_weight * recency_multiplier * (interaction.weight or 0.0)
+
+
+# ============================================
+# FEATURE SPACE (interned vocabulary)
+# ============================================
+
+class FeatureSpace:
+    """
+    Process-wide cache of the feature vocabulary for one database.
+    Holds committed rows only. Loaded incrementally: rows above the highest id
+    read from the database so far, plus a full pass when the table's row count
+    shows that lower ids were committed late (by other processes).
+    """
+
+    def __init__(self):
+        self._ids: Dict[Tuple[str, str], int] = {}
+        self._values: Dict[int, Tuple[str, str]] = {}
+        self._kind_codes = np.full(0, -1, dtype=np.int8)
+        self._max_id = 0
+        self._watermark = 0  # Highest id read from the database
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._max_id + 1
+
+    def load(self, db: Session) -> "FeatureSpace":
+        count, top = db.query(func.count(FeatureVocabulary.id), func.max(FeatureVocabulary.id)).one()
+        if count == len(self._values):
+            return self
+
+        query = db.query(FeatureVocabulary.id, FeatureVocabulary.kind, FeatureVocabulary.value)
+        rows = query.filter(FeatureVocabulary.id > self._watermark).all()
+        if len(self._values) + len(rows) < count:
+            rows = query.all()
+        with self._lock:
+            for feature_id, kind, value in rows:
+                self._register(feature_id, kind, value)
+            self._watermark = max(self._watermark, top or 0)
+        return self
+
+    def _register(self, feature_id: int, kind: str, value: str):
+        self._ids[(kind, value)] = feature_id
+        self._values[feature_id] = (kind, value)
+        self._max_id = max(self._max_id, feature_id)
+
+    def lookup(self, kind: str, value: str) -> int:
+        """Column id for an attribute value, or -1 if no user has it."""
+        return self._ids.get((kind, value), -1)
+
+    def describe(self, feature_id: int) -> Optional[Tuple[str, str]]:
+        return self._values.get(feature_id)
+
+    def intern(self, db: Session, kind: str, value: str) -> int:
+        """
+        Column id for an attribute value, creating it if needed. A row created
+        here joins the shared cache only once `db` commits.
+        """
+        feature_id = self.lookup(kind, value)
+        if feature_id >= 0:
+            return feature_id
+        pending = self._pending(db)
+        if (kind, value) in pending:
+            return pending[(kind, value)]
+
+        row = db.query(FeatureVocabulary).filter(
+            FeatureVocabulary.kind == kind,
+            FeatureVocabulary.value == value
+        ).first()
+        if row:
+            with self._lock:
+                self._register(row.id, kind, value)
+            return row.id
+
+        try:
+            with db.begin_nested():
+                row = FeatureVocabulary(kind=kind, value=value)
+                db.add(row)
+        except IntegrityError:
+            # Another process interned it first
+            row = db.query(FeatureVocabulary).filter(
+                FeatureVocabulary.kind == kind,
+                FeatureVocabulary.value == value
+            ).one()
+            with self._lock:
+                self._register(row.id, kind, value)
+            return row.id
+
+        pending[(kind, value)] = row.id
+        return row.id
+
+    def _pending(self, db: Session) -> Dict[Tuple[str, str], int]:
+        """Ids `db` has interned in its open transaction (registered on commit, dropped otherwise)."""
+        pending = db.info.get('feature_space_pending')
+        if pending is None:
+            pending = db.info['feature_space_pending'] = {}
+
+            @event.listens_for(db, 'after_commit')
+            def _publish(session):
+                with self._lock:
+                    for (kind, value), feature_id in pending.items():
+                        self._register(feature_id, kind, value)
+
+            @event.listens_for(db, 'after_transaction_end')
+            def _discard(session, transaction):
+                if transaction.parent is None:
+                    pending.clear()
+        return pending
+
+    def kind_codes(self) -> np.ndarray:
+        """Array mapping every column id to its index in FEATURE_KINDS (-1 = unused)."""
+        if len(self._kind_codes) != self.size:
+            codes = np.full(self.size, -1, dtype=np.int8)
+            for feature_id, (kind, _) in list(self._values.items()):
+                codes[feature_id] = FEATURE_KINDS.index(kind)
+            self._kind_codes = codes
+        return self._kind_codes
+
+
+_feature_spaces: Dict[str, FeatureSpace] = {}
+
+
+def get_feature_space(db: Session) -> FeatureSpace:
+    """Get the (incrementally refreshed) vocabulary for this session's database."""
+    key = str(db.get_bind().url)
+    space = _feature_spaces.get(key)
+    if space is None:
+        space = _feature_spaces.setdefault(key, FeatureSpace())
+    return space.load(db)
+
+
+# ============================================
+# USER FEATURES
+# ============================================
+
+@dataclass
+class UserFeatures:
+    """Sparse attribute weights + weighted price stats for one user."""
+    user_id: int
+    weights: Dict[int, float] = field(default_factory=dict)
+    price_weight_sum: float = 0.0
+    price_weighted_sum: float = 0.0
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+    version: int = 0
+
+    @property
+    def avg_price(self) -> Optional[float]:
+        if self.price_weight_sum > 0:
+            return self.price_weighted_sum / self.price_weight_sum
+        return None
+
+    def add(self, feature_id: int, weight: float):
+        self.weights[feature_id] = self.weights.get(feature_id, 0.0) + weight
+
+    def add_price(self, price: float, weight: float):
+        # Negative feedback shouldn't pull the budget estimate around
+        if weight <= 0:
+            return
+        self.price_weight_sum += weight
+        self.price_weighted_sum += price * weight
+        self.price_min = price if self.price_min is None else min(self.price_min, price)
+        self.price_max = price if self.price_max is None else max(self.price_max, price)
+
+    def dense(self, space: FeatureSpace) -> np.ndarray:
+        """
+        Dense float32 vector over the whole vocabulary.
+        Each kind is scaled by its own max so the top brand/color/etc. scores 1.0.
+        """
+        vector = np.zeros(space.size, dtype=np.float32)
+        if not self.weights:
+            return vector
+
+        ids = np.fromiter(self.weights.keys(), dtype=np.int64, count=len(self.weights))
+        values = np.fromiter(self.weights.values(), dtype=np.float32, count=len(self.weights))
+        keep = ids < space.size
+        vector[ids[keep]] = np.maximum(values[keep], 0.0)
+
+        kinds = space.kind_codes()
+        for code in range(len(FEATURE_KINDS)):
+            mask = kinds == code
+            peak = vector[mask].max() if mask.any() else 0.0
+            if peak > 0:
+                vector[mask] /= peak
+        return vector
+
+    def top(self, space: FeatureSpace, kind: str, n: int = 10) -> List[Tuple[str, float]]:
+        """Most heavily weighted values of one kind, e.g. top 5 brands."""
+        ranked = []
+        for feature_id, weight in self.weights.items():
+            described = space.describe(feature_id)
+            if described and described[0] == kind and weight > 0:
+                ranked.append((described[1], weight))
+        ranked.sort(key=lambda x: x[1], reverse=True)
+        return ranked[:n]
+
+    def as_preferences(self, space: FeatureSpace) -> Dict[str, Any]:
+        """Same shape the engine's preference dicts have always had."""
+        return {
+            'brands': self.top(space, 'brand', 10),
+            'colors': self.top(space, 'color', 10),
+            'categories': self.top(space, 'category', 10),
+            'styles': self.top(space, 'style', 10),
+            'avg_price': self.avg_price,
+            'price_range': {
+                'min': self.price_min,
+                'max': self.price_max,
+            },
+        }
+
+
+def accumulate_interaction(
+    db: Session,
+    space: FeatureSpace,
+    features: UserFeatures,
+    interaction: UserInteraction,
+    weight: float
+):
+    """Fold one interaction into a feature vector with the given weight."""
+    _fold_metadata(features, interaction.interaction_metadata, weight, lambda kind, value: space.intern(db, kind, value))
+
+
+def _fold_metadata(features: UserFeatures, metadata: Optional[Dict[str, Any]], weight: float, key):
+    metadata = metadata or {}
+    for kind, value in extract_attributes(metadata).items():
+        features.add(key(kind, value), weight)
+
+    if 'price' in metadata:
+        try:
+            features.add_price(float(metadata['price']), weight)
+        except (TypeError, ValueError):
+            pass
+
+
+def build_user_features(
+    db: Session,
+    user_id: int,
+    interactions: Optional[List[UserInteraction]] = None
+) -> UserFeatures:
+    """Build a user's feature vector from their last 90 days of interactions."""
+    if interactions is None:
+        interactions = db.query(UserInteraction).filter(
+            UserInteraction.user_id == user_id,
+            UserInteraction.created_at >= datetime.now() - timedelta(days=PREFERENCE_WINDOW_DAYS)
+        ).all()
+
+    space = get_feature_space(db)
+    features = UserFeatures(user_id=user_id)
+    now = datetime.now()
+
+    for interaction in interactions:
+        if interaction.interaction_metadata:
+            weight = interaction_preference_weight(interaction, now)
+            accumulate_interaction(db, space, features, interaction, weight)
+
+    return features
+
+
+def raw_user_features(user_id: int, interactions: List[Any], now: datetime) -> UserFeatures:
+    """
+    build_user_features without a database (safe in worker processes): weights
+    are keyed by (kind, value) until intern_user_features maps them to ids.
+    """
+    features = UserFeatures(user_id=user_id)
+    for interaction in interactions:
+        if interaction.interaction_metadata:
+            weight = interaction_preference_weight(interaction, now)
+            _fold_metadata(features, interaction.interaction_metadata, weight, lambda kind, value: (kind, value))
+    return features
+
+
+def intern_user_features(db: Session, space: FeatureSpace, features: UserFeatures) -> UserFeatures:
+    """Replace (kind, value) keys from raw_user_features with vocabulary ids."""
+    interned = {}
+    for (kind, value), weight in features.weights.items():
+        feature_id = space.intern(db, kind, value)
+        interned[feature_id] = interned.get(feature_id, 0.0) + weight
+    features.weights = interned
+    return features
+
+
+def lookup_user_features(space: FeatureSpace, features: UserFeatures) -> UserFeatures:
+    """
+    intern_user_features without writes: values missing from the vocabulary
+    are dropped (no product's attribute matrix can reference them either).
+    """
+    resolved = {}
+    for (kind, value), weight in features.weights.items():
+        feature_id = space.lookup(kind, value)
+        if feature_id >= 0:
+            resolved[feature_id] = resolved.get(feature_id, 0.0) + weight
+    features.weights = resolved
+    return features
+
+
+def load_user_features(db: Session, user_id: int) -> Optional[UserFeatures]:
+    """Read a stored feature vector, or None if the user has none yet."""
+    row = db.query(UserFeatureVector).filter(UserFeatureVector.user_id == user_id).first()
+    if not row:
+        return None
+
+    ids = np.frombuffer(row.indices or b'', dtype=np.int32)
+    values = np.frombuffer(row.weights or b'', dtype=np.float32)
+    return UserFeatures(
+        user_id=user_id,
+        weights=dict(zip(ids.tolist(), values.tolist())),
+        price_weight_sum=row.price_weight_sum or 0.0,
+        price_weighted_sum=row.price_weighted_sum or 0.0,
+        price_min=row.price_min,
+        price_max=row.price_max,
+        version=row.version or 0
+    )
+
+
+def save_user_features(db: Session, features: UserFeatures) -> UserFeatureVector:
+    """Write a feature vector back (caller commits)."""
+    row = db.query(UserFeatureVector).filter(UserFeatureVector.user_id == features.user_id).first()
+    if not row:
+        row = UserFeatureVector(user_id=features.user_id, version=0)
+        db.add(row)
+
+    ids = np.fromiter(features.weights.keys(), dtype=np.int32, count=len(features.weights))
+    values = np.fromiter(features.weights.values(), dtype=np.float32, count=len(features.weights))
+    row.indices = ids.tobytes()
+    row.weights = values.tobytes()
+    row.price_weight_sum = features.price_weight_sum
+    row.price_weighted_sum = features.price_weighted_sum
+    row.price_min = features.price_min
+    row.price_max = features.price_max
+    row.version = (row.version or 0) + 1
+    row.updated_at = datetime.now()
+    features.version = row.version
+    return row
+
+
+def refresh_user_features(
+    db: Session,
+    user_id: int,
+    interactions: Optional[List[UserInteraction]] = None
+) -> UserFeatures:
+    """Rebuild from scratch (applies recency decay) and store."""
+    features = build_user_features(db, user_id, interactions)
+    save_user_features(db, features)
+    return features
+
+
+def get_user_features(db: Session, user_id: int) -> UserFeatures:
+    """
+    Stored feature vector. Users who don't have one yet get it built on the
+    fly, read-only: it's stored by their next tracked interaction or profile
+    rebuild.
+    """
+    features = load_user_features(db, user_id)
+    if features is None:
+        interactions = db.query(UserInteraction).filter(
+            UserInteraction.user_id == user_id,
+            UserInteraction.created_at >= datetime.now() - timedelta(days=PREFERENCE_WINDOW_DAYS)
+        ).all()
+        features = lookup_user_features(
+            get_feature_space(db), raw_user_features(user_id, interactions, datetime.now())
+        )
+    return features
+
+
+def apply_interaction(db: Session, interaction: UserInteraction):
+    """
+    Incrementally fold a just-tracked interaction into the stored vector.
+    Recency decay is re-applied whenever the profile is rebuilt.
+    """
+    apply_interactions(db, interaction.user_id, [interaction])
+
+
+def apply_interactions(db: Session, user_id: int, interactions: List[UserInteraction]):
+    """apply_interaction for several of one user's interactions: one load, one save."""
+    interactions = [i for i in interactions if i.interaction_metadata]
+    if not interactions:
+        return
+
+    space = get_feature_space(db)
+    features = load_user_features(db, user_id) or UserFeatures(user_id=user_id)
+    for interaction in interactions:
+        weight = ACTION_PREFERENCE_WEIGHTS.get(interaction.action_type, 1.0) * (interaction.weight or 0.0)
+        accumulate_interaction(db, space, features, interaction, weight)
+    save_user_features(db, features)
+
+
+# ============================================
+# PRODUCT FEATURES + VECTORIZED SCORING
+# ============================================
+
+def product_attribute_matrix(
+    db: Session,
+    product_ids: List[str]
+) -> np.ndarray:
+    """
+    (n_products, len(FEATURE_KINDS)) int32 matrix of vocabulary ids, -1 = unknown.
+    Attributes come from the latest product-interaction metadata that has them.
+    """
+    space = get_feature_space(db)
+    matrix = np.full((len(product_ids), len(FEATURE_KINDS)), -1, dtype=np.int32)
+    if not product_ids:
+        return matrix
+
+    rows = db.query(UserInteraction.item_id, UserInteraction.interaction_metadata).filter(
+        UserInteraction.item_id.in_(product_ids),
+        UserInteraction.interaction_metadata.isnot(None)
+    ).order_by(UserInteraction.created_at.desc()).all()
+
+    position = {product_id: i for i, product_id in enumerate(product_ids)}
+    for item_id, metadata in rows:
+        row = matrix[position[item_id]]
+        for kind, value in extract_attributes(metadata).items():
+            column = FEATURE_KINDS.index(kind)
+            if row[column] < 0:
+                row[column] = space.lookup(kind, value)
+
+    return matrix
+
+
+def attribute_affinity_scores(
+    user_vector: np.ndarray,
+    attribute_matrix: np.ndarray
+) -> np.ndarray:
+    """
+    Affinity points for every candidate in one pass:
+    gather the user's weight for each product attribute, then dot with ATTRIBUTE_POINTS.
+    """
+    if attribute_matrix.size == 0:
+        return np.zeros(len(attribute_matrix), dtype=np.float32)
+
+    in_range = (attribute_matrix >= 0) & (attribute_matrix < len(user_vector))
+    gathered = np.where(in_range, user_vector[np.where(in_range, attribute_matrix, 0)], 0.0)
+    return gathered.astype(np.float32) @ ATTRIBUTE_POINTS
+
+
+def price_match_scores(prices: np.ndarray, avg_price: Optional[float]) -> np.ndarray:
+    """20 points within 30% of the user's average price, 10 within 50%."""
+    scores = np.zeros(len(prices), dtype=np.float32)
+    if not avg_price:
+        return scores
+
+    known = ~np.isnan(prices) & (prices > 0)
+    ratio = np.abs(prices - avg_price) / avg_price
+    scores[known & (ratio < 0.5)] = 10.0
+    scores[known & (ratio < 0.3)] = 20.0
+    return scores